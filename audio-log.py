@@ -1,23 +1,307 @@
 import whisper
+import torch
+import argparse
+import glob
+import hashlib
+import json
 import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import numpy as np
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+MODEL_NAME = "small"  # 'small', 'medium', or 'large' depending on your needs
+AUDIO_EXTENSIONS = (".mp3", ".m4a", ".wav", ".ogg", ".flac")
+SAMPLE_RATE = whisper.audio.SAMPLE_RATE  # 16 kHz mono, as returned by whisper.load_audio
+
+# Silence-based chunking: long recordings are cut at pauses so chunks can be
+# decoded in parallel. Chunks never exceed Whisper's 30 s window by much.
+MAX_CHUNK_SECONDS = 30
+MIN_CHUNK_SECONDS = 5
+MIN_SILENCE_SECONDS = 0.4
+SILENCE_DB = -35  # Frames this far below the loudest frame count as silence
+FRAME_SECONDS = 0.02
+DEFAULT_WORKERS = min(4, max(1, (os.cpu_count() or 1) // 2))  # Each worker holds its own copy of the model
+MAX_ROUND_AUDIO_SECONDS = 30 * 60  # Audio decoded and queued on the pool at once (~115 MB of 16 kHz float32)
+AUDIO_BYTES_PER_SECOND_ESTIMATE = 16000  # ~128 kbps, used to size rounds without decoding
+
+# ---------------------------
+# Model Reuse
+# ---------------------------
+loaded_models = {}
+_worker_model = None
+
+def get_model(name=MODEL_NAME):
+    """Load a Whisper model once per process and reuse it for every file."""
+    if name not in loaded_models:
+        print(f"Loading Whisper model '{name}'...")
+        loaded_models[name] = whisper.load_model(name)
+    return loaded_models[name]
+
+def _init_worker(name, threads):
+    """Pool initializer: each worker process loads the model exactly once."""
+    global _worker_model
+    torch.set_num_threads(threads)  # Split cores between workers instead of oversubscribing
+    _worker_model = get_model(name)
+
+def _transcribe_chunk(chunk):
+    return transcribe_samples(_worker_model, chunk)
+
+def transcribe_samples(model, samples):
+    result = model.transcribe(samples, fp16=False)
+    return result["text"].strip()
+
+# ---------------------------
+# Chunking
+# ---------------------------
+def split_on_silence(audio, sample_rate=SAMPLE_RATE, max_chunk_seconds=MAX_CHUNK_SECONDS,
+                     min_chunk_seconds=MIN_CHUNK_SECONDS, min_silence_seconds=MIN_SILENCE_SECONDS,
+                     silence_db=SILENCE_DB):
+    """
+    Split audio into chunks at pauses.
+
+    Frame energy is computed with NumPy; each chunk ends in the middle of the
+    last long-enough pause before max_chunk_seconds, or is hard-cut there if
+    the speaker never pauses.
+
+    Returns:
+        list: (start, end) sample offsets covering the whole recording.
+    """
+    frame = int(sample_rate * FRAME_SECONDS)
+    total = len(audio)
+    max_len = int(max_chunk_seconds * sample_rate)
+    if total <= max_len or frame == 0:
+        return [(0, total)]
+
+    frames = audio[:total // frame * frame].reshape(-1, frame)
+    rms = np.sqrt(np.mean(frames.astype(np.float32) ** 2, axis=1)) + 1e-10
+    silent = 20 * np.log10(rms / rms.max()) < silence_db
+
+    # Centers of silent runs at least min_silence_seconds long are candidate cuts
+    edges = np.flatnonzero(np.diff(np.concatenate([[0], silent.astype(np.int8), [0]])))
+    starts, ends = edges[::2], edges[1::2]
+    long_enough = (ends - starts) * FRAME_SECONDS >= min_silence_seconds
+    cuts = (starts[long_enough] + ends[long_enough]) // 2 * frame
+
+    bounds, start = [], 0
+    min_len = int(min_chunk_seconds * sample_rate)
+    while total - start > max_len:
+        candidates = cuts[(cuts >= start + min_len) & (cuts <= start + max_len)]
+        cut = int(candidates[-1]) if len(candidates) else start + max_len
+        bounds.append((start, cut))
+        start = cut
+    bounds.append((start, total))
+    return bounds
+
+# ---------------------------
+# Skip Detection
+# ---------------------------
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(block_size), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def output_paths(audio_file, output_dir=None):
+    base_name = os.path.splitext(os.path.basename(audio_file))[0]
+    directory = output_dir or os.path.dirname(os.path.abspath(audio_file))
+    text_path = os.path.join(directory, f"{base_name}_transcription.txt")
+    return text_path, os.path.join(directory, f"{base_name}_transcription.json")
+
+def is_current(audio_file, text_path, meta_path, model_name):
+    """
+    True if the transcription is newer than the recording, or the recording's
+    hash matches the one recorded with it (e.g. after a copy reset mtimes).
+    """
+    if not os.path.exists(text_path):
+        return False
+    if os.path.getmtime(text_path) >= os.path.getmtime(audio_file):
+        return True
+    try:
+        with open(meta_path, "r") as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return False
+    if meta.get("model") == model_name and meta.get("sha256") == file_sha256(audio_file):
+        os.utime(text_path)  # Refresh the mtime so the next run skips without hashing
+        return True
+    return False
+
+# ---------------------------
+# Transcription
+# ---------------------------
+def load_chunks(audio_file):
+    """
+    Decode a recording and cut it at pauses.
+
+    Returns:
+        tuple: (duration in seconds, list of sample arrays).
+    """
+    audio = whisper.load_audio(audio_file)
+    return len(audio) / SAMPLE_RATE, [audio[start:end] for start, end in split_on_silence(audio)]
+
+def save_transcription(audio_file, texts, model_name, duration, elapsed, output_dir=None):
+    """Write <name>_transcription.txt plus its JSON sidecar and return the stats."""
+    output_file, meta_file = output_paths(audio_file, output_dir)
+    os.makedirs(os.path.dirname(output_file), exist_ok=True)
 
-def transcribe_audio(mp3_file):
-    # Load Whisper model (use 'small', 'medium', or 'large' depending on your needs)
-    model = whisper.load_model("small")
-    
-    # Transcribe the MP3 file
-    result = model.transcribe(mp3_file)
-    
-    # Output file name
-    base_name = os.path.splitext(os.path.basename(mp3_file))[0]
-    output_file = f"{base_name}_transcription.txt"
-    
     # Save transcription
     with open(output_file, "w") as f:
-        f.write(result["text"])
-    
-    print(f"✅ Transcription saved to: {output_file}")
+        f.write(" ".join(text for text in texts if text))
+
+    stats = {
+        "model": model_name,
+        "sha256": file_sha256(audio_file),
+        "audio_seconds": round(duration, 2),
+        "processing_seconds": round(elapsed, 2),
+        "rtf": round(elapsed / duration, 3) if duration else None,
+        "chunks": len(texts),
+    }
+    with open(meta_file, "w") as f:
+        json.dump(stats, f, indent=4)
+
+    print(f"✅ Transcription saved to: {output_file} ({duration:.0f}s audio, {len(texts)} chunks, RTF {stats['rtf']})")
+    return stats
+
+def transcribe_audio(mp3_file, model_name=MODEL_NAME, pool=None, output_dir=None):
+    """
+    Transcribe one recording and save <name>_transcription.txt.
+
+    Args:
+        mp3_file (str): Audio file path.
+        model_name (str): Whisper model size.
+        pool (ProcessPoolExecutor): Optional worker pool; when given, every
+            chunk runs there and this process never loads the model.
+        output_dir (str): Folder for the transcription (default: next to the audio).
+
+    Returns:
+        dict: Audio seconds, processing seconds and real-time factor.
+    """
+    started = time.perf_counter()
+    duration, chunks = load_chunks(mp3_file)
+    if pool is not None:
+        texts = list(pool.map(_transcribe_chunk, chunks))
+    else:
+        model = get_model(model_name)
+        texts = [transcribe_samples(model, chunk) for chunk in chunks]
+    return save_transcription(mp3_file, texts, model_name, duration, time.perf_counter() - started, output_dir)
+
+def transcribe_round(audio_files, model_name, pool, output_dir=None):
+    """
+    Transcribe several recordings with one pool.map over all of their chunks.
+
+    Short clips are a single chunk each, so spreading (file, chunk) pairs
+    across the pool keeps every worker busy instead of decoding one file
+    at a time. Processing time is shared out by audio duration.
+
+    Returns:
+        dict: {audio file: stats}.
+    """
+    started = time.perf_counter()
+    loaded = {}
+    for audio_file in audio_files:
+        try:
+            loaded[audio_file] = load_chunks(audio_file)
+        except Exception as e:
+            print(f"❌ Failed to load {audio_file}: {e}")
+
+    pairs = [(audio_file, chunk) for audio_file, (_, chunks) in loaded.items() for chunk in chunks]
+    texts = {audio_file: [] for audio_file in loaded}
+    # map() keeps submission order, so each file's chunks come back in sequence
+    for (audio_file, _), text in zip(pairs, pool.map(_transcribe_chunk, [chunk for _, chunk in pairs])):
+        texts[audio_file].append(text)
+
+    elapsed = time.perf_counter() - started
+    total_seconds = sum(duration for duration, _ in loaded.values()) or 1
+    return {
+        audio_file: save_transcription(audio_file, texts[audio_file], model_name, duration,
+                                       elapsed * duration / total_seconds, output_dir)
+        for audio_file, (duration, _) in loaded.items()
+    }
+
+def plan_rounds(audio_files, max_seconds=MAX_ROUND_AUDIO_SECONDS):
+    """Group files into rounds of roughly max_seconds of audio, so decoded samples stay bounded in memory."""
+    rounds, current, seconds = [], [], 0.0
+    for audio_file in audio_files:
+        # Compressed size is a cheap duration estimate that avoids decoding twice
+        estimate = os.path.getsize(audio_file) / AUDIO_BYTES_PER_SECOND_ESTIMATE
+        if current and seconds + estimate > max_seconds:
+            rounds.append(current)
+            current, seconds = [], 0.0
+        current.append(audio_file)
+        seconds += estimate
+    if current:
+        rounds.append(current)
+    return rounds
+
+def find_audio_files(inputs):
+    """Expand directories (recursively) and glob patterns into a sorted list of audio files."""
+    files = set()
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, "**", "*"), recursive=True)
+        else:
+            matches = glob.glob(item) or [item]
+        files.update(m for m in matches if m.lower().endswith(AUDIO_EXTENSIONS) and os.path.isfile(m))
+    return sorted(files)
+
+def transcribe_batch(inputs, model_name=MODEL_NAME, workers=DEFAULT_WORKERS, output_dir=None, force=False):
+    """
+    Transcribe every recording under the given directories/globs.
+
+    With workers > 1 the model is loaded only in the worker processes and
+    the chunks of several files are transcribed together; with one worker
+    the model is loaded once in this process. Files with a current
+    transcription are skipped.
+
+    Returns:
+        dict: {audio file: stats} for the files transcribed this run.
+    """
+    files = find_audio_files(inputs)
+    pending = [f for f in files if force or not is_current(f, *output_paths(f, output_dir), model_name)]
+    print(f"Found {len(files)} recordings; {len(files) - len(pending)} already transcribed, {len(pending)} to do.")
+    if not pending:
+        return {}
+
+    results = {}
+    if workers > 1:
+        threads = max(1, (os.cpu_count() or 1) // workers)
+        with ProcessPoolExecutor(max_workers=workers, mp_context=get_context("spawn"),
+                                 initializer=_init_worker, initargs=(model_name, threads)) as pool:
+            for audio_files in plan_rounds(pending):
+                try:
+                    results.update(transcribe_round(audio_files, model_name, pool, output_dir))
+                except Exception as e:
+                    print(f"❌ Failed to transcribe {len(audio_files)} files starting at {audio_files[0]}: {e}")
+    else:
+        for audio_file in pending:
+            try:
+                results[audio_file] = transcribe_audio(audio_file, model_name, output_dir=output_dir)
+            except Exception as e:
+                print(f"❌ Failed to transcribe {audio_file}: {e}")
+
+    audio_seconds = sum(s["audio_seconds"] for s in results.values())
+    processing_seconds = sum(s["processing_seconds"] for s in results.values())
+    if audio_seconds:
+        print(f"🎯 Transcribed {len(results)} files, {audio_seconds / 60:.1f} min of audio, "
+              f"overall RTF {processing_seconds / audio_seconds:.3f}")
+    return results
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcribe audio journal recordings with Whisper.")
+    parser.add_argument("inputs", nargs="+", help="Audio files, directories or glob patterns.")
+    parser.add_argument("--model", default=MODEL_NAME, help="Whisper model size.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Worker processes for parallel chunks (1 = in-process).")
+    parser.add_argument("--output-dir", help="Folder for transcriptions (default: next to each recording).")
+    parser.add_argument("--force", action="store_true", help="Re-transcribe files that are already current.")
+    args = parser.parse_args()
 
-# Example Usage
-mp3_file = "{path}}" 
-transcribe_audio(mp3_file)
+    transcribe_batch(args.inputs, model_name=args.model, workers=args.workers, output_dir=args.output_dir, force=args.force)
@@ -0,0 +1,308 @@
+import argparse
+import hashlib
+import mmap
+import os
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+SOURCE = "/media/jeffbreece/fly-drive/backups"
+DEST = "/media/jeffbreece/1TB-SATA/backups"
+LOGFILE = "/media/jeffbreece/1TB-SATA/logs/backup_sync.log"
+MANIFEST_FILE = ".backup_manifest.sqlite"  # Lives in DEST, so it travels with the cold copy
+
+DEFAULT_WORKERS = 4
+HASH_CHUNK_BYTES = 8 * 1024 * 1024  # hashlib releases the GIL on large updates, so threads hash in parallel
+DEFAULT_VERIFY_FRACTION = 0.05  # Share of the manifest re-hashed per verify pass; every file is covered in 1/fraction runs
+
+# ---------------------------
+# Hashing & Copying
+# ---------------------------
+def iter_chunks(path, chunk_bytes=HASH_CHUNK_BYTES):
+    """Yield a file's contents as memoryview chunks of a read-only memory map."""
+    with open(path, "rb") as file:
+        if os.fstat(file.fileno()).st_size == 0:
+            return
+        with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped, memoryview(mapped) as view:
+            for offset in range(0, len(mapped), chunk_bytes):
+                # Each slice is released before the next, or the map cannot be closed
+                with view[offset:offset + chunk_bytes] as chunk:
+                    yield chunk
+
+def hash_file(path):
+    digest = hashlib.sha256()
+    for chunk in iter_chunks(path):
+        digest.update(chunk)
+    return digest.hexdigest()
+
+def copy_and_hash(source_path, dest_path):
+    """
+    Copy a file and hash it in the same pass over the source.
+
+    The copy is written under a temporary name and renamed into place, so an
+    interrupted backup never leaves a truncated file under the real name.
+    """
+    os.makedirs(os.path.dirname(dest_path), exist_ok=True)
+    temp_path = f"{dest_path}.partial"
+    digest = hashlib.sha256()
+    try:
+        with open(temp_path, "wb") as out:
+            for chunk in iter_chunks(source_path):
+                digest.update(chunk)
+                out.write(chunk)
+        shutil.copystat(source_path, temp_path)
+        os.replace(temp_path, dest_path)
+    except BaseException:
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    return digest.hexdigest()
+
+# ---------------------------
+# Manifest
+# ---------------------------
+class BackupManifest:
+    """SQLite manifest of (path, size, mtime, sha256, last verified) for every backed-up file."""
+
+    def __init__(self, path):
+        self.conn = sqlite3.connect(path)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS files ("
+            "path TEXT PRIMARY KEY, size INTEGER, mtime_ns INTEGER, sha256 TEXT, verified_at REAL)"
+        )
+        self.conn.commit()
+
+    def entries(self):
+        return {path: (size, mtime_ns, sha256) for path, size, mtime_ns, sha256 in
+                self.conn.execute("SELECT path, size, mtime_ns, sha256 FROM files")}
+
+    def put(self, path, size, mtime_ns, sha256):
+        self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?, ?, ?)", (path, size, mtime_ns, sha256, time.time()))
+
+    def delete(self, path):
+        self.conn.execute("DELETE FROM files WHERE path = ?", (path,))
+
+    def least_recently_verified(self, count):
+        return self.conn.execute(
+            "SELECT path, sha256 FROM files ORDER BY verified_at IS NOT NULL, verified_at LIMIT ?", (count,)
+        ).fetchall()
+
+    def mark_verified(self, path):
+        self.conn.execute("UPDATE files SET verified_at = ? WHERE path = ?", (time.time(), path))
+
+    def count(self):
+        return self.conn.execute("SELECT COUNT(*) FROM files").fetchone()[0]
+
+    def commit(self):
+        self.conn.commit()
+
+    def close(self):
+        self.conn.commit()
+        self.conn.close()
+
+# ---------------------------
+# Backup & Verify
+# ---------------------------
+def walk_files(root, errors=None):
+    """
+    Yield (relative path, size, mtime_ns) for every regular file under root.
+
+    Directories that cannot be read are reported and appended to errors, so
+    the caller knows the listing is incomplete.
+    """
+    stack = [root]
+    while stack:
+        directory = stack.pop()
+        try:
+            with os.scandir(directory) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append(entry.path)
+                    elif entry.is_file(follow_symlinks=False):
+                        stat = entry.stat(follow_symlinks=False)
+                        yield os.path.relpath(entry.path, root), stat.st_size, stat.st_mtime_ns
+        except OSError as e:
+            print(f"⚠️ Could not scan {directory}: {e}")
+            if errors is not None:
+                errors.append(directory)
+
+def sync_file(source, dest, relative, size, mtime_ns, known):
+    """
+    Bring one new or changed file up to date in the cold copy.
+
+    Returns:
+        tuple: (action, sha256) where action is "copied", "touched" (same
+        content, new mtime) or "adopted" (already present from an earlier rsync).
+    """
+    source_path = os.path.join(source, relative)
+    dest_path = os.path.join(dest, relative)
+    try:
+        dest_stat = os.stat(dest_path)
+    except FileNotFoundError:
+        dest_stat = None
+
+    if known is not None and known[0] == size:
+        # Only the mtime moved: hash first and skip the write if the content is the same
+        sha256 = hash_file(source_path)
+        if sha256 == known[2] and dest_stat is not None:
+            shutil.copystat(source_path, dest_path)
+            return "touched", sha256
+    elif known is None and dest_stat is not None and dest_stat.st_size == size and dest_stat.st_mtime_ns == mtime_ns:
+        return "adopted", hash_file(source_path)
+    return "copied", copy_and_hash(source_path, dest_path)
+
+def backup(source=SOURCE, dest=DEST, workers=DEFAULT_WORKERS, delete=True):
+    """
+    Copy only new or changed files (by size and mtime against the manifest) in parallel.
+
+    Like rsync --delete after an I/O error, the delete pass is skipped when
+    the source is missing, empty or could not be fully scanned, so an
+    unmounted drive never wipes the cold copy.
+
+    Returns:
+        dict: Counts per action plus bytes copied, scan errors and whether
+        deletion was skipped.
+    """
+    os.makedirs(dest, exist_ok=True)
+    manifest = BackupManifest(os.path.join(dest, MANIFEST_FILE))
+    known = manifest.entries()
+    seen, pending, scan_errors = set(), [], []
+    if os.path.isdir(source):
+        files = walk_files(source, scan_errors)
+    else:
+        print(f"❌ Source {source} is missing or not a directory")
+        scan_errors.append(source)
+        files = []
+    for relative, size, mtime_ns in files:
+        seen.add(relative)
+        entry = known.get(relative)
+        if entry is None or entry[0] != size or entry[1] != mtime_ns:
+            pending.append((relative, size, mtime_ns))
+
+    counts = {"unchanged": len(seen) - len(pending), "copied": 0, "touched": 0, "adopted": 0,
+              "deleted": 0, "failed": 0, "bytes_copied": 0, "scan_errors": len(scan_errors), "deletion_skipped": False}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            futures = {
+                pool.submit(sync_file, source, dest, relative, size, mtime_ns, known.get(relative)): (relative, size, mtime_ns)
+                for relative, size, mtime_ns in pending
+            }
+            # The manifest is only written from this thread
+            for future in as_completed(futures):
+                relative, size, mtime_ns = futures[future]
+                try:
+                    action, sha256 = future.result()
+                except Exception as e:
+                    print(f"⚠️ Failed to back up {relative}: {e}")
+                    counts["failed"] += 1
+                    continue
+                manifest.put(relative, size, mtime_ns, sha256)
+                counts[action] += 1
+                if action == "copied":
+                    counts["bytes_copied"] += size
+                if sum(counts[a] for a in ("copied", "touched", "adopted")) % 500 == 0:
+                    manifest.commit()
+
+        removed = set(known) - seen
+        if delete and removed and (scan_errors or not seen):
+            print("⚠️ Source scan was incomplete or empty; skipping deletions")
+            counts["deletion_skipped"] = True
+        elif delete:
+            for relative in removed:
+                try:
+                    os.remove(os.path.join(dest, relative))
+                except FileNotFoundError:
+                    pass
+                manifest.delete(relative)
+                counts["deleted"] += 1
+    finally:
+        manifest.close()
+    return counts
+
+def verify(dest=DEST, fraction=DEFAULT_VERIFY_FRACTION, workers=DEFAULT_WORKERS):
+    """
+    Re-hash a rotating sample of the cold copy against the manifest.
+
+    The least recently verified files are checked first, so repeated runs
+    cover the whole backup without ever rereading all of it at once.
+
+    Returns:
+        dict: Counts of files checked, mismatched and missing.
+    """
+    manifest = BackupManifest(os.path.join(dest, MANIFEST_FILE))
+    results = {"checked": 0, "mismatched": [], "missing": []}
+    try:
+        sample = manifest.least_recently_verified(max(1, int(manifest.count() * fraction)))
+
+        def check(item):
+            relative, sha256 = item
+            path = os.path.join(dest, relative)
+            if not os.path.exists(path):
+                return relative, "missing"
+            return relative, "ok" if hash_file(path) == sha256 else "mismatched"
+
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for relative, status in pool.map(check, sample):
+                results["checked"] += 1
+                if status == "ok":
+                    manifest.mark_verified(relative)
+                else:
+                    results[status].append(relative)
+    finally:
+        manifest.close()
+    return results
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+def log(message, logfile=LOGFILE):
+    print(message)
+    if logfile:
+        os.makedirs(os.path.dirname(logfile), exist_ok=True)
+        with open(logfile, "a") as file:
+            file.write(f"{datetime.now():%Y-%m-%d %H:%M:%S} {message}\n")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incremental, manifest-based backup to cold storage.")
+    subparsers = parser.add_subparsers(dest="command")
+    backup_parser = subparsers.add_parser("backup", help="Copy new or changed files (default).")
+    backup_parser.add_argument("--source", default=SOURCE, help="Folder to back up.")
+    backup_parser.add_argument("--no-delete", action="store_true", help="Keep cold copies of files deleted from the source.")
+    verify_parser = subparsers.add_parser("verify", help="Re-hash a rotating sample of the cold copy.")
+    verify_parser.add_argument("--fraction", type=float, default=DEFAULT_VERIFY_FRACTION, help="Share of files to check.")
+    for sub in (backup_parser, verify_parser):
+        sub.add_argument("--dest", default=DEST, help="Cold storage folder (holds the manifest).")
+        sub.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel copy/hash workers.")
+        sub.add_argument("--logfile", default=LOGFILE, help="Log file to append to ('' to skip).")
+    args = parser.parse_args()
+
+    if args.command == "verify":
+        results = verify(args.dest, args.fraction, args.workers)
+        problems = results["mismatched"] + results["missing"]
+        for relative in results["mismatched"]:
+            log(f"❌ Hash mismatch: {relative}", args.logfile)
+        for relative in results["missing"]:
+            log(f"❌ Missing from cold copy: {relative}", args.logfile)
+        log(f"{'✅' if not problems else '⚠️'} Verified {results['checked']} files, {len(problems)} problems", args.logfile)
+        if problems:
+            exit(1)
+    else:
+        if args.command == "backup":
+            source, dest, workers, logfile, delete = args.source, args.dest, args.workers, args.logfile, not args.no_delete
+        else:
+            # No subcommand (e.g. from cron): back up with the defaults
+            source, dest, workers, logfile, delete = SOURCE, DEST, DEFAULT_WORKERS, LOGFILE, True
+        started = time.perf_counter()
+        counts = backup(source, dest, workers, delete)
+        problems = counts["scan_errors"] or counts["failed"] or counts["deletion_skipped"]
+        summary = ", ".join(f"{value} {key.replace('_', ' ')}" for key, value in counts.items() if key != "deletion_skipped")
+        if counts["deletion_skipped"]:
+            summary += ", deletions skipped"
+        log(f"{'⚠️' if problems else '✅'} Backup sync completed in {time.perf_counter() - started:.1f}s: {summary}", logfile)
+        if problems:
+            exit(1)
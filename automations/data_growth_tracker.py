@@ -0,0 +1,293 @@
+import argparse
+import json
+import os
+import shutil
+import sqlite3
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+RAW_DIR = "/media/jeffbreece/Storage/data/raw"
+RAID_MOUNT = "/media/jeffbreece/Storage"  # Base mount for RAID
+LOG_FILE = "/home/jeffbreece/Logs/raw_folder_size.log"
+STORE_FILE = "/home/jeffbreece/Logs/data_growth.sqlite"  # Snapshots plus the per-directory scan cache
+DEFAULT_WORKERS = 16  # scandir/stat calls release the GIL, so threads overlap the disk waits
+
+# ---------------------------
+# Store
+# ---------------------------
+class GrowthStore:
+    """
+    SQLite store for size snapshots and the directory scan cache.
+
+    snapshots holds one row per dataset per run (bytes, files and growth
+    in bytes/day since the previous run); scan_errors lists the directories
+    that run could not fully read; dir_cache holds each directory's own file
+    totals keyed on its mtime.
+    """
+
+    def __init__(self, path=STORE_FILE):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS snapshots ("
+            "ts TEXT, dataset TEXT, bytes INTEGER, files INTEGER, growth_bytes_per_day REAL, PRIMARY KEY (ts, dataset));"
+            "CREATE TABLE IF NOT EXISTS volume (ts TEXT PRIMARY KEY, total_bytes INTEGER, free_bytes INTEGER);"
+            "CREATE TABLE IF NOT EXISTS scan_errors (ts TEXT, dataset TEXT, path TEXT, error TEXT);"
+            "CREATE TABLE IF NOT EXISTS dir_cache ("
+            "path TEXT PRIMARY KEY, mtime_ns INTEGER, bytes INTEGER, files INTEGER, subdirs TEXT);"
+        )
+        self.conn.commit()
+
+    def load_cache(self):
+        return {
+            path: (mtime_ns, size, files, json.loads(subdirs))
+            for path, mtime_ns, size, files, subdirs in self.conn.execute("SELECT * FROM dir_cache")
+        }
+
+    def save_cache(self, cache):
+        """Replace the cache with this scan's directories, dropping ones that no longer exist."""
+        with self.conn:
+            self.conn.execute("DELETE FROM dir_cache")
+            self.conn.executemany(
+                "INSERT INTO dir_cache VALUES (?, ?, ?, ?, ?)",
+                [(path, m, b, f, json.dumps(s)) for path, (m, b, f, s) in cache.items()],
+            )
+
+    def previous(self, dataset):
+        return self.conn.execute(
+            "SELECT ts, bytes FROM snapshots WHERE dataset = ? ORDER BY ts DESC LIMIT 1", (dataset,)
+        ).fetchone()
+
+    def record(self, ts, totals, total_bytes, free_bytes, errors=()):
+        """
+        Store one snapshot per dataset, with growth relative to its previous snapshot.
+
+        errors holds (dataset, path, message) for directories this scan could
+        not fully read; their datasets' totals may be understated.
+        """
+        rows = []
+        for dataset, (size, files) in totals.items():
+            growth = None
+            prev = self.previous(dataset)
+            if prev:
+                days = (datetime.fromisoformat(ts) - datetime.fromisoformat(prev[0])).total_seconds() / 86400
+                growth = (size - prev[1]) / days if days > 0 else None
+            rows.append((ts, dataset, size, files, growth))
+        with self.conn:
+            self.conn.executemany("INSERT OR REPLACE INTO snapshots VALUES (?, ?, ?, ?, ?)", rows)
+            self.conn.execute("INSERT OR REPLACE INTO volume VALUES (?, ?, ?)", (ts, total_bytes, free_bytes))
+        self.record_errors(ts, errors)
+        return rows
+
+    def record_errors(self, ts, errors):
+        with self.conn:
+            self.conn.executemany("INSERT INTO scan_errors VALUES (?, ?, ?, ?)", [(ts, *error) for error in errors])
+
+    def trend(self, days):
+        """
+        Per dataset: the first and latest snapshot within the window.
+
+        Returns:
+            list: (dataset, first ts, first bytes, latest ts, latest bytes, latest files) rows.
+        """
+        return self.conn.execute(
+            "WITH windowed AS (SELECT * FROM snapshots WHERE ts >= datetime('now', 'localtime', ?)), "
+            "bounds AS (SELECT dataset, MIN(ts) AS first_ts, MAX(ts) AS last_ts FROM windowed GROUP BY dataset) "
+            "SELECT b.dataset, b.first_ts, f.bytes, b.last_ts, l.bytes, l.files FROM bounds b "
+            "JOIN windowed f ON f.dataset = b.dataset AND f.ts = b.first_ts "
+            "JOIN windowed l ON l.dataset = b.dataset AND l.ts = b.last_ts ORDER BY b.dataset",
+            (f"-{days} days",),
+        ).fetchall()
+
+    def close(self):
+        self.conn.close()
+
+# ---------------------------
+# Scanning
+# ---------------------------
+def scan_directory(path, cached):
+    """
+    Return (mtime_ns, bytes, files, subdirs) for the files directly in one directory.
+
+    A directory's mtime only changes when entries are added, removed or
+    renamed, so an unchanged mtime means the cached listing is reused and
+    only this one stat is spent. Files rewritten in place keep their
+    directory's mtime; run with --full now and then to pick those up.
+
+    Returns:
+        tuple: (totals, error). totals is None if the directory is gone. When
+        it cannot be fully read, error holds the reason and totals carries
+        mtime_ns None, so it is never reused from the cache; a directory that
+        cannot be listed at all keeps its previously cached totals.
+    """
+    try:
+        mtime_ns = os.stat(path).st_mtime_ns
+    except FileNotFoundError:
+        return None, None
+    except OSError as e:
+        return (None, *cached[1:]) if cached else (None, 0, 0, []), str(e)
+    if cached and cached[0] == mtime_ns:
+        return cached, None
+
+    size = files = 0
+    subdirs, error = [], None
+    try:
+        with os.scandir(path) as entries:
+            for entry in entries:
+                try:
+                    if entry.is_dir(follow_symlinks=False):
+                        subdirs.append(entry.name)
+                    elif entry.is_file(follow_symlinks=False):
+                        size += entry.stat(follow_symlinks=False).st_size
+                        files += 1
+                except FileNotFoundError:
+                    continue
+                except OSError as e:
+                    error = f"{entry.name}: {e}"
+    except OSError as e:
+        return (None, *cached[1:]) if cached else (None, 0, 0, []), str(e)
+    return (None if error else mtime_ns, size, files, subdirs), error
+
+def scan_tree(root, cache, workers=DEFAULT_WORKERS, full=False):
+    """
+    Walk the tree once, level by level, with directories scanned in parallel.
+
+    Returns:
+        tuple: (new cache {path: (mtime_ns, bytes, files, subdirs)}, directories
+        rescanned, {path: error} for directories that could not be fully read).
+    """
+    new_cache, rescanned, errors = {}, 0, {}
+    frontier = [root]
+    with ThreadPoolExecutor(max_workers=workers) as pool:
+        while frontier:
+            results = pool.map(lambda p: scan_directory(p, None if full else cache.get(p)), frontier)
+            next_frontier = []
+            for path, (result, error) in zip(frontier, results):
+                if error:
+                    print(f"⚠️ Could not fully scan {path}: {error}")
+                    errors[path] = error
+                if result is None:
+                    continue
+                if result is not cache.get(path):
+                    rescanned += 1
+                new_cache[path] = result
+                next_frontier.extend(os.path.join(path, name) for name in result[3])
+            frontier = next_frontier
+    return new_cache, rescanned, errors
+
+def dataset_of(root, path):
+    """Top-level dataset folder a path belongs to, or None for the root itself."""
+    prefix = root.rstrip(os.sep) + os.sep
+    relative = path[len(prefix):] if path.startswith(prefix) else ""
+    return relative.split(os.sep, 1)[0] if relative else None
+
+def dataset_totals(root, cache):
+    """Sum directory totals per top-level dataset folder, plus the whole tree as 'total'."""
+    totals = {"total": [0, 0]}
+    for path, (_, size, files, _) in cache.items():
+        dataset = dataset_of(root, path)
+        totals["total"][0] += size
+        totals["total"][1] += files
+        if dataset:
+            totals.setdefault(dataset, [0, 0])
+            totals[dataset][0] += size
+            totals[dataset][1] += files
+    return {name: tuple(values) for name, values in totals.items()}
+
+def human_size(size):
+    for unit in ("B", "K", "M", "G", "T"):
+        if abs(size) < 1024 or unit == "T":
+            return f"{size:.0f}B" if unit == "B" else f"{size:.1f}{unit}"
+        size /= 1024
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+def track(raw_dir=RAW_DIR, store_file=STORE_FILE, log_file=LOG_FILE, workers=DEFAULT_WORKERS, full=False):
+    """
+    Scan the lake, record a snapshot and append the log line.
+
+    Returns:
+        dict: {path: error} for directories that could not be fully read;
+        their datasets are flagged in the output and in scan_errors.
+    """
+    started = time.perf_counter()
+    store = GrowthStore(store_file)
+    try:
+        if not os.path.isdir(raw_dir):
+            # Nothing to measure: record the error but keep the cache and skip the snapshot
+            errors = {raw_dir: "not a directory or not mounted"}
+            print(f"❌ {raw_dir} is missing or not a directory; no snapshot recorded")
+            store.record_errors(datetime.now().strftime("%Y-%m-%d %H:%M:%S"), [(None, raw_dir, errors[raw_dir])])
+            return errors
+        cache, rescanned, errors = scan_tree(raw_dir, store.load_cache(), workers=workers, full=full)
+        store.save_cache(cache)
+        totals = dataset_totals(raw_dir, cache)
+        usage = shutil.disk_usage(RAID_MOUNT if os.path.exists(RAID_MOUNT) else raw_dir)
+        timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        scan_errors = [(dataset_of(raw_dir, path), path, error) for path, error in sorted(errors.items())]
+        rows = store.record(timestamp, totals, usage.total, usage.free, scan_errors)
+    finally:
+        store.close()
+    incomplete = {dataset for dataset, _, _ in scan_errors}
+
+    # Keep the human-readable log line for anyone tailing the old log
+    parts = [f"Size: {human_size(totals['total'][0])}", f"Free Space: {human_size(usage.free)}"]
+    parts += [f"{name}: {human_size(size)}" for name, (size, _) in sorted(totals.items()) if name != "total"]
+    if errors:
+        parts.append(f"Scan errors: {len(errors)}")
+    line = f"{timestamp} - " + " | ".join(parts)
+    if log_file:
+        os.makedirs(os.path.dirname(log_file), exist_ok=True)
+        with open(log_file, "a") as log:
+            log.write(line + "\n")
+
+    elapsed = time.perf_counter() - started
+    print(f"Logged: {line}")
+    print(f"{'⚠️' if errors else '✅'} Scanned {len(cache)} directories ({rescanned} changed, "
+          f"{len(errors)} incomplete) in {elapsed:.1f}s")
+    for _, dataset, size, files, growth in rows:
+        rate = f"{human_size(growth)}/day" if growth is not None else "n/a"
+        flag = "   (incomplete scan)" if dataset in incomplete or (dataset == "total" and errors) else ""
+        print(f"   {dataset:<28} {human_size(size):>9} {files:>10} files   growth {rate}{flag}")
+    return errors
+
+def report(store_file=STORE_FILE, days=30):
+    store = GrowthStore(store_file)
+    try:
+        rows = store.trend(days)
+    finally:
+        store.close()
+    print(f"{'dataset':<28} {'size':>9} {'files':>10} {'growth/day':>11}   (last {days} days)")
+    for dataset, first_ts, first_bytes, last_ts, size, files in rows:
+        elapsed_days = (datetime.fromisoformat(last_ts) - datetime.fromisoformat(first_ts)).total_seconds() / 86400
+        rate = human_size((size - first_bytes) / elapsed_days) if elapsed_days > 0 else "n/a"
+        print(f"{dataset:<28} {human_size(size):>9} {files:>10} {rate:>11}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Track data lake size and growth per dataset.")
+    subparsers = parser.add_subparsers(dest="command")
+    scan_parser = subparsers.add_parser("scan", help="Scan the lake and record a snapshot (default).")
+    scan_parser.add_argument("--root", default=RAW_DIR, help="Lake folder; each subfolder is a dataset.")
+    scan_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel directory scans.")
+    scan_parser.add_argument("--full", action="store_true", help="Ignore the mtime cache and rescan every directory.")
+    report_parser = subparsers.add_parser("report", help="Show size and growth trends.")
+    report_parser.add_argument("--days", type=int, default=30, help="Trend window.")
+    scan_parser.add_argument("--log-file", default=LOG_FILE, help="Human-readable log to append to ('' to skip).")
+    for sub in (scan_parser, report_parser):
+        sub.add_argument("--store", default=STORE_FILE, help="SQLite snapshot store.")
+    args = parser.parse_args()
+
+    if args.command == "report":
+        report(args.store, args.days)
+    elif args.command == "scan":
+        if track(args.root, args.store, args.log_file, workers=args.workers, full=args.full):
+            exit(1)
+    else:
+        # No subcommand (e.g. from cron): scan with the defaults
+        if track():
+            exit(1)
@@ -0,0 +1,396 @@
+import argparse
+import glob
+import os
+import re
+import shutil
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+BASE_URL = "https://www.ncei.noaa.gov/pub/data/ghcn/daily/"
+DATA_DIRS = ["all", "by_year", "by_station"]
+METADATA_FILES = ["ghcnd-stations.txt", "ghcnd-inventory.txt", "ghcnd-countries.txt", "ghcnd-states.txt",
+                  "readme.txt", "readme-by_year.txt", "readme-by_station.txt"]
+DATA_FILE_PATTERN = re.compile(r'href="([^"/?]+\.(?:dly|csv|csv\.gz))"')
+
+TARGET_DIR = "/media/jeffbreece/Storage/data/raw/noaa_ghcn/second-attempt"
+PARQUET_DIR = "/media/jeffbreece/Storage/data/processed/noaa_ghcn/daily"
+MANIFEST_FILE = ".download_manifest.sqlite"  # Kept in TARGET_DIR: ETag and size of every finished file
+
+DEFAULT_WORKERS = 8
+CHUNK_BYTES = 64 * 1024  # Bytes lost when a connection drops mid-chunk are at most this
+REQUEST_TIMEOUT = (10, 120)  # (connect, read) seconds
+# .dly bytes converted and written together. Parsing peaks at roughly 13x the
+# raw input (the int32 digit temporaries), so 32 MB stays well under 1 GB.
+BATCH_BYTES = 32 * 1024 * 1024
+
+# .dly layout: ID(11) YEAR(4) MONTH(2) ELEMENT(4), then 31 x [VALUE(5) MFLAG QFLAG SFLAG]
+DLY_LINE_BYTES = 269
+DLY_HEADER_BYTES = 21
+DLY_DAYS = 31
+DLY_MISSING = -9999
+
+# ---------------------------
+# Download Manifest
+# ---------------------------
+class DownloadManifest:
+    """
+    SQLite record of the ETag and size of each completed download.
+
+    Shared by the download workers, so every call takes a lock.
+    """
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute("CREATE TABLE IF NOT EXISTS files (path TEXT PRIMARY KEY, etag TEXT, size INTEGER)")
+        self.conn.commit()
+
+    def get(self, path):
+        with self.lock:
+            row = self.conn.execute("SELECT etag, size FROM files WHERE path = ?", (path,)).fetchone()
+        return row if row else (None, None)
+
+    def put(self, path, etag, size):
+        with self.lock:
+            self.conn.execute("INSERT OR REPLACE INTO files VALUES (?, ?, ?)", (path, etag, size))
+            self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+# ---------------------------
+# Downloading
+# ---------------------------
+def create_session(pool_size=DEFAULT_WORKERS):
+    """Create a requests session whose connection pool fits the worker count."""
+    session = requests.Session()
+    # Byte ranges and sizes must refer to the file itself, not a compressed transfer
+    session.headers["Accept-Encoding"] = "identity"
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def list_remote_files(session, directory, base_url=BASE_URL):
+    """Data file names (.dly/.csv/.csv.gz) from a directory index page."""
+    response = session.get(f"{base_url}{directory}/", timeout=REQUEST_TIMEOUT)
+    response.raise_for_status()
+    return sorted(set(DATA_FILE_PATTERN.findall(response.text)))
+
+def finish_part(session, url, path, part_path, etag, manifest, content_range=""):
+    """
+    Settle a .part file the server answered with 416 Range Not Satisfiable.
+
+    That happens when the .part already holds the whole file (the download
+    finished but the rename never ran) or is longer than the file. The total
+    size comes from the 416's "bytes */total" Content-Range, else from a HEAD
+    whose ETag still matches. A .part of exactly that size is renamed into
+    place; anything else is deleted so the file is downloaded from scratch.
+
+    Returns:
+        bool: True if the .part was renamed into place.
+    """
+    total = content_range.rpartition("/")[2]
+    if not total.isdigit():
+        head = session.head(url, timeout=REQUEST_TIMEOUT)
+        head.raise_for_status()
+        total = head.headers.get("Content-Length", "") if head.headers.get("ETag") in (None, etag) else ""
+    part_size = os.path.getsize(part_path)
+    if total.isdigit() and int(total) == part_size:
+        os.replace(part_path, path)
+        manifest.put(path, etag, part_size)
+        return True
+    os.remove(part_path)
+    return False
+
+def download_file(session, url, path, manifest):
+    """
+    Download one file, skipping or resuming where possible.
+
+    - A finished file with a recorded ETag is revalidated with If-None-Match
+      (304 means skip, no body transferred).
+    - A finished file without a record (e.g. from the old wget script) is
+      kept if a HEAD reports the same size.
+    - A leftover .part file is resumed with a Range request; If-Range makes
+      the server send the whole file instead if it changed meanwhile. A 416
+      (nothing left to send) is settled by finish_part().
+
+    Returns:
+        str: "skipped", "downloaded" or "resumed".
+    """
+    etag, size = manifest.get(path)
+    part_path = f"{path}.part"
+    headers = {}
+    if os.path.exists(path):
+        local_size = os.path.getsize(path)
+        if etag and size == local_size:
+            headers["If-None-Match"] = etag
+        else:
+            head = session.head(url, timeout=REQUEST_TIMEOUT)
+            head.raise_for_status()
+            if int(head.headers.get("Content-Length", -1)) == local_size:
+                manifest.put(path, head.headers.get("ETag"), local_size)
+                return "skipped"
+    elif etag and os.path.exists(part_path):
+        headers["Range"] = f"bytes={os.path.getsize(part_path)}-"
+        headers["If-Range"] = etag
+
+    with session.get(url, headers=headers, stream=True, timeout=REQUEST_TIMEOUT) as response:
+        if response.status_code == 304:
+            return "skipped"
+        unsatisfiable = response.status_code == 416 and "Range" in headers
+        if unsatisfiable:
+            content_range = response.headers.get("Content-Range", "")
+        else:
+            response.raise_for_status()
+            resumed = response.status_code == 206
+            new_etag = response.headers.get("ETag")
+            # Record the ETag before the body so an interrupted .part can be resumed next run
+            manifest.put(path, new_etag, None)
+            with open(part_path, "ab" if resumed else "wb") as file:
+                for block in response.iter_content(CHUNK_BYTES):
+                    file.write(block)
+            # Content-Range is "bytes start-end/total"; otherwise the body is the whole file
+            total = response.headers.get("Content-Range", "").rpartition("/")[2] or response.headers.get("Content-Length")
+
+    if unsatisfiable:
+        if finish_part(session, url, path, part_path, etag, manifest, content_range):
+            return "resumed"
+        return download_file(session, url, path, manifest)
+
+    final_size = os.path.getsize(part_path)
+    if total and total.isdigit() and int(total) != final_size:
+        raise IOError(f"incomplete download ({final_size} of {total} bytes); rerun to resume")
+    os.replace(part_path, path)
+    manifest.put(path, new_etag, final_size)
+    return "resumed" if resumed else "downloaded"
+
+def download_all(target_dir=TARGET_DIR, data_dirs=DATA_DIRS, workers=DEFAULT_WORKERS, base_url=BASE_URL):
+    """
+    Download GHCN-Daily metadata and data files in parallel.
+
+    Returns:
+        dict: Count of files per outcome (skipped, downloaded, resumed, failed).
+    """
+    os.makedirs(target_dir, exist_ok=True)
+    manifest = DownloadManifest(os.path.join(target_dir, MANIFEST_FILE))
+    session = create_session(workers)
+    jobs = [(f"{base_url}{name}", os.path.join(target_dir, name)) for name in METADATA_FILES]
+    try:
+        for directory in data_dirs:
+            os.makedirs(os.path.join(target_dir, directory), exist_ok=True)
+            print(f"Checking directory: {directory}")
+            for name in list_remote_files(session, directory, base_url):
+                jobs.append((f"{base_url}{directory}/{name}", os.path.join(target_dir, directory, name)))
+
+        def run(job):
+            url, path = job
+            try:
+                return download_file(session, url, path, manifest)
+            except Exception as e:
+                print(f"⚠️ Error downloading {url}: {e}")
+                return "failed"
+
+        counts = {"skipped": 0, "downloaded": 0, "resumed": 0, "failed": 0}
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            for outcome in pool.map(run, jobs):
+                counts[outcome] += 1
+    finally:
+        session.close()
+        manifest.close()
+    print(f"✅ GHCN-Daily files in {target_dir}: " + ", ".join(f"{n} {k}" for k, n in counts.items()))
+    return counts
+
+# ---------------------------
+# Parsing
+# ---------------------------
+def _digits(block):
+    """
+    Parse right-justified integer fields from a (..., width) uint8 array.
+
+    Spaces and the sign contribute zero, so only the digit positions are
+    weighted; no per-line Python work is done.
+    """
+    width = block.shape[-1]
+    digits = np.where((block >= 48) & (block <= 57), block.astype(np.int32) - 48, 0)
+    values = digits @ (10 ** np.arange(width - 1, -1, -1, dtype=np.int32))
+    return np.where((block == 45).any(axis=-1), -values, values)
+
+def _flags(column):
+    """Single-character flag column: blank becomes null."""
+    return pa.array(column.view("S1").ravel().astype(str), pa.string(), mask=(column.ravel() == 32))
+
+def _fixed_width(data, width, min_length=1):
+    """
+    Split text into lines and pad them into a (lines, width) uint8 array.
+
+    Lines shorter than min_length (blank lines between concatenated files,
+    truncated records) are dropped rather than padded into rows of NULs.
+    """
+    lines = np.array(data.splitlines(), dtype=f"S{width}")
+    lines = lines[np.char.str_len(lines) >= min_length]
+    return lines.view(np.uint8).reshape(len(lines), width)
+
+def parse_dly(data):
+    """
+    Parse the contents of one or more .dly files into long-format rows.
+
+    Lines are laid out as a fixed-width byte matrix and every field is
+    sliced and decoded with NumPy, then missing (-9999) days are dropped.
+
+    Args:
+        data (bytes): Raw .dly text.
+
+    Returns:
+        pyarrow.Table: station, element, date, value, mflag, qflag, sflag.
+    """
+    lines = _fixed_width(data, DLY_LINE_BYTES, min_length=DLY_HEADER_BYTES)
+    count = len(lines)
+    station = lines[:, 0:11].copy().view("S11").ravel()
+    year = _digits(lines[:, 11:15])
+    month = _digits(lines[:, 15:17])
+    element = lines[:, 17:21].copy().view("S4").ravel()
+
+    days = lines[:, DLY_HEADER_BYTES:DLY_HEADER_BYTES + 8 * DLY_DAYS].reshape(count, DLY_DAYS, 8)
+    values = _digits(days[:, :, 0:5])
+    present = values != DLY_MISSING
+    line_index, day_index = np.nonzero(present)
+
+    months = (year[line_index] - 1970) * 12 + (month[line_index] - 1)
+    dates = months.astype("datetime64[M]").astype("datetime64[D]") + day_index
+
+    picked = days[line_index, day_index]
+    return pa.table({
+        "station": pa.array(station[line_index].astype(str)),
+        "element": pa.array(element[line_index].astype(str)),
+        "date": pa.array(dates, pa.date32()),
+        "value": pa.array(values[present], pa.int32()),
+        "mflag": _flags(picked[:, 5]),
+        "qflag": _flags(picked[:, 6]),
+        "sflag": _flags(picked[:, 7]),
+    })
+
+def parse_stations(data):
+    """
+    Parse ghcnd-stations.txt into a metadata table.
+
+    Returns:
+        pyarrow.Table: station, latitude, longitude, elevation, state, name.
+    """
+    lines = _fixed_width(data, 85)
+
+    def text(start, end):
+        return pa.array(np.char.strip(lines[:, start:end].copy().view(f"S{end - start}").ravel().astype(str)))
+
+    def number(start, end):
+        return pc.cast(text(start, end), pa.float64())
+
+    state = text(38, 40)
+    elevation = number(31, 37)
+    return pa.table({
+        "station": text(0, 11),
+        "latitude": number(11, 20),
+        "longitude": number(21, 30),
+        "elevation": pc.if_else(pc.equal(elevation, -999.9), None, elevation),  # -999.9 marks missing
+        "state": pc.if_else(pc.equal(state, ""), None, state),
+        "name": text(41, 71),
+    })
+
+# ---------------------------
+# Parquet Conversion
+# ---------------------------
+def batch_by_size(paths, batch_bytes=BATCH_BYTES):
+    """Group paths into consecutive batches of about batch_bytes of file data (at least one file each)."""
+    batch, size = [], 0
+    for path in paths:
+        file_size = os.path.getsize(path)
+        if batch and size + file_size > batch_bytes:
+            yield batch
+            batch, size = [], 0
+        batch.append(path)
+        size += file_size
+    if batch:
+        yield batch
+
+def convert_to_parquet(dly_dir, stations_file, output_dir=PARQUET_DIR, batch_bytes=BATCH_BYTES, overwrite=False):
+    """
+    Convert station .dly files into a Parquet dataset joined with station metadata.
+
+    Rows are partitioned by element and decade (element=TMAX/decade=2020/)
+    and sorted by station and date within each file, so station filters
+    prune row groups via statistics and element/date filters prune whole
+    directories. Stations are converted in batches of about batch_bytes of
+    .dly input to bound memory.
+
+    Returns:
+        int: Rows written.
+    """
+    if os.path.exists(output_dir) and os.listdir(output_dir):
+        if not overwrite:
+            raise FileExistsError(f"{output_dir} is not empty; pass overwrite=True to rebuild it")
+        shutil.rmtree(output_dir)
+
+    with open(stations_file, "rb") as file:
+        stations = parse_stations(file.read())
+    paths = sorted(glob.glob(os.path.join(dly_dir, "*.dly")))
+    partitioning = ds.partitioning(pa.schema([("element", pa.string()), ("decade", pa.int32())]), flavor="hive")
+    total = done = 0
+
+    for batch, batch_paths in enumerate(batch_by_size(paths, batch_bytes)):
+        chunk = []
+        for path in batch_paths:
+            with open(path, "rb") as file:
+                chunk.append(file.read())
+        # Joined with newlines in case a file lacks a trailing one; the blank lines this leaves are dropped by the parser
+        table = parse_dly(b"\n".join(chunk))
+        done += len(batch_paths)
+        if not len(table):
+            continue
+        years = pc.year(table["date"])
+        table = table.append_column("decade", pc.cast(pc.multiply(pc.divide(years, 10), 10), pa.int32()))
+        table = table.join(stations, "station", join_type="left outer").sort_by([("station", "ascending"), ("date", "ascending")])
+        ds.write_dataset(
+            table, output_dir, format="parquet", partitioning=partitioning,
+            basename_template=f"part-{batch:05d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=ds.ParquetFileFormat().make_write_options(compression="zstd"),
+        )
+        total += len(table)
+        print(f"Converted {done}/{len(paths)} stations ({total} rows)")
+    print(f"✅ GHCN-Daily Parquet dataset written to {output_dir}")
+    return total
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Download GHCN-Daily files and convert .dly station files to Parquet.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    download_parser = subparsers.add_parser("download", help="Download metadata and data files in parallel.")
+    download_parser.add_argument("--target", default=TARGET_DIR, help="Download folder.")
+    download_parser.add_argument("--dirs", nargs="+", default=DATA_DIRS, help="Remote data directories to mirror.")
+    download_parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Parallel downloads.")
+    convert_parser = subparsers.add_parser("convert", help="Convert .dly files to a partitioned Parquet dataset.")
+    convert_parser.add_argument("--dly-dir", default=os.path.join(TARGET_DIR, "all"), help="Folder of .dly station files.")
+    convert_parser.add_argument("--stations", default=os.path.join(TARGET_DIR, "ghcnd-stations.txt"), help="ghcnd-stations.txt path.")
+    convert_parser.add_argument("--output", default=PARQUET_DIR, help="Parquet dataset root.")
+    convert_parser.add_argument("--batch-mb", type=int, default=BATCH_BYTES // (1024 * 1024), help="MB of .dly input per batch.")
+    convert_parser.add_argument("--overwrite", action="store_true", help="Replace an existing dataset.")
+    args = parser.parse_args()
+
+    if args.command == "download":
+        download_all(args.target, args.dirs, args.workers)
+    elif args.command == "convert":
+        convert_to_parquet(args.dly_dir, args.stations, args.output, batch_bytes=args.batch_mb * 1024 * 1024,
+                           overwrite=args.overwrite)
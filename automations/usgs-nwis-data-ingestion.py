@@ -1,10 +1,23 @@
+import argparse
 import os
+import sqlite3
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timedelta
+
+import ijson
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
 import requests
-from datetime import datetime
+import urllib3
+from requests.adapters import HTTPAdapter
 
-# Base directory for raw data storage on RAID drive
-BASE_DIR = "/media/jeffbreece/Storage/data/raw/usgs_nwis"
+# Base directory for columnar data on RAID drive
+OUTPUT_DIR = "/media/jeffbreece/Storage/data/processed/usgs_nwis"
 STATE = "OH"  # Ohio
+STATE_FIPS = "39"
 
 # USGS NWIS Daily Values API endpoint
 API_URL = "https://waterservices.usgs.gov/nwis/dv/"
@@ -16,42 +29,323 @@ PARAM_CODES = {
     "groundwater": ["72019", "62610"]
 }
 
-# Set date parameters for Year-to-Date (YTD)
+# Ohio's 88 counties have the odd FIPS codes 001-175. Requests are split
+# into county chunks so no single response holds the whole state.
+COUNTY_CODES = [f"{STATE_FIPS}{code:03d}" for code in range(1, 176, 2)]
+COUNTIES_PER_REQUEST = 8  # NWIS accepts up to 20 counties per request
+MAX_WORKERS = 6
+MAX_RETRIES = 3
+REQUEST_TIMEOUT = (10, 300)  # (connect, read) seconds
+BATCH_ROWS = 50_000  # Rows buffered per partition before a row group is written
+
+# Incremental state: last ingested date per topic/county chunk and per site
+STATE_DB = "/media/jeffbreece/Storage/data/state/usgs_nwis_state.sqlite"
+LOOKBACK_DAYS = 7  # Re-fetch this many days before the high-water mark to pick up USGS revisions
+STALE_SITE_DAYS = 14  # Sites silent for longer than this no longer hold a chunk's window open
+
+SCHEMA = pa.schema([
+    ("site", pa.string()),
+    ("parameter", pa.string()),
+    ("statistic", pa.string()),
+    ("date", pa.date32()),
+    ("value", pa.float64()),
+    ("qualifiers", pa.string()),
+])
+
+# First run (no state) starts at January 1st, as the year-to-date ingest did
 current_date = datetime.today()
-year = current_date.strftime("%Y")
-month = current_date.strftime("%m")
-start_date = f"{year}-01-01"
+start_date = f"{current_date.year}-01-01"
 end_date = current_date.strftime("%Y-%m-%d")
 
-# Function to create directories if they don't exist
-def ensure_directory(topic):
-    dir_path = os.path.join(BASE_DIR, topic, year, month)
-    os.makedirs(dir_path, exist_ok=True)
-    return dir_path
-
-# Function to download data
-def download_data(topic):
-    parameters = ",".join(PARAM_CODES[topic])
-    url = (
-        f"{API_URL}?format=json&stateCd={STATE}"
-        f"&startDT={start_date}&endDT={end_date}&parameterCd={parameters}"
-    )
-    
-    response = requests.get(url)
-    
-    if response.status_code == 200 and "value" in response.text:
-        save_path = os.path.join(ensure_directory(topic), f"{topic}_{year}_{month}.json")
-        with open(save_path, "w") as file:
-            file.write(response.text)
-        print(f"✅ {topic.capitalize()} data saved to: {save_path}")
-    else:
-        print(f"❌ Failed to download {topic} data. Status Code: {response.status_code}")
-        print(f"   URL: {url}")
-        print(f"   Response: {response.text[:500]}")  # Print first 500 chars of response for debugging
-
-# Download datasets
-download_data("water_quality")
-download_data("streamflow")
-download_data("groundwater")
-
-print("🎯 USGS NWIS Ohio daily values data ingestion completed successfully!")
\ No newline at end of file
+# ---------------------------
+# Incremental State
+# ---------------------------
+class IngestState:
+    """
+    SQLite high-water marks for incremental ingestion.
+
+    chunks records the end date of the last successful request for each
+    topic/county chunk; sites records the latest value date seen per site.
+    A chunk's next window starts lookback days before the earlier of the
+    two, so late-reporting sites and USGS revisions are picked up without
+    refetching the year. Only sites heard from within the stale horizon
+    count, so the window reaches back at most stale_site_days + lookback_days
+    before the chunk's mark; a seasonal or retired site stops holding it open
+    once it has been silent that long.
+    """
+
+    def __init__(self, path=STATE_DB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS chunks (topic TEXT, chunk TEXT, last_end TEXT, updated_at TEXT, PRIMARY KEY (topic, chunk));"
+            "CREATE TABLE IF NOT EXISTS sites (topic TEXT, site TEXT, chunk TEXT, last_date TEXT, updated_at TEXT, PRIMARY KEY (topic, site));"
+        )
+        self.conn.commit()
+
+    def window_start(self, topic, chunk, default_start, lookback_days=LOOKBACK_DAYS, stale_site_days=STALE_SITE_DAYS):
+        """First day to request for a chunk, or default_start if it has never been ingested."""
+        row = self.conn.execute("SELECT last_end FROM chunks WHERE topic = ? AND chunk = ?", (topic, chunk)).fetchone()
+        if row is None:
+            return default_start
+        mark = date.fromisoformat(row[0])
+        stale_before = (mark - timedelta(days=stale_site_days)).isoformat()
+        (lagging,) = self.conn.execute(
+            "SELECT MIN(last_date) FROM sites WHERE topic = ? AND chunk = ? AND last_date >= ?",
+            (topic, chunk, stale_before),
+        ).fetchone()
+        if lagging:
+            mark = min(mark, date.fromisoformat(lagging))
+        return (mark - timedelta(days=lookback_days)).isoformat()
+
+    def record(self, topic, chunk, end, site_dates):
+        """Advance a chunk's mark to the requested end date and each site's to its latest value."""
+        now = datetime.now().isoformat(timespec="seconds")
+        self.conn.execute("INSERT OR REPLACE INTO chunks VALUES (?, ?, ?, ?)", (topic, chunk, end, now))
+        self.conn.executemany(
+            "INSERT INTO sites VALUES (?, ?, ?, ?, ?) ON CONFLICT (topic, site) DO UPDATE SET "
+            "chunk = excluded.chunk, last_date = MAX(last_date, excluded.last_date), updated_at = excluded.updated_at",
+            [(topic, site, chunk, last.isoformat(), now) for site, last in site_dates.items()],
+        )
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+# ---------------------------
+# Parsing
+# ---------------------------
+def iter_rows(stream):
+    """
+    Stream flat rows out of a WaterML-JSON response.
+
+    ijson yields one time series (one site/parameter/statistic) at a time,
+    so memory holds a single series rather than the whole response.
+    """
+    for series in ijson.items(stream, "value.timeSeries.item", use_float=True):
+        site = series["sourceInfo"]["siteCode"][0]["value"]
+        variable = series["variable"]
+        parameter = variable["variableCode"][0]["value"]
+        options = variable.get("options", {}).get("option", [])
+        statistic = next((o.get("optionCode") for o in options if o.get("name") == "Statistic"), None)
+        no_data = variable.get("noDataValue")
+        for block in series.get("values", []):
+            for point in block.get("value", []):
+                value = float(point["value"]) if point.get("value") not in (None, "") else None
+                yield {
+                    "site": site,
+                    "parameter": parameter,
+                    "statistic": statistic,
+                    "date": date.fromisoformat(point["dateTime"][:10]),
+                    "value": None if value == no_data else value,
+                    "qualifiers": ",".join(point.get("qualifiers") or []) or None,
+                }
+
+# ---------------------------
+# Writing
+# ---------------------------
+class PartitionWriter:
+    """
+    Write rows into <topic>/year=YYYY/month=MM/<name>.parquet files.
+
+    Rows are buffered per month and flushed as row groups every BATCH_ROWS,
+    so memory is bounded by the batch size, not the date range. Files are
+    written under an underscore-prefixed name and renamed on close().
+
+    When a month file already exists, its rows outside the [start, end]
+    request window are carried over and rows inside it are replaced, so an
+    incremental run only rewrites the months its window touches.
+    """
+
+    def __init__(self, topic_dir, name, start, end, batch_rows=BATCH_ROWS):
+        self.topic_dir = topic_dir
+        self.name = name
+        self.start = date.fromisoformat(start)
+        self.end = date.fromisoformat(end)
+        self.batch_rows = batch_rows
+        self.rows = 0
+        self.site_dates = {}  # Latest value date per site, for the incremental state
+        self._buffers = defaultdict(list)
+        self._writers = {}
+
+    def write(self, row):
+        key = (row["date"].year, row["date"].month)
+        self._buffers[key].append(row)
+        if row["value"] is not None and row["date"] > self.site_dates.get(row["site"], date.min):
+            self.site_dates[row["site"]] = row["date"]
+        if len(self._buffers[key]) >= self.batch_rows:
+            self._flush(key)
+
+    def close(self):
+        for key in list(self._buffers):
+            self._flush(key)
+        for temp_path, final_path, writer in self._writers.values():
+            writer.close()
+            os.replace(temp_path, final_path)
+        written = [final_path for _, final_path, _ in self._writers.values()]
+        self._writers = {}
+        return written
+
+    def abort(self):
+        for temp_path, _, writer in self._writers.values():
+            writer.close()
+            os.remove(temp_path)
+        self._writers = {}
+        self._buffers.clear()
+
+    def _flush(self, key):
+        rows = self._buffers.pop(key, [])
+        if not rows:
+            return
+        if key not in self._writers:
+            directory = os.path.join(self.topic_dir, f"year={key[0]}", f"month={key[1]:02d}")
+            os.makedirs(directory, exist_ok=True)
+            temp_path = os.path.join(directory, f"_{self.name}.parquet")
+            final_path = os.path.join(directory, f"{self.name}.parquet")
+            writer = pq.ParquetWriter(temp_path, SCHEMA, compression="zstd", write_statistics=True)
+            if os.path.exists(final_path):
+                writer.write_table(self._outside_window(pq.read_table(final_path, schema=SCHEMA)))
+            self._writers[key] = (temp_path, final_path, writer)
+        self._writers[key][2].write_table(pa.Table.from_pylist(rows, schema=SCHEMA))
+        self.rows += len(rows)
+
+    def _outside_window(self, table):
+        dates = table["date"]
+        keep = pc.or_(pc.less(dates, pa.scalar(self.start)), pc.greater(dates, pa.scalar(self.end)))
+        return table.filter(keep)
+
+# ---------------------------
+# Downloading
+# ---------------------------
+def create_session(pool_size=MAX_WORKERS):
+    """Create a requests session whose connection pool fits the worker count."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    return session
+
+def chunk_name(counties):
+    return f"counties_{counties[0]}-{counties[-1]}"
+
+def download_chunk(session, topic, counties, start, end, output_dir=OUTPUT_DIR):
+    """
+    Stream one topic/county-chunk request straight into Parquet.
+
+    Returns:
+        tuple: (rows written, {site: latest value date}), or None if the request failed.
+    """
+    params = {
+        "format": "json",
+        "countyCd": ",".join(counties),
+        "startDT": start,
+        "endDT": end,
+        "parameterCd": ",".join(PARAM_CODES[topic]),
+    }
+    for attempt in range(MAX_RETRIES + 1):
+        try:
+            with session.get(API_URL, params=params, stream=True, timeout=REQUEST_TIMEOUT) as response:
+                if response.status_code == 404:
+                    return 0, {}  # NWIS answers 404 when no site in the chunk has data
+                if response.status_code in (429, 500, 502, 503, 504) and attempt < MAX_RETRIES:
+                    time.sleep(2 ** attempt)
+                    continue
+                if response.status_code != 200:
+                    print(f"❌ Failed to download {topic} for {chunk_name(counties)}. Status Code: {response.status_code}")
+                    print(f"   URL: {response.url}")
+                    return None
+                response.raw.decode_content = True
+                writer = PartitionWriter(os.path.join(output_dir, topic), chunk_name(counties), start, end)
+                try:
+                    for row in iter_rows(response.raw):
+                        writer.write(row)
+                except Exception:
+                    writer.abort()
+                    raise
+                writer.close()
+                return writer.rows, writer.site_dates
+        # Errors while streaming response.raw surface as urllib3 exceptions
+        except (requests.RequestException, urllib3.exceptions.HTTPError, ijson.JSONError) as e:
+            if attempt == MAX_RETRIES:
+                print(f"❌ Failed to download {topic} for {chunk_name(counties)}: {e}")
+                return None
+            time.sleep(2 ** attempt)
+    return None
+
+def download_topic_chunks(topics, end, state, start=None, workers=MAX_WORKERS, output_dir=OUTPUT_DIR,
+                          lookback_days=LOOKBACK_DAYS, stale_site_days=STALE_SITE_DAYS):
+    """
+    Fetch every topic/county-chunk pair concurrently from its own high-water mark.
+
+    Args:
+        topics (list): Topics from PARAM_CODES.
+        end (str): Last day YYYY-MM-DD.
+        state (IngestState): High-water marks, advanced as each chunk succeeds.
+        start (str): Optional first day for every chunk, overriding the marks (backfill).
+        workers (int): Concurrent requests.
+        output_dir (str): Dataset root.
+        lookback_days (int): Days re-fetched before each mark.
+        stale_site_days (int): Sites silent for longer than this before a
+            chunk's mark no longer pull its window back.
+
+    Returns:
+        dict: {topic: rows written}, with None for topics where any chunk failed.
+    """
+    chunks = [COUNTY_CODES[i:i + COUNTIES_PER_REQUEST] for i in range(0, len(COUNTY_CODES), COUNTIES_PER_REQUEST)]
+    jobs = []
+    for topic in topics:
+        for counties in chunks:
+            chunk_start = start or state.window_start(topic, chunk_name(counties), start_date, lookback_days, stale_site_days)
+            if chunk_start <= end:
+                jobs.append((topic, counties, chunk_start))
+    if jobs:
+        print(f"Requesting {len(jobs)} chunks from {min(job[2] for job in jobs)} through {end}")
+
+    session = create_session(workers)
+    totals = {topic: 0 for topic in topics}
+    try:
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            results = pool.map(lambda job: download_chunk(session, job[0], job[1], job[2], end, output_dir), jobs)
+            # State is only touched here, on the main thread, as each chunk completes
+            for (topic, counties, _), result in zip(jobs, results):
+                if result is None:
+                    totals[topic] = None
+                    continue
+                rows, site_dates = result
+                state.record(topic, chunk_name(counties), end, site_dates)
+                if totals[topic] is not None:
+                    totals[topic] += rows
+    finally:
+        session.close()
+    return totals
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Incrementally ingest USGS NWIS daily values into partitioned Parquet.")
+    parser.add_argument("--start", help="First day YYYY-MM-DD for every chunk, ignoring the high-water marks (backfill).")
+    parser.add_argument("--end", default=end_date, help="Last day YYYY-MM-DD (default: today).")
+    parser.add_argument("--lookback-days", type=int, default=LOOKBACK_DAYS, help="Days re-fetched before each high-water mark.")
+    parser.add_argument("--stale-site-days", type=int, default=STALE_SITE_DAYS,
+                        help="Sites silent for longer than this stop holding a chunk's window open; each window "
+                             "reaches back at most this plus --lookback-days before the chunk's last run.")
+    parser.add_argument("--topics", nargs="+", default=list(PARAM_CODES), choices=list(PARAM_CODES), help="Topics to ingest.")
+    parser.add_argument("--workers", type=int, default=MAX_WORKERS, help="Concurrent requests.")
+    parser.add_argument("--output", default=OUTPUT_DIR, help="Dataset root.")
+    parser.add_argument("--state-db", default=STATE_DB, help="SQLite file holding the high-water marks.")
+    args = parser.parse_args()
+
+    state = IngestState(args.state_db)
+    try:
+        totals = download_topic_chunks(args.topics, args.end, state, start=args.start, workers=args.workers,
+                                       output_dir=args.output, lookback_days=args.lookback_days,
+                                       stale_site_days=args.stale_site_days)
+    finally:
+        state.close()
+    for topic, rows in totals.items():
+        if rows is None:
+            print(f"⚠️ {topic.capitalize()} ingestion incomplete; rerun to retry the failed chunks.")
+        else:
+            print(f"✅ {topic.capitalize()}: {rows} daily values saved under {os.path.join(args.output, topic)}")
+
+    print(f"🎯 USGS NWIS {STATE} daily values data ingestion completed!")
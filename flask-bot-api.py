@@ -1,26 +1,107 @@
-from flask import Flask, request, jsonify
-from transformers import pipeline
-from sentence_transformers import SentenceTransformer, util
+from flask import Flask, Response, g, request, jsonify
 from fuzzywuzzy import fuzz
-import spacy
+from collections import Counter, OrderedDict, defaultdict
+from importlib import metadata
+from vector_index import create_index
+import numpy as np
+import cProfile
+import gc
+import hashlib
+import io
 import json
+import math
+import os
+import pstats
 import re
+import threading
+import time
 
 # Initialize Flask app
 app = Flask(__name__)
 
-# Initialize NLP models
-nlp = spacy.load("en_core_web_sm")
-similarity_pipeline = pipeline("text-classification", model="cross-encoder/ms-marco-MiniLM-L-12-v2")
-embedding_model = SentenceTransformer("all-MiniLM-L6-v2")
+# NLP models (loaded lazily through get_model)
+SPACY_MODEL_NAME = "en_core_web_sm"
+EMBEDDING_MODEL_NAME = "all-MiniLM-L6-v2"
+CROSS_ENCODER_MODEL_NAME = "cross-encoder/ms-marco-MiniLM-L-12-v2"
+REQUIRED_MODELS = ("nlp", "embedding")
 
-# Load your parks dataset
-try:
-    with open("ohio_state_parks_with_google_results.json", "r") as file:
-        parks_data = json.load(file)
-except (FileNotFoundError, json.JSONDecodeError) as e:
-    print(f"Error loading JSON data: {e}")
-    parks_data = []
+# Set PARKS_BOT_PRELOAD=1 (e.g. with gunicorn --preload) to load models in the
+# parent process so forked workers share them copy-on-write
+PRELOAD_MODELS = os.getenv("PARKS_BOT_PRELOAD") == "1"
+
+# Embedding search settings
+PARKS_FILE = os.getenv("PARKS_BOT_DATA", "ohio_state_parks_with_google_results.json")
+EMBEDDING_THRESHOLD = 0.5  # Adjust threshold for context relevance
+EMBEDDING_TOP_K = 20
+MAX_BATCH_QUERIES = 32
+
+# Vector index backend: "exact" (NumPy brute force) or "ivf" (approximate).
+# PARKS_BOT_IVF_NPROBE trades latency for recall on the ivf backend.
+VECTOR_INDEX_BACKEND = os.getenv("PARKS_BOT_VECTOR_INDEX", "exact")
+IVF_N_PROBE = int(os.getenv("PARKS_BOT_IVF_NPROBE", "8"))
+
+# Fused ranking settings
+FUZZY_THRESHOLD = 80  # Adjust threshold for fuzzy matching
+FUSION_WEIGHTS = {"exact": 0.2, "embedding": 0.4, "overlap": 0.25, "fuzzy": 0.15}
+DEFAULT_LIMIT = 10
+MAX_LIMIT = 50
+
+# Geospatial filter settings
+GEO_CELL_DEGREES = 0.5  # Grid cell size for the park location index
+DEFAULT_RADIUS_KM = 50
+MAX_RADIUS_KM = 1000
+EARTH_RADIUS_KM = 6371.0
+
+# Query result cache settings
+CACHE_MAX_ENTRIES = 1024
+CACHE_TTL_SECONDS = 3600
+
+# Instrumentation settings
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+PROFILE_TOP_N = 25
+
+# ---------------------------
+# Model Registry
+# ---------------------------
+def load_spacy_model():
+    import spacy
+    return spacy.load(SPACY_MODEL_NAME)
+
+def load_embedding_model():
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(EMBEDDING_MODEL_NAME)
+
+def load_cross_encoder():
+    from transformers import pipeline
+    return pipeline("text-classification", model=CROSS_ENCODER_MODEL_NAME)
+
+MODEL_LOADERS = {
+    "nlp": load_spacy_model,
+    "embedding": load_embedding_model,
+    "cross_encoder": load_cross_encoder,  # Not used by /ask, so never loaded today
+}
+loaded_models = {}
+model_lock = threading.Lock()
+
+def get_model(name):
+    """Return a model from the registry, loading it on first use."""
+    model = loaded_models.get(name)
+    if model is None:
+        with model_lock:
+            model = loaded_models.get(name)
+            if model is None:
+                started = time.perf_counter()
+                model = MODEL_LOADERS[name]()
+                loaded_models[name] = model
+                print(f"Loaded model '{name}' in {time.perf_counter() - started:.1f}s")
+    return model
+
+def spacy_model_id():
+    """Identify the spaCy model version without loading it (used for cache keys)."""
+    try:
+        return f"{SPACY_MODEL_NAME}-{metadata.version(SPACY_MODEL_NAME)}"
+    except metadata.PackageNotFoundError:
+        return SPACY_MODEL_NAME
 
 # Preprocessing function for normalization
 def preprocess_text(text):
@@ -28,99 +109,868 @@ def preprocess_text(text):
     text = re.sub(r"[^a-z0-9\s]", "", text)  # Remove punctuation
     return text
 
+def build_comparison_text(park):
+    park_name = preprocess_text(park.get("park_name", ""))
+    description = preprocess_text(park.get("description", ""))
+    features = preprocess_text(park.get("google_results", [{}])[0].get("snippet", ""))
+    return f"{park_name} {description} {features}"
+
+def build_park_record(park):
+    """Return the client-facing fields for a park, resolved once at startup."""
+    google_results = park.get("google_results") or [{}]
+    return {
+        "park_name": park.get("park_name", "Unknown"),
+        "description": park.get("description", "No description available."),
+        "features": google_results[0].get("snippet", "No features available"),
+        "url": park.get("url", "No URL available"),
+    }
+
+def haversine_km(lat1, lon1, lat2, lon2):
+    lat1, lon1, lat2, lon2 = map(math.radians, (lat1, lon1, lat2, lon2))
+    a = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(a))
+
+def build_geo_index(parks):
+    """
+    Bucket park coordinates into a lat/lon grid for radius lookups.
+
+    Returns:
+        tuple: ({(row, col): [park_index, ...]}, {park_index: (lat, lon)}).
+        Parks without usable coordinates are left out.
+    """
+    grid, coordinates = defaultdict(list), {}
+    for index, park in enumerate(parks):
+        try:
+            lat, lon = float(park.get("latitude")), float(park.get("longitude"))
+        except (TypeError, ValueError):
+            continue
+        coordinates[index] = (lat, lon)
+        grid[(math.floor(lat / GEO_CELL_DEGREES), math.floor(lon / GEO_CELL_DEGREES))].append(index)
+    return grid, coordinates
+
+def parks_within(snapshot, lat, lon, radius_km):
+    """Return {park_index: distance_km} for parks in the snapshot within radius_km of a point."""
+    lat_span = radius_km / 111.0
+    lon_span = radius_km / (111.0 * max(math.cos(math.radians(lat)), 0.01))
+    # Clamp to the cells that can exist, so a polar point or huge radius stays bounded
+    row_range = range(math.floor(max(lat - lat_span, -90) / GEO_CELL_DEGREES),
+                      math.floor(min(lat + lat_span, 90) / GEO_CELL_DEGREES) + 1)
+    col_range = range(math.floor(max(lon - lon_span, -180) / GEO_CELL_DEGREES),
+                      math.floor(min(lon + lon_span, 180) / GEO_CELL_DEGREES) + 1)
+
+    geo_grid = snapshot.geo_grid
+    if len(row_range) * len(col_range) > len(geo_grid):
+        # Fewer occupied cells than cells in range: walk the grid instead
+        cells = [cell for cell in geo_grid if cell[0] in row_range and cell[1] in col_range]
+    else:
+        cells = [(row, col) for row in row_range for col in col_range]
+
+    matches = {}
+    for cell in cells:
+        for index in geo_grid.get(cell, ()):
+            distance = haversine_km(lat, lon, *snapshot.coordinates[index])
+            if distance <= radius_km:
+                matches[index] = distance
+    return matches
+
+def embedding_digest(text):
+    return hashlib.sha256(f"{EMBEDDING_MODEL_NAME}\n{text}".encode("utf-8")).hexdigest()
+
+def load_park_embeddings(texts, data_file=PARKS_FILE, encode=True):
+    """
+    Return a normalized embedding per park, encoding only texts not seen before.
+
+    Rows are cached as a memory-mapped .npy file next to the dataset, with a
+    JSON sidecar listing each row's SHA-256 (model name + text). On reload,
+    unchanged parks reuse their cached row and only new or edited texts are
+    sent through the model.
+
+    Args:
+        texts (list): Comparison text for each park, in dataset order.
+        data_file (str): Path of the parks JSON the cache sits beside.
+        encode (bool): Run the model for missing rows. When False and any row
+            is missing, nothing is encoded and None is returned.
+
+    Returns:
+        tuple: (digests, matrix) where matrix is a (num_parks, dim) float32
+        array of unit vectors in dataset order, or None (see encode).
+    """
+    digests = [embedding_digest(text) for text in texts]
+    base_path = os.path.splitext(data_file)[0]
+    matrix_file = f"{base_path}.embeddings.npy"
+    meta_file = f"{base_path}.embeddings.json"
+
+    cached, cached_rows = None, {}
+    try:
+        with open(meta_file, "r") as file:
+            cached_digests = json.load(file)["digests"]
+        cached = np.load(matrix_file, mmap_mode="r")
+        if len(cached) == len(cached_digests):
+            if cached_digests == digests:
+                return digests, cached
+            cached_rows = {digest: row for row, digest in enumerate(cached_digests)}
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    missing = [i for i, digest in enumerate(digests) if digest not in cached_rows]
+    if missing and not encode:
+        return None
+    encoded = None
+    if missing:
+        encoded = get_model("embedding").encode(
+            [texts[i] for i in missing], batch_size=32, convert_to_numpy=True, normalize_embeddings=True
+        ).astype(np.float32)
+    dim = encoded.shape[1] if encoded is not None else (cached.shape[1] if cached is not None and cached.ndim == 2 else 0)
+
+    matrix = np.zeros((len(texts), dim), dtype=np.float32)
+    for row, digest in enumerate(digests):
+        if digest in cached_rows:
+            matrix[row] = cached[cached_rows[digest]]
+    for encoded_row, row in enumerate(missing):
+        matrix[row] = encoded[encoded_row]
+    print(f"Encoded {len(missing)} new park embeddings, reused {len(texts) - len(missing)}")
+
+    try:
+        # Write to temp files and rename so a crash never leaves a mismatched pair
+        # (per-process temp names, since several workers may warm up at once)
+        with open(f"{matrix_file}.{os.getpid()}.tmp", "wb") as file:
+            np.save(file, matrix)
+        os.replace(f"{matrix_file}.{os.getpid()}.tmp", matrix_file)
+        with open(f"{meta_file}.{os.getpid()}.tmp", "w") as file:
+            json.dump({"model": EMBEDDING_MODEL_NAME, "digests": digests}, file)
+        os.replace(f"{meta_file}.{os.getpid()}.tmp", meta_file)
+        return digests, np.load(matrix_file, mmap_mode="r")
+    except OSError as e:
+        print(f"Error caching park embeddings: {e}")
+        return digests, matrix
+
+def sync_vector_index(vector_ids, matrix):
+    """
+    Bring the vector index in line with the current parks.
+
+    Only vectors for new or edited parks are added and only vectors for
+    removed parks are dropped; unchanged parks stay in place.
+
+    Returns:
+        tuple: (number added, number removed).
+    """
+    wanted = {}
+    for row, vector_id in enumerate(vector_ids):
+        wanted.setdefault(vector_id, row)
+    current = set(park_index.ids.tolist())
+    stale = current - wanted.keys()
+    fresh = [vector_id for vector_id in wanted if vector_id not in current]
+
+    park_index.remove(stale)
+    if fresh:
+        park_index.add(fresh, np.asarray(matrix[[wanted[vector_id] for vector_id in fresh]]))
+    return len(fresh), len(stale)
+
+def embedding_matches(snapshot, queries, candidates=None, k=EMBEDDING_TOP_K, threshold=EMBEDDING_THRESHOLD):
+    """
+    Score a batch of queries against the parks with one encode and an index search.
+
+    Args:
+        snapshot (DatasetSnapshot): Dataset the park indexes refer to.
+        queries (list): Preprocessed query strings.
+        candidates (iterable): Optional park indexes to restrict scoring to.
+
+    Returns:
+        list: One {park_index: cosine_score} dict per query, holding the top-k
+        parks above the threshold.
+    """
+    candidate_ids = None if candidates is None else {snapshot.vector_ids[i] for i in candidates}
+    if len(park_index) == 0 or not queries or candidate_ids == set():
+        return [{} for _ in queries]
+    query_embeddings = get_model("embedding").encode(
+        queries, batch_size=32, convert_to_numpy=True, normalize_embeddings=True
+    ).astype(np.float32)
+
+    with index_lock:
+        hits = park_index.search(query_embeddings, k, candidate_ids)
+
+    results = []
+    for ids, scores in hits:
+        matches = {}
+        for vector_id, score in zip(ids.tolist(), scores.tolist()):
+            if score <= threshold:
+                continue
+            # Parks with identical text share one vector; vectors added by a newer reload map to no park
+            for position in snapshot.positions.get(vector_id, ()):
+                if candidates is None or position in candidates:
+                    matches[position] = score
+        results.append(matches)
+    return results
+
+def extract_terms(doc):
+    """Return the (noun phrases, non-stopword lemmas) used for keyword overlap."""
+    phrases = {chunk.text.lower() for chunk in doc.noun_chunks}
+    keywords = {token.lemma_ for token in doc if not token.is_stop}
+    return phrases, keywords
+
+def load_park_features(texts, data_file=PARKS_FILE):
+    """
+    Parse every park's comparison text with spaCy once and cache the terms.
+
+    Features are stored as JSON next to the dataset, keyed by a SHA-256 of the
+    spaCy model version and the texts, so restarts skip re-parsing.
+
+    Args:
+        texts (list): Comparison text for each park, in dataset order.
+        data_file (str): Path of the parks JSON the cache sits beside.
+
+    Returns:
+        list: One (phrases, keywords) tuple of sets per park.
+    """
+    digest = hashlib.sha256("\n".join([spacy_model_id()] + texts).encode("utf-8")).hexdigest()
+    features_file = f"{os.path.splitext(data_file)[0]}.features.json"
+
+    try:
+        with open(features_file, "r") as file:
+            cached = json.load(file)
+        if cached.get("hash") == digest:
+            return [(set(f["phrases"]), set(f["keywords"])) for f in cached["features"]]
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+
+    features = [extract_terms(doc) for doc in get_model("nlp").pipe(texts, batch_size=32)]
+
+    try:
+        # Write to a per-process temp file and rename, since several workers may warm up at once
+        with open(f"{features_file}.{os.getpid()}.tmp", "w") as file:
+            json.dump({
+                "hash": digest,
+                "features": [{"phrases": sorted(p), "keywords": sorted(k)} for p, k in features]
+            }, file)
+        os.replace(f"{features_file}.{os.getpid()}.tmp", features_file)
+    except OSError as e:
+        print(f"Error caching park features: {e}")
+
+    return features
+
+def build_term_index(features):
+    """Build inverted indexes from noun phrase / lemma to the park ids containing it."""
+    phrase_index, keyword_index = defaultdict(set), defaultdict(set)
+    for park_id, (phrases, keywords) in enumerate(features):
+        for phrase in phrases:
+            phrase_index[phrase].add(park_id)
+        for keyword in keywords:
+            keyword_index[keyword].add(park_id)
+    return phrase_index, keyword_index
+
+def keyword_overlap_matches(snapshot, query_phrases, query_keywords, candidates=None):
+    """Return {park_index: overlap_score}, touching only parks that share a term."""
+    counts = Counter()
+    for phrase in query_phrases:
+        counts.update(snapshot.phrase_index.get(phrase, ()))
+    for keyword in query_keywords:
+        counts.update(snapshot.keyword_index.get(keyword, ()))
+    if candidates is not None:
+        return {index: count for index, count in counts.items() if index in candidates}
+    return dict(counts)
+
+class QueryCache:
+    """Thread-safe LRU cache with a TTL and hit/miss/eviction counters."""
+
+    def __init__(self, max_entries=CACHE_MAX_ENTRIES, ttl_seconds=CACHE_TTL_SECONDS):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            stored_at, value = entry
+            if time.monotonic() - stored_at > self.ttl_seconds:
+                del self._entries[key]
+                self.expirations += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "size": len(self._entries),
+                "max_entries": self.max_entries,
+                "ttl_seconds": self.ttl_seconds,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+class Metrics:
+    """Thread-safe request/stage counters rendered in Prometheus text format."""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self._lock = threading.Lock()
+        self.stage_seconds = defaultdict(float)
+        self.stage_calls = Counter()
+        self.requests = Counter()
+        self.latency_counts = defaultdict(lambda: [0] * len(self.buckets))
+        self.latency_sum = defaultdict(float)
+        self.latency_count = Counter()
+        self.candidates = Counter()
+
+    def record_stage(self, stage, seconds, calls=1):
+        with self._lock:
+            self.stage_seconds[stage] += seconds
+            self.stage_calls[stage] += calls
+
+    def record_candidates(self, scored, matched):
+        with self._lock:
+            self.candidates["scored"] += scored
+            self.candidates["matched"] += matched
+
+    def record_request(self, endpoint, status, seconds):
+        with self._lock:
+            self.requests[(endpoint, status)] += 1
+            counts = self.latency_counts[endpoint]
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    counts[i] += 1
+            self.latency_sum[endpoint] += seconds
+            self.latency_count[endpoint] += 1
+
+    def render(self, cache_stats=None):
+        with self._lock:
+            lines = [
+                "# HELP parks_bot_requests_total HTTP requests by endpoint and status.",
+                "# TYPE parks_bot_requests_total counter",
+            ]
+            for (endpoint, status), count in sorted(self.requests.items()):
+                lines.append(f'parks_bot_requests_total{{endpoint="{endpoint}",status="{status}"}} {count}')
+
+            lines += [
+                "# HELP parks_bot_request_seconds Request wall time by endpoint.",
+                "# TYPE parks_bot_request_seconds histogram",
+            ]
+            for endpoint in sorted(self.latency_count):
+                for bound, count in zip(self.buckets, self.latency_counts[endpoint]):
+                    lines.append(f'parks_bot_request_seconds_bucket{{endpoint="{endpoint}",le="{bound}"}} {count}')
+                lines.append(f'parks_bot_request_seconds_bucket{{endpoint="{endpoint}",le="+Inf"}} {self.latency_count[endpoint]}')
+                lines.append(f'parks_bot_request_seconds_sum{{endpoint="{endpoint}"}} {self.latency_sum[endpoint]:.6f}')
+                lines.append(f'parks_bot_request_seconds_count{{endpoint="{endpoint}"}} {self.latency_count[endpoint]}')
+
+            lines += [
+                "# HELP parks_bot_stage_seconds_total Wall time spent in each matching stage.",
+                "# TYPE parks_bot_stage_seconds_total counter",
+            ]
+            for stage in sorted(self.stage_seconds):
+                lines.append(f'parks_bot_stage_seconds_total{{stage="{stage}"}} {self.stage_seconds[stage]:.6f}')
+            lines += [
+                "# HELP parks_bot_stage_calls_total Number of times each matching stage ran.",
+                "# TYPE parks_bot_stage_calls_total counter",
+            ]
+            for stage in sorted(self.stage_calls):
+                lines.append(f'parks_bot_stage_calls_total{{stage="{stage}"}} {self.stage_calls[stage]}')
+
+            lines += [
+                "# HELP parks_bot_candidates_total Parks scored and parks matched across queries.",
+                "# TYPE parks_bot_candidates_total counter",
+            ]
+            for kind in ("scored", "matched"):
+                lines.append(f'parks_bot_candidates_total{{kind="{kind}"}} {self.candidates[kind]}')
+
+        if cache_stats:
+            for name in ("hits", "misses", "evictions", "expirations"):
+                lines.append(f"# TYPE parks_bot_cache_{name}_total counter")
+                lines.append(f"parks_bot_cache_{name}_total {cache_stats[name]}")
+            lines.append("# TYPE parks_bot_cache_entries gauge")
+            lines.append(f"parks_bot_cache_entries {cache_stats['size']}")
+        return "\n".join(lines) + "\n"
+
+metrics = Metrics()
+query_cache = QueryCache()
+dataset_lock = threading.Lock()
+
+# Vector index over park embeddings, kept in sync incrementally across reloads
+park_index = create_index(VECTOR_INDEX_BACKEND, **({"n_probe": IVF_N_PROBE} if VECTOR_INDEX_BACKEND == "ivf" else {}))
+index_lock = threading.Lock()
+
+class DatasetSnapshot:
+    """
+    One loaded dataset and every index derived from it.
+
+    A snapshot is never modified after it is built. Reloads build a new one
+    and swap it in with a single assignment, and each request reads the one
+    snapshot it started with, so park indexes always match the texts and
+    records they point at.
+    """
+
+    def __init__(self, parks=(), texts=(), records=(), features=(), vector_ids=(), positions=None,
+                 phrase_index=None, keyword_index=None, geo_grid=None, coordinates=None,
+                 version=None, mtime=None, loaded=False):
+        self.parks = list(parks)
+        self.texts = list(texts)
+        self.records = list(records)
+        self.features = list(features)
+        self.vector_ids = list(vector_ids)
+        self.positions = positions or {}
+        self.phrase_index = phrase_index or {}
+        self.keyword_index = keyword_index or {}
+        self.geo_grid = geo_grid or {}
+        self.coordinates = coordinates or {}
+        self.version = version
+        self.mtime = mtime
+        self.loaded = loaded
+
+# Dataset state, replaced as a whole by load_dataset() on first use and on each reload
+dataset = DatasetSnapshot()
+
+def load_dataset(data_file=PARKS_FILE, encode=True):
+    """
+    (Re)load the parks JSON and rebuild every derived index.
+
+    The dataset version is a SHA-256 of the file contents; it is part of every
+    query cache key, and the cache is cleared on each reload.
+
+    Args:
+        data_file (str): Parks JSON path.
+        encode (bool): Allow embedding missing parks. When False and the
+            embedding cache is incomplete, the load is skipped (returns False)
+            so the encoding happens later, e.g. in forked workers.
+
+    Returns:
+        bool: True if the dataset was loaded.
+    """
+    global dataset
+
+    try:
+        with open(data_file, "rb") as file:
+            raw = file.read()
+        data = json.loads(raw)
+        mtime = os.path.getmtime(data_file)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Error loading JSON data: {e}")
+        raw, data, mtime = b"", [], None
+
+    # Precompute park texts, embeddings and spaCy features once per load
+    texts = [build_comparison_text(park) for park in data]
+    features = load_park_features(texts, data_file)
+    embeddings = load_park_embeddings(texts, data_file, encode=encode)
+    if embeddings is None:
+        print("Embedding cache is incomplete; deferring the dataset load until models may run")
+        return False
+    digests, matrix = embeddings
+    vector_ids = [int(digest[:15], 16) for digest in digests]
+    positions = defaultdict(list)
+    for position, vector_id in enumerate(vector_ids):
+        positions[vector_id].append(position)
+    phrase_index, keyword_index = build_term_index(features)
+    geo_grid, coordinates = build_geo_index(data)
+    snapshot = DatasetSnapshot(
+        parks=data,
+        texts=texts,
+        records=[build_park_record(park) for park in data],
+        features=features,
+        vector_ids=vector_ids,
+        positions=dict(positions),
+        phrase_index=phrase_index,
+        keyword_index=keyword_index,
+        geo_grid=geo_grid,
+        coordinates=coordinates,
+        version=hashlib.sha256(raw).hexdigest()[:16],
+        mtime=mtime,
+        loaded=True,
+    )
+    with index_lock:
+        added, removed = sync_vector_index(vector_ids, matrix)
+    dataset = snapshot
+    query_cache.clear()
+    print(f"Loaded {len(snapshot.parks)} parks (dataset version {snapshot.version}); "
+          f"vector index +{added}/-{removed}, {len(park_index)} vectors")
+    return True
+
+def ensure_dataset_current(data_file=PARKS_FILE, encode=True):
+    """
+    Load the dataset on first use, and reload it if the JSON file changed on disk.
+
+    Returns:
+        DatasetSnapshot: The current snapshot; callers keep it for the whole request.
+    """
+    try:
+        mtime = os.path.getmtime(data_file)
+    except OSError:
+        mtime = None
+    if not dataset.loaded or mtime != dataset.mtime:
+        with dataset_lock:
+            if not dataset.loaded or mtime != dataset.mtime:
+                load_dataset(data_file, encode=encode)
+    return dataset
+
+def is_ready():
+    return dataset.loaded and all(name in loaded_models for name in REQUIRED_MODELS)
+
+def warmup(run_inference=True):
+    """
+    Load the dataset and required models ahead of the first request.
+
+    Args:
+        run_inference (bool): Run the models now: a dummy query through each,
+            plus encoding any parks missing from the embedding cache. Pass
+            False when warming up in a parent process that will fork, since
+            torch thread pools do not survive fork cleanly; the dataset load
+            is then left to the workers if the cache is cold.
+    """
+    for name in REQUIRED_MODELS:
+        get_model(name)
+    ensure_dataset_current(encode=run_inference)
+    if run_inference:
+        get_model("nlp")("warmup")
+        get_model("embedding").encode(["warmup"], convert_to_numpy=True)
+
+warmup_lock = threading.Lock()
+warmup_thread = None
+
+def start_background_warmup():
+    """Run warmup() in a daemon thread once per process, so readiness is reached without traffic."""
+    global warmup_thread
+    with warmup_lock:
+        if warmup_thread is not None and (warmup_thread.is_alive() or is_ready()):
+            return
+        def run():
+            try:
+                warmup()
+            except Exception as e:
+                print(f"Background warmup failed: {e}")
+        warmup_thread = threading.Thread(target=run, name="warmup", daemon=True)
+        warmup_thread.start()
+
+def rank_parks(snapshot, query, query_phrases, query_keywords, embedding_scores, candidates=None):
+    """
+    Score every park against one preprocessed query in a single pass.
+
+    Each park gets all four signals (exact phrase, embedding similarity,
+    keyword overlap, fuzzy match) normalized to 0..1 and fused into one
+    weighted score. Parks with no matching signal are dropped.
+
+    Args:
+        snapshot (DatasetSnapshot): Dataset to score against.
+        query (str): The preprocessed query text.
+        query_phrases (set): Noun phrases from the parsed query.
+        query_keywords (set): Non-stopword lemmas from the parsed query.
+        embedding_scores (dict): {park_index: cosine_score} from embedding_matches().
+        candidates (dict): Optional {park_index: distance_km} from parks_within();
+            only these parks are scored.
+
+    Returns:
+        list: (score, park_index, signals) tuples, best first.
+    """
+    # Only parks sharing at least one phrase or lemma with the query get a score
+    started = time.perf_counter()
+    overlap_scores = keyword_overlap_matches(snapshot, query_phrases, query_keywords, candidates)
+    max_overlap = max(overlap_scores.values(), default=0)
+    metrics.record_stage("keyword_overlap", time.perf_counter() - started)
+
+    park_texts = snapshot.texts
+    park_ids = range(len(park_texts)) if candidates is None else sorted(candidates)
+    exact_seconds = fuzzy_seconds = 0.0
+    ranked = []
+    for index in park_ids:
+        comparison_text = park_texts[index]
+        signals = {}
+
+        started = time.perf_counter()
+        if any(phrase in comparison_text for phrase in query_phrases):
+            signals["exact"] = 1.0
+        exact_done = time.perf_counter()
+        fuzzy_score = fuzz.partial_ratio(query, comparison_text)
+        fuzzy_done = time.perf_counter()
+        exact_seconds += exact_done - started
+        fuzzy_seconds += fuzzy_done - exact_done
+
+        if index in embedding_scores:
+            signals["embedding"] = embedding_scores[index]
+        if index in overlap_scores:
+            signals["overlap"] = overlap_scores[index]
+        if fuzzy_score > FUZZY_THRESHOLD:
+            signals["fuzzy"] = fuzzy_score
+
+        if not signals:
+            continue
+
+        score = (
+            FUSION_WEIGHTS["exact"] * signals.get("exact", 0.0)
+            + FUSION_WEIGHTS["embedding"] * signals.get("embedding", 0.0)
+            + FUSION_WEIGHTS["overlap"] * signals.get("overlap", 0) / (max_overlap or 1)
+            + FUSION_WEIGHTS["fuzzy"] * signals.get("fuzzy", 0) / 100
+        )
+        if candidates is not None:
+            signals["distance_km"] = candidates[index]
+        ranked.append((score, index, signals))
+
+    ranked.sort(key=lambda item: (-item[0], item[1]))
+
+    metrics.record_stage("exact_phrase", exact_seconds)
+    metrics.record_stage("fuzzy", fuzzy_seconds)
+    metrics.record_candidates(len(park_ids), len(ranked))
+    return ranked
+
+def rank_queries(snapshot, queries, location=None, use_cache=True):
+    """
+    Rank parks for a batch of preprocessed queries, serving repeats from the cache.
+
+    Cache keys are (dataset version, preprocessed query, location). Misses are
+    parsed with nlp.pipe and embedded in a single batch. Pass use_cache=False
+    to force the full pipeline (used when profiling a request).
+
+    Args:
+        snapshot (DatasetSnapshot): From ensure_dataset_current(); pass the
+            same one to format_results() so indexes resolve to the same parks.
+
+    Returns:
+        list: One rank_parks() result per query, in input order.
+    """
+    candidates = parks_within(snapshot, *location) if location else None
+
+    keys = [(snapshot.version, query, location) for query in queries]
+    ranked = [query_cache.get(key) if use_cache else None for key in keys]
+    misses = [i for i, result in enumerate(ranked) if result is None]
+    if not misses:
+        return ranked
+
+    miss_queries = [queries[i] for i in misses]
+    started = time.perf_counter()
+    terms = [extract_terms(doc) for doc in get_model("nlp").pipe(miss_queries, batch_size=32)]
+    metrics.record_stage("spacy", time.perf_counter() - started)
+
+    # Score every query against the parks in one vectorized pass
+    started = time.perf_counter()
+    try:
+        embedding_scores = embedding_matches(snapshot, miss_queries, candidates)
+        cacheable = use_cache
+    except Exception as e:
+        print(f"Error during embedding similarity scoring: {e}")
+        embedding_scores = [{} for _ in miss_queries]
+        cacheable = False
+    metrics.record_stage("embedding", time.perf_counter() - started)
+
+    for i, (phrases, keywords), scores in zip(misses, terms, embedding_scores):
+        ranked[i] = rank_parks(snapshot, queries[i], phrases, keywords, scores, candidates)
+        if cacheable:
+            query_cache.put(keys[i], ranked[i])
+    return ranked
+
+def format_results(snapshot, ranked, offset, limit):
+    """Build one deduplicated result dictionary per park for the requested page, from the snapshot it was ranked on."""
+    method_names = {
+        "exact": "Exact Phrase Match",
+        "embedding": "Embedding Similarity",
+        "overlap": "Keyword Overlap",
+        "fuzzy": "Fuzzy Matching",
+    }
+    results = []
+    for score, index, signals in ranked[offset:offset + limit]:
+        result = dict(snapshot.records[index])
+        result["score"] = round(score, 3)
+        result["matching_methods"] = [method_names[name] for name in method_names if name in signals]
+        if "embedding" in signals:
+            result["similarity_score"] = round(signals["embedding"], 2)
+        if "overlap" in signals:
+            result["overlap_score"] = signals["overlap"]
+        if "fuzzy" in signals:
+            result["fuzzy_score"] = signals["fuzzy"]
+        if "distance_km" in signals:
+            result["distance_km"] = round(signals["distance_km"], 1)
+        results.append(result)
+    return results
+
+def parse_paging(params):
+    """Read 'limit' and 'offset' from request params, raising ValueError if invalid."""
+    limit = int(params.get("limit", DEFAULT_LIMIT))
+    offset = int(params.get("offset", 0))
+    if not 1 <= limit <= MAX_LIMIT or offset < 0:
+        raise ValueError(f"limit must be 1-{MAX_LIMIT} and offset must be >= 0")
+    return limit, offset
+
+def parse_location(params):
+    """
+    Read optional 'lat', 'lon' and 'radius_km' from request params.
+
+    Returns:
+        tuple: (lat, lon, radius_km), or None when no location was given.
+    """
+    lat, lon = params.get("lat"), params.get("lon")
+    if lat is None and lon is None:
+        return None
+    if lat is None or lon is None:
+        raise ValueError("lat and lon must be provided together")
+    lat, lon = float(lat), float(lon)
+    radius_km = float(params.get("radius_km", DEFAULT_RADIUS_KM))
+    if not all(math.isfinite(value) for value in (lat, lon, radius_km)):
+        raise ValueError("lat, lon and radius_km must be finite numbers")
+    if not -90 <= lat <= 90 or not -180 <= lon <= 180 or not 0 < radius_km <= MAX_RADIUS_KM:
+        raise ValueError(f"lat/lon out of range or radius_km not in (0, {MAX_RADIUS_KM}]")
+    return lat, lon, radius_km
+
+def profile_summary(profiler, top_n=PROFILE_TOP_N):
+    """Render the top cProfile entries by cumulative time as text."""
+    stream = io.StringIO()
+    pstats.Stats(profiler, stream=stream).sort_stats("cumulative").print_stats(top_n)
+    return stream.getvalue()
+
+def build_page(snapshot, original_query, ranked, offset, limit):
+    return {
+        "query": original_query,
+        "total": len(ranked),
+        "offset": offset,
+        "limit": limit,
+        "results": format_results(snapshot, ranked, offset, limit),
+    }
+
 # Define your routes after app is created
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_metrics(response):
+    started = g.get("request_started")
+    if started is not None:
+        endpoint = request.url_rule.rule if request.url_rule else "unmatched"
+        metrics.record_request(endpoint, response.status_code, time.perf_counter() - started)
+    return response
+
 @app.route("/ask", methods=["GET", "POST"])
 def ask():
     if request.method == "GET":
-        query = request.args.get("query", "").strip()
+        params = request.args
     elif request.method == "POST":
-        data = request.get_json()
-        query = data.get("query", "").strip() if data else ""
+        params = request.get_json(silent=True)
+        if not isinstance(params, dict):
+            params = {}
     else:
         return jsonify({"error": "Invalid method"}), 405
 
-    if not query:
+    original_query = str(params.get("query", "")).strip()
+    if not original_query:
         return jsonify({"error": "No query provided"}), 400
 
-    # Preprocess query
-    query = preprocess_text(query)
-    query_doc = nlp(query)
-    query_phrases = {chunk.text.lower() for chunk in query_doc.noun_chunks}
-    query_keywords = {token.lemma_ for token in query_doc if not token.is_stop}
+    try:
+        limit, offset = parse_paging(params)
+        location = parse_location(params)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request parameters: {e}"}), 400
 
-    print(f"Query Phrases: {query_phrases}")
-    print(f"Query Keywords: {query_keywords}")
+    # Preprocess query; location pruning happens before any NLP scoring runs
+    query = preprocess_text(original_query)
+    snapshot = ensure_dataset_current()
 
-    results = []
+    if str(params.get("profile", "")).lower() in ("1", "true"):
+        # Profile the full pipeline for this request, bypassing the result cache
+        profiler = cProfile.Profile()
+        ranked = profiler.runcall(rank_queries, snapshot, [query], location, False)[0]
+        page = build_page(snapshot, original_query, ranked, offset, limit)
+        page["profile"] = profile_summary(profiler)
+        return jsonify(page)
 
-    for park in parks_data:
-        park_name = preprocess_text(park.get("park_name", ""))
-        description = preprocess_text(park.get("description", ""))
-        features = preprocess_text(park.get("google_results", [{}])[0].get("snippet", ""))
-        comparison_text = f"{park_name} {description} {features}"
+    ranked = rank_queries(snapshot, [query], location)[0]
 
-        # Option 1: Check for exact phrase matches
-        if any(phrase in comparison_text for phrase in query_phrases):
-            results.append({
-                "park_name": park.get("park_name", "Unknown"),
-                "description": park.get("description", "No description available."),
-                "features": park.get("google_results", [{}])[0].get("snippet", "No features available"),
-                "url": park.get("url", "No URL available"),
-                "matching_method": "Exact Phrase Match"
-            })
-
-        # Option 2: Sentence Embeddings for contextual similarity
-        try:
-            query_embedding = embedding_model.encode(query, convert_to_tensor=True)
-            park_embedding = embedding_model.encode(comparison_text, convert_to_tensor=True)
-            embedding_similarity_score = util.pytorch_cos_sim(query_embedding, park_embedding).item()
-            if embedding_similarity_score > 0.5:  # Adjust threshold for context relevance
-                results.append({
-                    "park_name": park.get("park_name", "Unknown"),
-                    "description": park.get("description", "No description available."),
-                    "features": park.get("google_results", [{}])[0].get("snippet", "No features available"),
-                    "url": park.get("url", "No URL available"),
-                    "similarity_score": round(embedding_similarity_score, 2),
-                    "matching_method": "Embedding Similarity"
-                })
-        except Exception as e:
-            print(f"Error during embedding similarity scoring for {park_name}: {e}")
-
-        # Option 3: Keyword Overlap with expanded context
-        park_doc = nlp(comparison_text)
-        park_phrases = {chunk.text.lower() for chunk in park_doc.noun_chunks}
-        park_keywords = {token.lemma_ for token in park_doc if not token.is_stop}
-
-        if query_phrases & park_phrases or query_keywords & park_keywords:
-            overlap_score = len(query_phrases & park_phrases) + len(query_keywords & park_keywords)
-            results.append({
-                "park_name": park.get("park_name", "Unknown"),
-                "description": park.get("description", "No description available."),
-                "features": park.get("google_results", [{}])[0].get("snippet", "No features available"),
-                "url": park.get("url", "No URL available"),
-                "overlap_score": overlap_score,
-                "matching_method": "Keyword Overlap"
-            })
-
-        # Option 4: Fuzzy Matching for lenient text match
-        fuzzy_score = fuzz.partial_ratio(query, comparison_text)
-        if fuzzy_score > 80:  # Adjust threshold for fuzzy matching
-            results.append({
-                "park_name": park.get("park_name", "Unknown"),
-                "description": park.get("description", "No description available."),
-                "features": park.get("google_results", [{}])[0].get("snippet", "No features available"),
-                "url": park.get("url", "No URL available"),
-                "fuzzy_score": fuzzy_score,
-                "matching_method": "Fuzzy Matching"
-            })
-
-    if not results:
+    if not ranked:
         return jsonify({"message": "No parks found matching your query. Please try rephrasing or providing more details."}), 204
 
-    # Sort and filter results for relevance
-    results = sorted(results, key=lambda x: x.get("similarity_score", 0), reverse=True)
+    return jsonify(build_page(snapshot, original_query, ranked, offset, limit))
+
+@app.route("/ask/batch", methods=["POST"])
+def ask_batch():
+    """
+    Answer several queries in one request.
+
+    Expects a JSON body of the form {"queries": ["...", "..."]} with optional
+    'limit', 'offset', 'lat', 'lon' and 'radius_km' applied to every query.
+    Preprocessing, spaCy parsing (nlp.pipe) and query embedding all run as
+    single batches, and repeated queries are served from the result cache.
+    """
+    data = request.get_json(silent=True)
+    if not isinstance(data, dict):
+        data = {}
+    queries = data.get("queries")
+
+    if not isinstance(queries, list) or not queries or not all(isinstance(q, str) and q.strip() for q in queries):
+        return jsonify({"error": "Provide 'queries' as a non-empty list of non-empty strings"}), 400
+    if len(queries) > MAX_BATCH_QUERIES:
+        return jsonify({"error": f"At most {MAX_BATCH_QUERIES} queries per batch"}), 400
+
+    try:
+        limit, offset = parse_paging(data)
+        location = parse_location(data)
+    except (TypeError, ValueError) as e:
+        return jsonify({"error": f"Invalid request parameters: {e}"}), 400
+
+    processed = [preprocess_text(q) for q in queries]
+    snapshot = ensure_dataset_current()
+    ranked = rank_queries(snapshot, processed, location)
+
+    return jsonify({
+        "results": [
+            build_page(snapshot, original, result, offset, limit)
+            for original, result in zip(queries, ranked)
+        ]
+    })
+
+@app.route("/stats", methods=["GET"])
+def stats():
+    return jsonify({
+        "cache": query_cache.stats(),
+        "dataset": {"version": dataset.version, "parks": len(dataset.parks)},
+    })
+
+@app.route("/metrics", methods=["GET"])
+def metrics_route():
+    return Response(metrics.render(query_cache.stats()), mimetype="text/plain; version=0.0.4")
+
+@app.route("/healthz", methods=["GET"])
+def healthz():
+    # Liveness only: the process is up and serving requests
+    return jsonify({"status": "ok"})
+
+@app.route("/readyz", methods=["GET"])
+def readyz():
+    # A not-ready worker starts warming up on the first probe instead of waiting for traffic
+    if not is_ready():
+        start_background_warmup()
+    body = {
+        "ready": is_ready(),
+        "dataset_loaded": dataset.loaded,
+        "models_loaded": sorted(loaded_models),
+    }
+    return jsonify(body), 200 if body["ready"] else 503
+
+@app.route("/warmup", methods=["POST"])
+def warmup_route():
+    started = time.perf_counter()
+    warmup()
+    return jsonify({"ready": is_ready(), "seconds": round(time.perf_counter() - started, 3)})
 
-    return jsonify(results)
+if PRELOAD_MODELS:
+    warmup(run_inference=False)
+    gc.freeze()  # Keep the preloaded objects out of GC scans so forked pages stay shared
+    # Each forked worker finishes the warmup (inference, any cold embeddings) in the background
+    os.register_at_fork(after_in_child=start_background_warmup)
 
 # Run the app
 if __name__ == "__main__":
@@ -0,0 +1,314 @@
+import argparse
+import hashlib
+import importlib.util
+import json
+import os
+import random
+import re
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+SCRIPT_DIR = os.path.dirname(os.path.abspath(__file__))
+API_SCRIPT = os.path.join(SCRIPT_DIR, "flask-bot-api.py")
+DATA_FILE = os.path.join(SCRIPT_DIR, "data", "ohio_state_parks_with_google_results.json")
+
+COMMON_QUERIES = [
+    "fishing", "camping near lake", "hiking trails", "boating and swimming",
+    "horseback riding", "quiet woodlands", "waterfalls", "cabins for rent",
+    "bird watching", "family picnic shelters", "mountain biking", "nature center",
+]
+STOP_WORDS = {
+    "a", "an", "and", "are", "as", "at", "be", "by", "for", "from", "in", "is",
+    "it", "its", "near", "of", "on", "or", "that", "the", "this", "to", "with",
+}
+STUB_EMBEDDING_DIM = 384
+
+# ---------------------------
+# Offline Stub Models
+# ---------------------------
+class StubToken:
+    def __init__(self, text):
+        self.text = text
+        self.lemma_ = text[:-1] if len(text) > 3 and text.endswith("s") else text
+        self.is_stop = text in STOP_WORDS
+
+class StubSpan:
+    def __init__(self, text):
+        self.text = text
+
+class StubDoc:
+    def __init__(self, text):
+        self.tokens = [StubToken(word) for word in text.split()]
+        # Treat each run of non-stopwords as a noun chunk
+        self.noun_chunks, run = [], []
+        for token in self.tokens + [StubToken("the")]:
+            if token.is_stop:
+                if run:
+                    self.noun_chunks.append(StubSpan(" ".join(run)))
+                run = []
+            else:
+                run.append(token.text)
+
+    def __iter__(self):
+        return iter(self.tokens)
+
+class StubNLP:
+    """Whitespace tokenizer exposing the slice of the spaCy API the bot uses."""
+
+    def __call__(self, text):
+        return StubDoc(text)
+
+    def pipe(self, texts, batch_size=None):
+        return (StubDoc(text) for text in texts)
+
+class StubEmbedder:
+    """Hashed bag-of-words vectors standing in for the SentenceTransformer."""
+
+    def encode(self, sentences, batch_size=32, convert_to_numpy=True, normalize_embeddings=False, **kwargs):
+        single = isinstance(sentences, str)
+        texts = [sentences] if single else list(sentences)
+        matrix = np.zeros((len(texts), STUB_EMBEDDING_DIM), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for word in re.findall(r"[a-z0-9]+", text.lower()):
+                bucket = int(hashlib.md5(word.encode("utf-8")).hexdigest()[:8], 16)
+                matrix[row, bucket % STUB_EMBEDDING_DIM] += 1.0
+        if normalize_embeddings:
+            norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+            matrix /= np.where(norms == 0, 1, norms)
+        return matrix[0] if single else matrix
+
+# ---------------------------
+# Stage Timing
+# ---------------------------
+class StageTimer:
+    """Thread-safe accumulator of wall time per pipeline stage."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.seconds = defaultdict(float)
+            self.calls = Counter()
+
+    def record(self, stage, seconds):
+        with self._lock:
+            self.seconds[stage] += seconds
+            self.calls[stage] += 1
+
+    def wrap(self, stage, func):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return timed
+
+class TimedNLP:
+    def __init__(self, model, timer):
+        self.model, self.timer = model, timer
+
+    def __call__(self, text):
+        return self.timer.wrap("spacy", self.model)(text)
+
+    def pipe(self, texts, **kwargs):
+        # Materialize the generator so parsing time is attributed to this stage
+        return self.timer.wrap("spacy", lambda: list(self.model.pipe(texts, **kwargs)))()
+
+class TimedEmbedder:
+    def __init__(self, model, timer):
+        self.model, self.timer = model, timer
+
+    def encode(self, *args, **kwargs):
+        return self.timer.wrap("embedding", self.model.encode)(*args, **kwargs)
+
+class TimedFuzz:
+    def __init__(self, fuzz_module, timer):
+        self.partial_ratio = timer.wrap("fuzzy", fuzz_module.partial_ratio)
+
+# ---------------------------
+# Benchmark Functions
+# ---------------------------
+def load_api(data_file):
+    """Import flask-bot-api.py as a module, pointed at the given dataset copy."""
+    os.environ["PARKS_BOT_DATA"] = data_file
+    os.environ.pop("PARKS_BOT_PRELOAD", None)
+    spec = importlib.util.spec_from_file_location("flask_bot_api", API_SCRIPT)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+def instrument(api, timer, use_stubs):
+    """Install stub models (optionally) and wrap each pipeline stage with a timer."""
+    if use_stubs:
+        api.EMBEDDING_MODEL_NAME = "benchmark-stub"  # Keep stub vectors out of real caches
+        api.loaded_models["nlp"] = StubNLP()
+        api.loaded_models["embedding"] = StubEmbedder()
+    # Load the dataset (and build caches) before timing anything
+    api.ensure_dataset_current()
+    api.loaded_models["nlp"] = TimedNLP(api.get_model("nlp"), timer)
+    api.loaded_models["embedding"] = TimedEmbedder(api.get_model("embedding"), timer)
+    api.preprocess_text = timer.wrap("preprocess", api.preprocess_text)
+    api.fuzz = TimedFuzz(api.fuzz, timer)
+    api.jsonify = timer.wrap("serialization", api.jsonify)
+
+def build_query_corpus(parks, size, seed):
+    """
+    Build realistic queries from the park dataset.
+
+    Mixes common activity searches, park names and short phrases lifted from
+    park descriptions, so repeated and unique queries both show up.
+    """
+    rng = random.Random(seed)
+    candidates = list(COMMON_QUERIES)
+    for park in parks:
+        name = park.get("park_name", "")
+        if name:
+            candidates.append(name.title())
+            candidates.append(f"camping at {name.title()}")
+        words = re.findall(r"[A-Za-z]+", park.get("description") or "")
+        if len(words) >= 3:
+            start = rng.randrange(len(words) - 2)
+            candidates.append(" ".join(words[start:start + rng.randint(2, 3)]).lower())
+    return [rng.choice(candidates) for _ in range(size)]
+
+def percentile(sorted_values, pct):
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(1, int(np.ceil(pct / 100 * len(sorted_values))))
+    return sorted_values[rank - 1]
+
+def run_benchmark(api, queries, concurrency, use_cache, limit):
+    latencies, statuses = [], Counter()
+    lock = threading.Lock()
+
+    def send(query):
+        if not use_cache:
+            api.query_cache.clear()
+        client = api.app.test_client()
+        started = time.perf_counter()
+        response = client.get("/ask", query_string={"query": query, "limit": limit})
+        elapsed = time.perf_counter() - started
+        with lock:
+            latencies.append(elapsed)
+            statuses[response.status_code] += 1
+
+    started = time.perf_counter()
+    if concurrency > 1:
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            list(pool.map(send, queries))
+    else:
+        for query in queries:
+            send(query)
+    wall_seconds = time.perf_counter() - started
+    return latencies, statuses, wall_seconds
+
+def summarize(latencies, statuses, wall_seconds, timer, cache_before, cache_after, config):
+    ordered = sorted(latencies)
+    total_request_seconds = sum(latencies)
+    stages = {}
+    for stage in ("preprocess", "spacy", "embedding", "fuzzy", "serialization"):
+        seconds = timer.seconds.get(stage, 0.0)
+        stages[stage] = {
+            "total_ms": round(seconds * 1000, 3),
+            "mean_ms_per_request": round(seconds * 1000 / max(len(latencies), 1), 4),
+            "calls": timer.calls.get(stage, 0),
+            "share": round(seconds / total_request_seconds, 4) if total_request_seconds else 0.0,
+        }
+    return {
+        "config": config,
+        "requests": len(latencies),
+        "status_codes": {str(code): count for code, count in sorted(statuses.items())},
+        "wall_seconds": round(wall_seconds, 4),
+        "throughput_rps": round(len(latencies) / wall_seconds, 2) if wall_seconds else 0.0,
+        "latency_ms": {
+            "mean": round(total_request_seconds * 1000 / max(len(latencies), 1), 3),
+            "p50": round(percentile(ordered, 50) * 1000, 3),
+            "p95": round(percentile(ordered, 95) * 1000, 3),
+            "p99": round(percentile(ordered, 99) * 1000, 3),
+            "max": round((ordered[-1] if ordered else 0.0) * 1000, 3),
+        },
+        "stages": stages,
+        "cache": {
+            key: cache_after[key] - cache_before[key]
+            for key in ("hits", "misses", "evictions", "expirations")
+        },
+    }
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Load-test and latency benchmark for flask-bot-api.py /ask.")
+    parser.add_argument("--requests", type=int, default=500, help="Number of timed /ask requests.")
+    parser.add_argument("--warmup", type=int, default=20, help="Untimed requests sent first.")
+    parser.add_argument("--concurrency", type=int, default=1, help="Concurrent client threads.")
+    parser.add_argument("--limit", type=int, default=10, help="'limit' sent with each query.")
+    parser.add_argument("--seed", type=int, default=42, help="Seed for the query corpus.")
+    parser.add_argument("--cache", action="store_true", help="Leave the query result cache enabled.")
+    parser.add_argument("--real-models", action="store_true", help="Use spaCy/SentenceTransformer instead of offline stubs.")
+    parser.add_argument("--data", default=DATA_FILE, help="Parks dataset to benchmark against.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        # Work on a copy so embedding/feature caches never land next to the real dataset
+        data_copy = os.path.join(work_dir, os.path.basename(args.data))
+        shutil.copy(args.data, data_copy)
+
+        api = load_api(data_copy)
+        timer = StageTimer()
+        instrument(api, timer, use_stubs=not args.real_models)
+
+        with open(data_copy, "r", encoding="utf-8") as file:
+            parks = json.load(file)
+        queries = build_query_corpus(parks, args.warmup + args.requests, args.seed)
+
+        if args.warmup:
+            run_benchmark(api, queries[:args.warmup], 1, args.cache, args.limit)
+        # Discard warmup timings and cache entries
+        timer.reset()
+        api.query_cache.clear()
+        cache_before = api.query_cache.stats()
+
+        latencies, statuses, wall_seconds = run_benchmark(
+            api, queries[args.warmup:], args.concurrency, args.cache, args.limit
+        )
+
+    config = {
+        "requests": args.requests,
+        "warmup": args.warmup,
+        "concurrency": args.concurrency,
+        "limit": args.limit,
+        "seed": args.seed,
+        "cache": args.cache,
+        "models": "real" if args.real_models else "stub",
+        "parks": len(parks),
+    }
+    report = summarize(latencies, statuses, wall_seconds, timer, cache_before, api.query_cache.stats(), config)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        latency = report["latency_ms"]
+        print(f"✅ {report['requests']} requests: p50 {latency['p50']} ms, p95 {latency['p95']} ms, "
+              f"p99 {latency['p99']} ms, {report['throughput_rps']} req/s. Report saved to {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+if __name__ == "__main__":
+    main()
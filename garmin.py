@@ -1,74 +1,258 @@
 import garminconnect
+import argparse
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 import os
 import hvac
+from garmin_lake import compact_json_folder
 
 # ---------------------------
 # Vault Configuration
 # ---------------------------
 VAULT_ADDR = "http://127.0.0.1:8200"
 VAULT_TOKEN = os.getenv("VAULT_TOKEN", "your-token-here")
-client = hvac.Client(url=VAULT_ADDR, token=VAULT_TOKEN)
-
-# Fetch Garmin credentials from Vault
-try:
-    vault_secrets = client.secrets.kv.v2.read_secret_version(
-        path="automation_keys",
-        raise_on_deleted_version=True
-    )["data"]["data"]
-    username = vault_secrets["GARMIN_USER_ID"]
-    password = vault_secrets["GARMIN_USER_PASSWORD"]
-except Exception as e:
-    print(f"Error accessing Vault for Garmin credentials: {e}")
-    exit(1)
 
 # ---------------------------
-# Garmin Data Export Function
+# Configuration Parameters
 # ---------------------------
-def get_garmin_biometrics(start_date, end_date, output_folder):
+DEFAULT_OUTPUT_FOLDER = "/home/jeff/data/raw/garmin_biometrics_data"
+CHECKPOINT_FILE = ".backfill_checkpoint"  # One completed date per line, kept inside the output folder
+REFETCH_RECENT_DAYS = 2  # Today and yesterday are still filling in until the device syncs, so they are never checkpointed
+DEFAULT_WORKERS = 4
+MAX_RATE_LIMIT_RETRIES = 6
+THROTTLE_MIN_INTERVAL = 0.0  # Seconds between request starts when Garmin is not pushing back
+THROTTLE_BACKOFF_START = 1.0  # First interval used after a rate-limit error
+THROTTLE_MAX_INTERVAL = 60.0
+THROTTLE_COOLDOWN = 30.0  # Every worker pauses this long after a rate-limit error
+THROTTLE_RECOVERY = 0.9  # Interval multiplier after each successful request
+
+def get_garmin_credentials():
+    """Fetch the Garmin username and password from Vault."""
+    client = hvac.Client(url=VAULT_ADDR, token=VAULT_TOKEN)
     try:
-        # Initialize the Garmin client
-        client = garminconnect.Garmin(username, password)
-        client.login()  # Log in to Garmin Connect
+        vault_secrets = client.secrets.kv.v2.read_secret_version(
+            path="automation_keys",
+            raise_on_deleted_version=True
+        )["data"]["data"]
+        return vault_secrets["GARMIN_USER_ID"], vault_secrets["GARMIN_USER_PASSWORD"]
+    except Exception as e:
+        print(f"Error accessing Vault for Garmin credentials: {e}")
+        exit(1)
+
+# ---------------------------
+# Throttling & Checkpointing
+# ---------------------------
+class AdaptiveThrottle:
+    """
+    Thread-safe request pacing shared by every backfill worker.
 
-        # Create the output folder if it doesn't exist
-        os.makedirs(output_folder, exist_ok=True)
+    Runs unthrottled until Garmin rate-limits us, then doubles the interval
+    between request starts (up to max_interval) and pauses all workers for
+    the cooldown. Each success shrinks the interval again, so throughput
+    climbs back once Garmin stops pushing back.
+    """
 
-        # Loop through the date range
-        current_date = start_date
-        while current_date <= end_date:
-            cdate_str = current_date.strftime('%Y-%m-%d')
-            print(f"Fetching data for {cdate_str}")
+    def __init__(self, min_interval=THROTTLE_MIN_INTERVAL, max_interval=THROTTLE_MAX_INTERVAL,
+                 cooldown=THROTTLE_COOLDOWN, recovery=THROTTLE_RECOVERY):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.cooldown = cooldown
+        self.recovery = recovery
+        self.interval = min_interval
+        self.next_slot = time.monotonic()
+        self.lock = threading.Lock()
 
-            try:
-                # Fetch biometrics data for the current date
-                biometrics = client.get_user_summary(cdate_str)
+    def wait(self):
+        """Block until this worker may send its next request."""
+        with self.lock:
+            now = time.monotonic()
+            slot = max(now, self.next_slot)
+            self.next_slot = slot + self.interval
+        time.sleep(max(0.0, slot - now))
 
-                # Save the data to a JSON file
-                file_name = f"{output_folder}/{cdate_str}.json"
-                with open(file_name, "w") as json_file:
-                    json.dump(biometrics, json_file, indent=4)
+    def on_success(self):
+        with self.lock:
+            self.interval *= self.recovery
+            if self.interval <= self.min_interval + 0.05:
+                self.interval = self.min_interval  # Snap back rather than decaying forever
 
-            except Exception as e:
-                print(f"Error fetching data for {cdate_str}: {str(e)}")
+    def on_rate_limited(self):
+        with self.lock:
+            self.interval = min(self.max_interval, max(THROTTLE_BACKOFF_START, self.interval * 2))
+            self.next_slot = max(self.next_slot, time.monotonic() + self.cooldown)
 
-            # Move to the next day
-            current_date += timedelta(days=1)
+class BackfillCheckpoint:
+    """
+    Append-only record of dates already exported.
 
-        print("✅ Data export completed successfully.")
+    Each completed date is appended and flushed immediately, so an
+    interrupted backfill resumes where it stopped. A torn last line from a
+    crash is ignored on the next load.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.lock = threading.Lock()
+        self.completed = set()
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as file:
+                self.completed = {line.strip() for line in file if len(line.strip()) == 10}
+
+    def __contains__(self, date_str):
+        return date_str in self.completed
+
+    def mark(self, date_str):
+        with self.lock:
+            if date_str in self.completed:
+                return
+            with open(self.path, "a", encoding="utf-8") as file:
+                file.write(date_str + "\n")
+            self.completed.add(date_str)
+
+def is_rate_limited(error):
+    """True for Garmin 429 responses, whether raised by garminconnect or a stub."""
+    too_many = getattr(garminconnect, "GarminConnectTooManyRequestsError", None)
+    if too_many is not None and isinstance(error, too_many):
+        return True
+    message = str(error)
+    return "429" in message or "Too Many Requests" in message
+
+# ---------------------------
+# Garmin Data Export Function
+# ---------------------------
+def create_client(username, password):
+    """Log in once; the client is shared by every backfill worker."""
+    client = garminconnect.Garmin(username, password)
+    client.login()
+    return client
+
+def refetch_cutoff(refetch_days=REFETCH_RECENT_DAYS, today=None):
+    """First YYYY-MM-DD date that is still refetched on every run (dates are compared as strings)."""
+    today = today or datetime.now()
+    return (today - timedelta(days=max(refetch_days, 0) - 1)).strftime('%Y-%m-%d')
 
+def pending_dates(start_date, end_date, output_folder, checkpoint, cutoff=None):
+    """
+    Dates in the range that have neither a checkpoint entry nor an output file.
+
+    Dates on or after cutoff are always pending, since their summaries may
+    still be incomplete.
+    """
+    dates = []
+    current_date = start_date
+    while current_date <= end_date:
+        cdate_str = current_date.strftime('%Y-%m-%d')
+        recent = cutoff is not None and cdate_str >= cutoff
+        if recent or (cdate_str not in checkpoint and not os.path.exists(os.path.join(output_folder, f"{cdate_str}.json"))):
+            dates.append(cdate_str)
+        current_date += timedelta(days=1)
+    return dates
+
+def export_day(client, cdate_str, output_folder, throttle, max_retries=MAX_RATE_LIMIT_RETRIES):
+    """
+    Fetch one day's summary and write it to <output_folder>/<date>.json.
+
+    Rate-limit errors are retried after the shared throttle backs off; any
+    other error is raised so the day stays pending for the next run.
+    """
+    for attempt in range(max_retries + 1):
+        throttle.wait()
+        try:
+            biometrics = client.get_user_summary(cdate_str)
+            break
+        except Exception as e:
+            if not is_rate_limited(e) or attempt == max_retries:
+                raise
+            throttle.on_rate_limited()
+            print(f"⚠️ Rate limited on {cdate_str}; backing off to {throttle.interval:.1f}s between requests.")
+    throttle.on_success()
+
+    # Write under a temp name so an interrupted run never leaves a truncated file to be skipped
+    file_name = os.path.join(output_folder, f"{cdate_str}.json")
+    temp_name = f"{file_name}.tmp"
+    with open(temp_name, "w") as json_file:
+        json.dump(biometrics, json_file, indent=4)
+    os.replace(temp_name, file_name)
+
+def get_garmin_biometrics(start_date, end_date, output_folder, client=None, workers=DEFAULT_WORKERS, throttle=None,
+                          refetch_days=REFETCH_RECENT_DAYS):
+    """
+    Export daily Garmin summaries for a date range, concurrently and resumably.
+
+    Args:
+        start_date (datetime): First day to export.
+        end_date (datetime): Last day to export (inclusive).
+        output_folder (str): Folder for the per-day JSON files and checkpoint.
+        client: Logged-in Garmin client (or a stub exposing get_user_summary);
+            created from Vault credentials when omitted.
+        workers (int): Maximum concurrent requests.
+        throttle (AdaptiveThrottle): Shared pacing; a fresh one by default.
+        refetch_days (int): The most recent days (counting today) that are
+            re-exported on every run and never checkpointed.
+
+    Returns:
+        dict: Counts of exported and skipped days, the dates that failed and
+        the recent dates that were re-exported.
+    """
+    try:
+        if client is None:
+            client = create_client(*get_garmin_credentials())
     except Exception as e:
         print(f"🚨 Error initializing Garmin client: {str(e)}")
+        return None
+
+    os.makedirs(output_folder, exist_ok=True)
+    checkpoint = BackfillCheckpoint(os.path.join(output_folder, CHECKPOINT_FILE))
+    throttle = throttle or AdaptiveThrottle()
+    cutoff = refetch_cutoff(refetch_days)
+    dates = pending_dates(start_date, end_date, output_folder, checkpoint, cutoff)
+    total_days = (end_date - start_date).days + 1
+    print(f"Fetching {len(dates)} of {total_days} days ({total_days - len(dates)} already exported)")
+
+    def run(cdate_str):
+        try:
+            export_day(client, cdate_str, output_folder, throttle)
+        except Exception as e:
+            print(f"Error fetching data for {cdate_str}: {str(e)}")
+            return False
+        if cdate_str < cutoff:
+            checkpoint.mark(cdate_str)
+        print(f"Fetched data for {cdate_str}")
+        return True
+
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        outcomes = list(pool.map(run, dates))
+
+    failed = [cdate_str for cdate_str, ok in zip(dates, outcomes) if not ok]
+    if failed:
+        print(f"⚠️ {len(failed)} days failed and will be retried on the next run.")
+    else:
+        print("✅ Data export completed successfully.")
+    refreshed = [cdate_str for cdate_str, ok in zip(dates, outcomes) if ok and cdate_str >= cutoff]
+    return {"exported": len(dates) - len(failed), "skipped": total_days - len(dates), "failed": failed,
+            "refreshed": refreshed}
 
 # ---------------------------
 # Main Execution
 # ---------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Export daily Garmin Connect summaries as JSON.")
+    parser.add_argument("--start", help="Start date YYYY-MM-DD (prompted for when omitted).")
+    parser.add_argument("--end", help="End date YYYY-MM-DD (prompted for when omitted).")
+    parser.add_argument("--output", default=DEFAULT_OUTPUT_FOLDER, help="Folder for the per-day JSON files.")
+    parser.add_argument("--workers", type=int, default=DEFAULT_WORKERS, help="Maximum concurrent requests.")
+    parser.add_argument("--refetch-days", type=int, default=REFETCH_RECENT_DAYS,
+                        help="Recent days (counting today) re-exported on every run instead of checkpointed.")
+    parser.add_argument("--parquet", metavar="ROOT", help="Also append newly exported days to the monthly Parquet dataset at ROOT.")
+    args = parser.parse_args()
+
     try:
         # Prompt user for date range
-        start_date_input = input("Enter start date (YYYY-MM-DD): ")
-        end_date_input = input("Enter end date (YYYY-MM-DD): ")
+        start_date_input = args.start or input("Enter start date (YYYY-MM-DD): ")
+        end_date_input = args.end or input("Enter end date (YYYY-MM-DD): ")
 
         # Convert input to datetime objects
         start_date = datetime.strptime(start_date_input, "%Y-%m-%d")
@@ -79,11 +263,11 @@ if __name__ == "__main__":
             print("🚨 End date cannot be before start date.")
             exit(1)
 
-        # Output folder for JSON files
-        output_folder = "/home/jeff/data/raw/garmin_biometrics_data"
-
         # Run the function
-        get_garmin_biometrics(start_date, end_date, output_folder)
+        summary = get_garmin_biometrics(start_date, end_date, args.output, workers=args.workers,
+                                        refetch_days=args.refetch_days)
+        if summary is not None and args.parquet:
+            compact_json_folder(args.output, args.parquet, refresh=summary["refreshed"])
 
     except ValueError as ve:
         print(f"🚨 Invalid date format: {ve}")
@@ -0,0 +1,272 @@
+import argparse
+import glob
+import json
+import os
+from collections import defaultdict
+from datetime import date
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+# Layout: <root>/month=YYYY-MM/biometrics.parquet, one file per month. A month
+# holds at most 31 rows, so appending a day rewrites one small file and the
+# dataset never accumulates small files.
+DEFAULT_JSON_FOLDER = "/home/jeff/data/raw/garmin_biometrics_data"
+DEFAULT_ROOT = "/home/jeff/data/processed/garmin_biometrics"
+PARTITION_KEY = "month"
+FILE_NAME = "biometrics.parquet"
+DATE_COLUMN = "calendar_date"
+COMPRESSION = "zstd"
+
+# ---------------------------
+# Flattening & Schema Evolution
+# ---------------------------
+def flatten_summary(summary, prefix=""):
+    """
+    Flatten a get_user_summary payload into one level of scalar columns.
+
+    Nested objects become prefix_key columns; lists are kept as JSON text
+    since Garmin uses them for small, irregular detail records.
+    """
+    row = {}
+    for key, value in (summary or {}).items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            row.update(flatten_summary(value, f"{name}_"))
+        elif isinstance(value, list):
+            row[name] = json.dumps(value)
+        else:
+            row[name] = value
+    return row
+
+def column_type(values):
+    """Infer a column type: bool, int64, float64 or string (for mixed or unknown values)."""
+    kinds = {type(v) for v in values if v is not None}
+    if not kinds:
+        return pa.null()
+    if kinds == {bool}:
+        return pa.bool_()
+    if kinds == {int}:
+        return pa.int64()
+    if kinds <= {int, float}:
+        return pa.float64()
+    return pa.string()
+
+def merge_types(left, right):
+    """Widen two column types so both fit: null < int64 < float64, anything else falls back to string."""
+    if left == right or pa.types.is_null(right):
+        return left
+    if pa.types.is_null(left):
+        return right
+    numeric = {pa.int64(), pa.float64()}
+    if left in numeric and right in numeric:
+        return pa.float64()
+    return pa.string()
+
+def merge_schemas(schemas, resolve_nulls=True):
+    """
+    Union of columns across schemas (first-seen order), with conflicting types widened.
+
+    A column that is null everywhere has no type of its own. It stays
+    pa.null() when resolve_nulls is False (month files keep it untyped, so a
+    later numeric value is not widened to string), and becomes string only
+    when resolved for readers.
+    """
+    types = {}
+    for schema in schemas:
+        for field in schema:
+            types[field.name] = merge_types(types[field.name], field.type) if field.name in types else field.type
+    if resolve_nulls:
+        types = {name: pa.string() if pa.types.is_null(t) else t for name, t in types.items()}
+    return pa.schema(list(types.items()))
+
+def drop_empty_types(table):
+    """
+    Retype columns that hold only nulls as pa.null().
+
+    Month files written before null columns were kept untyped store them as
+    string; this stops those from widening real values in other days or months.
+    """
+    for index, field in enumerate(table.schema):
+        column = table.column(index)
+        if field.name != DATE_COLUMN and len(table) and column.null_count == len(table) and not pa.types.is_null(field.type):
+            table = table.set_column(index, pa.field(field.name, pa.null()), pa.nulls(len(table)))
+    return table
+
+def to_string(array):
+    """Cast to string, keeping JSON-style lowercase booleans."""
+    if pa.types.is_boolean(array.type):
+        return pc.if_else(array, "true", "false")
+    return array.cast(pa.string())
+
+def conform(table, schema):
+    """Reorder, cast and null-fill a table's columns to match a merged schema."""
+    columns = []
+    for field in schema:
+        if field.name not in table.column_names:
+            columns.append(pa.nulls(len(table), field.type))
+            continue
+        column = table[field.name]
+        if column.type != field.type:
+            column = to_string(column) if pa.types.is_string(field.type) else column.cast(field.type)
+        columns.append(column)
+    return pa.Table.from_arrays(columns, schema=schema)
+
+def summaries_to_table(summaries):
+    """
+    Convert {YYYY-MM-DD: summary} into a typed table sorted by calendar_date.
+
+    Each column's type is inferred from its values, so new Garmin fields show
+    up as new columns without any schema declaration.
+    """
+    rows = [(day, flatten_summary(summaries[day])) for day in sorted(summaries)]
+    names = list(dict.fromkeys(name for _, row in rows for name in row))
+    arrays = [pa.array([date.fromisoformat(day) for day, _ in rows], pa.date32())]
+    fields = [pa.field(DATE_COLUMN, pa.date32())]
+    for name in names:
+        values = [row.get(name) for _, row in rows]
+        kind = column_type(values)
+        if pa.types.is_string(kind):
+            values = [None if v is None else json.dumps(v) if isinstance(v, bool) else str(v) for v in values]
+        arrays.append(pa.array(values, kind))
+        fields.append(pa.field(name, kind))
+    return pa.Table.from_arrays(arrays, schema=pa.schema(fields))
+
+# ---------------------------
+# Dataset Helpers
+# ---------------------------
+def month_path(root, month):
+    return os.path.join(root, f"{PARTITION_KEY}={month}", FILE_NAME)
+
+def list_months(root):
+    """Months present in the dataset, oldest first."""
+    paths = glob.glob(os.path.join(root, f"{PARTITION_KEY}=*", FILE_NAME))
+    return sorted(os.path.basename(os.path.dirname(p)).split("=", 1)[1] for p in paths)
+
+def write_month(root, month, table):
+    """Write one month's file under a temp name and rename it into place."""
+    path = month_path(root, month)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    temp_path = os.path.join(os.path.dirname(path), f"_{FILE_NAME}")
+    pq.write_table(table, temp_path, compression=COMPRESSION, write_statistics=True)
+    os.replace(temp_path, path)
+
+def append_summaries(root, summaries):
+    """
+    Merge daily summaries into the monthly dataset.
+
+    Only the months touched are rewritten. A day already in the dataset is
+    replaced by the new payload, so re-exporting a day is idempotent.
+
+    Args:
+        root (str): Dataset root folder.
+        summaries (dict): {YYYY-MM-DD: get_user_summary payload}.
+
+    Returns:
+        int: Number of months rewritten.
+    """
+    by_month = defaultdict(dict)
+    for day, summary in summaries.items():
+        by_month[day[:7]][day] = summary
+
+    for month, days in sorted(by_month.items()):
+        new_rows = summaries_to_table(days)
+        path = month_path(root, month)
+        if os.path.exists(path):
+            existing = drop_empty_types(pq.read_table(path))
+            keep = pc.invert(pc.is_in(existing[DATE_COLUMN], value_set=new_rows[DATE_COLUMN]))
+            tables = [existing.filter(keep), new_rows]
+        else:
+            tables = [new_rows]
+        schema = merge_schemas((t.schema for t in tables), resolve_nulls=False)
+        merged = pa.concat_tables([conform(t, schema) for t in tables]).sort_by(DATE_COLUMN)
+        write_month(root, month, merged)
+    return len(by_month)
+
+def dataset_dates(root):
+    """Every calendar date already stored, read from the date column only."""
+    dates = set()
+    for month in list_months(root):
+        column = pq.read_table(month_path(root, month), columns=[DATE_COLUMN])[DATE_COLUMN]
+        dates.update(d.isoformat() for d in column.to_pylist())
+    return dates
+
+def read_biometrics(root, columns=None, start=None, end=None):
+    """
+    Read the dataset with every month conformed to one merged schema.
+
+    Args:
+        root (str): Dataset root folder.
+        columns (list): Optional column subset (calendar_date is always included).
+        start (str): Optional first day YYYY-MM-DD; months before it are not opened.
+        end (str): Optional last day YYYY-MM-DD; months after it are not opened.
+
+    Returns:
+        pyarrow.Table: Rows sorted by calendar_date.
+    """
+    months = [m for m in list_months(root) if (not start or m >= start[:7]) and (not end or m <= end[:7])]
+    # Months hold at most 31 rows, so each is read whole and its null-only columns untyped before merging
+    tables = [drop_empty_types(pq.read_table(month_path(root, m))) for m in months]
+    schema = merge_schemas(t.schema for t in tables)
+    if columns:
+        schema = pa.schema([schema.field(DATE_COLUMN)] + [schema.field(c) for c in columns if c != DATE_COLUMN])
+    tables = [conform(t, schema) for t in tables]
+    table = pa.concat_tables(tables) if tables else schema.empty_table()
+    if start:
+        table = table.filter(pc.greater_equal(table[DATE_COLUMN], pa.scalar(date.fromisoformat(start))))
+    if end:
+        table = table.filter(pc.less_equal(table[DATE_COLUMN], pa.scalar(date.fromisoformat(end))))
+    return table
+
+# ---------------------------
+# JSON Import
+# ---------------------------
+def load_json_summaries(json_folder, skip_dates=()):
+    """Load per-day export files (YYYY-MM-DD.json) not in skip_dates."""
+    summaries = {}
+    for path in sorted(glob.glob(os.path.join(json_folder, "????-??-??.json"))):
+        day = os.path.basename(path)[:-len(".json")]
+        if day in skip_dates:
+            continue
+        try:
+            with open(path, "r") as json_file:
+                summaries[day] = json.load(json_file)
+        except (OSError, json.JSONDecodeError) as e:
+            print(f"⚠️ Skipping unreadable file {path}: {e}")
+    return summaries
+
+def compact_json_folder(json_folder, root, rebuild=False, refresh=()):
+    """
+    Import per-day JSON files into the monthly Parquet dataset.
+
+    Incremental by default: days already in the dataset are skipped, so a
+    rerun only opens new files. Days listed in refresh (re-exported recent
+    days) are re-imported anyway; rebuild=True re-imports everything.
+    """
+    skip = set() if rebuild else dataset_dates(root) - set(refresh)
+    summaries = load_json_summaries(json_folder, skip)
+    if not summaries:
+        print("No new days to import.")
+        return 0
+    months = append_summaries(root, summaries)
+    print(f"✅ Imported {len(summaries)} days into {months} monthly files under {root}")
+    return len(summaries)
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the monthly Parquet dataset of Garmin daily summaries.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Import per-day JSON exports into the Parquet dataset.")
+    compact_parser.add_argument("--json-folder", default=DEFAULT_JSON_FOLDER, help="Folder of YYYY-MM-DD.json exports.")
+    compact_parser.add_argument("--root", default=DEFAULT_ROOT, help="Parquet dataset root.")
+    compact_parser.add_argument("--rebuild", action="store_true", help="Re-import days already in the dataset.")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        compact_json_folder(args.json_folder, args.root, rebuild=args.rebuild)
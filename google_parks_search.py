@@ -1,29 +1,169 @@
+import argparse
+import hashlib
 import json
-import requests
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
 import hvac
+import requests
+from requests.adapters import HTTPAdapter
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+SERP_API_URL = os.getenv("SERP_API_URL", "https://serpapi.com/search")
+DEFAULT_CONCURRENCY = 4
+DEFAULT_RATE_PER_SECOND = 1.0  # Sustained SerpAPI requests per second
+DEFAULT_BURST = 5
+MAX_RETRIES = 4
+BACKOFF_BASE_SECONDS = 1.0
+BACKOFF_MAX_SECONDS = 30.0
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+REQUEST_TIMEOUT_SECONDS = 30
+DEFAULT_CACHE_FILE = "serp_cache.sqlite"
+DEFAULT_CACHE_TTL_DAYS = 30
+DEFAULT_NUM_RESULTS = 3
+SOURCE_IGNORED_FIELDS = {"google_results", "google_search"}  # Fields added by this script
 
 # ---------------------------
 # Vault Configuration
 # ---------------------------
 VAULT_ADDR = "http://127.0.0.1:8200"
 VAULT_TOKEN = os.getenv("VAULT_TOKEN", "your-token-here")
-client = hvac.Client(url=VAULT_ADDR, token=VAULT_TOKEN)
-
-# Fetch SERP API Key from Vault
-try:
-    vault_secrets = client.secrets.kv.v2.read_secret_version(
-        path="automation_keys",
-        raise_on_deleted_version=True
-    )["data"]["data"]
-    api_key = vault_secrets["SERP_API_KEY"]
-except Exception as e:
-    print(f"Error accessing Vault for SERP API Key: {e}")
-    exit(1)
+
+def get_api_key():
+    """Fetch the SERP API key from Vault, exiting if it cannot be read."""
+    client = hvac.Client(url=VAULT_ADDR, token=VAULT_TOKEN)
+    try:
+        vault_secrets = client.secrets.kv.v2.read_secret_version(
+            path="automation_keys",
+            raise_on_deleted_version=True
+        )["data"]["data"]
+        return vault_secrets["SERP_API_KEY"]
+    except Exception as e:
+        print(f"Error accessing Vault for SERP API Key: {e}")
+        exit(1)
+
+# ---------------------------
+# HTTP Session & Rate Limiting
+# ---------------------------
+class TokenBucket:
+    """
+    Thread-safe token bucket: allows bursts of up to `capacity` requests and
+    refills at `rate` tokens per second.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        """Block until a token is available, then take it."""
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = (1 - self.tokens) / self.rate
+            time.sleep(wait)
+
+def create_session(pool_size=DEFAULT_CONCURRENCY):
+    """Create a requests session whose connection pool fits the worker count."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+    session.mount("https://", adapter)
+    session.mount("http://", adapter)
+    return session
+
+def retry_delay(attempt, response=None):
+    """Exponential backoff, honouring a numeric Retry-After header when present."""
+    if response is not None:
+        retry_after = response.headers.get("Retry-After", "")
+        if retry_after.isdigit():
+            return min(float(retry_after), BACKOFF_MAX_SECONDS)
+    return min(BACKOFF_BASE_SECONDS * (2 ** attempt), BACKOFF_MAX_SECONDS)
+
+# ---------------------------
+# Response Cache
+# ---------------------------
+class SerpCache:
+    """
+    SQLite cache of SerpAPI responses keyed on a hash of (query, num_results).
+
+    Entries older than ttl_seconds are treated as missing. Safe to share
+    across worker threads.
+    """
+
+    def __init__(self, path=DEFAULT_CACHE_FILE, ttl_seconds=DEFAULT_CACHE_TTL_DAYS * 86400):
+        self.ttl_seconds = ttl_seconds
+        self.lock = threading.Lock()
+        self.conn = sqlite3.connect(path, check_same_thread=False)
+        self.conn.execute(
+            "CREATE TABLE IF NOT EXISTS responses ("
+            "key TEXT PRIMARY KEY, query TEXT, num_results INTEGER, fetched_at REAL, results TEXT)"
+        )
+        self.conn.commit()
+        self.hits = self.misses = 0
+
+    @staticmethod
+    def make_key(query, num_results):
+        return hashlib.sha256(json.dumps([query, num_results]).encode("utf-8")).hexdigest()
+
+    def get(self, query, num_results):
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fetched_at, results FROM responses WHERE key = ?",
+                (self.make_key(query, num_results),)
+            ).fetchone()
+            if row is None or time.time() - row[0] > self.ttl_seconds:
+                self.misses += 1
+                return None
+            self.hits += 1
+            return json.loads(row[1])
+
+    def fetched_at(self, query, num_results):
+        """Return when a cached response was fetched (None if absent), without counting a hit or miss."""
+        with self.lock:
+            row = self.conn.execute(
+                "SELECT fetched_at FROM responses WHERE key = ?", (self.make_key(query, num_results),)
+            ).fetchone()
+        return row[0] if row else None
+
+    def put(self, query, num_results, results):
+        with self.lock:
+            self.conn.execute(
+                "INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?, ?)",
+                (self.make_key(query, num_results), query, num_results, time.time(), json.dumps(results))
+            )
+            self.conn.commit()
+
+    def prune(self):
+        """Delete expired entries and return how many were removed."""
+        with self.lock:
+            cursor = self.conn.execute(
+                "DELETE FROM responses WHERE fetched_at < ?", (time.time() - self.ttl_seconds,)
+            )
+            self.conn.commit()
+            return cursor.rowcount
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
 
 # ---------------------------
 # Google Search Function
 # ---------------------------
-def google_search(query, api_key, num_results=3):
+def google_search(query, api_key, num_results=DEFAULT_NUM_RESULTS, session=None, rate_limiter=None,
+                  url=SERP_API_URL, max_retries=MAX_RETRIES, cache=None):
     """
     Perform a Google search using SerpAPI.
 
@@ -31,36 +171,184 @@ def google_search(query, api_key, num_results=3):
         query (str): The search query.
         api_key (str): SerpAPI API key.
         num_results (int): Number of results to return.
+        session (requests.Session): Optional pooled session to reuse connections.
+        rate_limiter (TokenBucket): Optional limiter shared across workers.
+        url (str): SerpAPI endpoint (overridable for a local stub server).
+        max_retries (int): Retries on 429/5xx responses and connection errors.
+        cache (SerpCache): Optional response cache; hits skip the API entirely.
 
     Returns:
-        list: A list of search result dictionaries.
+        list: A list of search result dictionaries, or None if the search
+        failed after all retries (distinct from a genuine empty result).
     """
-    url = "https://serpapi.com/search"
+    if cache:
+        cached = cache.get(query, num_results)
+        if cached is not None:
+            return cached
+
     params = {
         "q": query,
         "api_key": api_key,
         "num": num_results,
     }
+    http = session or requests
+
+    for attempt in range(max_retries + 1):
+        if rate_limiter:
+            rate_limiter.acquire()
+        try:
+            response = http.get(url, params=params, timeout=REQUEST_TIMEOUT_SECONDS)
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+            if attempt == max_retries:
+                print(f"Error during Google Search: {e}")
+                return None
+            time.sleep(retry_delay(attempt))
+            continue
+
+        if response.status_code in RETRY_STATUS_CODES and attempt < max_retries:
+            delay = retry_delay(attempt, response)
+            print(f"⚠️ SerpAPI returned {response.status_code} for '{query}', retrying in {delay:.1f}s")
+            time.sleep(delay)
+            continue
+
+        try:
+            response.raise_for_status()
+            results = response.json().get("organic_results", [])
+        except (requests.exceptions.RequestException, ValueError) as e:
+            print(f"Error during Google Search: {e}")
+            return None
+
+        # Only successful responses are cached, so failures are retried next run
+        if cache:
+            cache.put(query, num_results, results)
+        return results
+    return None
+
+def build_park_query(search_query, park):
+    park_name = park.get("park_name", "Unknown Park")
+    return f"{search_query} {park_name} Ohio State Parks"
+
+def source_fingerprint(park):
+    """Hash the spider-provided fields of a park, ignoring fields this script adds."""
+    source = {key: value for key, value in park.items() if key not in SOURCE_IGNORED_FIELDS}
+    return hashlib.sha256(json.dumps(source, sort_keys=True).encode("utf-8")).hexdigest()
+
+def plan_incremental(parks_data, existing_data, search_query, ttl_seconds):
+    """
+    Reuse Google results from a previous output file where still valid.
+
+    A park is re-queried when it is new, its source fields changed, it was
+    searched with a different query, or its results are older than the TTL.
+    Up-to-date parks get their previous results copied in place.
+
+    Returns:
+        list: Indexes of parks in parks_data that still need a search.
+    """
+    existing_by_name = {park.get("park_name"): park for park in existing_data}
+    now = time.time()
+    pending = []
+    for index, park in enumerate(parks_data):
+        previous = existing_by_name.get(park.get("park_name"))
+        search = (previous or {}).get("google_search", {})
+        if (
+            previous is None
+            or search.get("source") != source_fingerprint(park)
+            or search.get("query") != build_park_query(search_query, park)
+            or now - search.get("fetched_at", 0) > ttl_seconds
+        ):
+            pending.append(index)
+        else:
+            park["google_results"] = previous.get("google_results", [])
+            park["google_search"] = search
+    return pending
+
+def enrich_parks(parks_data, search_query, api_key, concurrency=DEFAULT_CONCURRENCY,
+                 rate=DEFAULT_RATE_PER_SECOND, burst=DEFAULT_BURST, url=SERP_API_URL,
+                 cache=None, indexes=None):
+    """
+    Add Google results to every park concurrently, preserving dataset order.
+
+    Workers share one pooled session and one token bucket, so the total
+    request rate stays within the SerpAPI quota regardless of concurrency.
+    Parks whose search failed get no "google_search" stamp, so an
+    incremental run retries them instead of treating them as fresh.
+
+    Args:
+        parks_data (list): Park dictionaries; each gets a "google_results" key.
+        search_query (str): Prefix added to every park search.
+        api_key (str): SerpAPI API key.
+        concurrency (int): Maximum in-flight requests.
+        rate (float): Sustained requests per second.
+        burst (int): Requests allowed back to back before the rate applies.
+        url (str): SerpAPI endpoint.
+        cache (SerpCache): Optional response cache shared by the workers.
+        indexes (list): Optional subset of park positions to search (all by default).
+
+    Returns:
+        list: The same park dictionaries, in their original order.
+    """
+    targets = [parks_data[i] for i in (range(len(parks_data)) if indexes is None else indexes)]
+    session = create_session(concurrency)
+    rate_limiter = TokenBucket(rate, burst)
+    failed = 0
+
+    def search_park(park):
+        query = build_park_query(search_query, park)
+        print(f"Performing Google search for: {query}")
+        results = google_search(query, api_key, DEFAULT_NUM_RESULTS, session=session, rate_limiter=rate_limiter,
+                                url=url, cache=cache)
+        # A cache hit keeps its original fetch time, so freshness never outlives the TTL
+        fetched_at = (cache.fetched_at(query, DEFAULT_NUM_RESULTS) if cache else None) or time.time()
+        return query, results, fetched_at
 
     try:
-        response = requests.get(url, params=params)
-        response.raise_for_status()
-        return response.json().get("organic_results", [])
-    except requests.exceptions.RequestException as e:
-        print(f"Error during Google Search: {e}")
-        return []
+        with ThreadPoolExecutor(max_workers=max(1, concurrency)) as pool:
+            # map() yields results in submission order, so output order matches input
+            for park, (query, google_results, fetched_at) in zip(targets, pool.map(search_park, targets)):
+                if google_results is None:
+                    park.setdefault("google_results", [])
+                    park.pop("google_search", None)
+                    failed += 1
+                    continue
+                park["google_results"] = google_results
+                park["google_search"] = {
+                    "query": query,
+                    "source": source_fingerprint(park),
+                    "fetched_at": fetched_at,
+                }
+    finally:
+        session.close()
+    if failed:
+        print(f"⚠️ {failed} park searches failed; they will be retried on the next run")
+    return parks_data
 
 # ---------------------------
 # Main Execution
 # ---------------------------
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Enrich the parks dataset with SerpAPI Google results.")
+    parser.add_argument("--query", help="Search prefix (prompted for when omitted).")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="Maximum in-flight requests.")
+    parser.add_argument("--rate", type=float, default=DEFAULT_RATE_PER_SECOND, help="Sustained requests per second.")
+    parser.add_argument("--burst", type=int, default=DEFAULT_BURST, help="Token bucket burst size.")
+    parser.add_argument("--input", default="ohio_state_parks.json", help="Spider output to enrich.")
+    parser.add_argument("--output", default="ohio_state_parks_with_google_results.json", help="Enriched output file.")
+    parser.add_argument("--cache-file", default=DEFAULT_CACHE_FILE, help="SQLite response cache.")
+    parser.add_argument("--cache-ttl-days", type=float, default=DEFAULT_CACHE_TTL_DAYS, help="Cache/result freshness window.")
+    parser.add_argument("--no-cache", action="store_true", help="Always call SerpAPI.")
+    parser.add_argument("--incremental", action="store_true",
+                        help="Only search parks that are new, changed or expired relative to --output.")
+    args = parser.parse_args()
+
     try:
+        api_key = get_api_key()
+
         # Prompt user for search string
-        search_query = input("Enter the search query: ")
-        
+        search_query = args.query if args.query is not None else input("Enter the search query: ")
+
         # Read the spider's JSON result
-        input_file = "ohio_state_parks.json"
-        output_file = "ohio_state_parks_with_google_results.json"
+        input_file = args.input
+        output_file = args.output
 
         try:
             with open(input_file, "r", encoding="utf-8") as infile:
@@ -69,15 +357,28 @@ if __name__ == "__main__":
             print(f"Error: File {input_file} not found.")
             parks_data = []
 
-        # Loop through parks and perform Google searches
-        for park in parks_data:
-            park_name = park.get("park_name", "Unknown Park")
-            query = f"{search_query} {park_name} Ohio State Parks"
-            print(f"Performing Google search for: {query}")
-            google_results = google_search(query, api_key)
+        ttl_seconds = args.cache_ttl_days * 86400
+        cache = None if args.no_cache else SerpCache(args.cache_file, ttl_seconds)
+
+        indexes = None
+        if args.incremental:
+            try:
+                with open(output_file, "r", encoding="utf-8") as existing_file:
+                    existing_data = json.load(existing_file)
+            except (FileNotFoundError, json.JSONDecodeError):
+                existing_data = []
+            indexes = plan_incremental(parks_data, existing_data, search_query, ttl_seconds)
+            print(f"Incremental run: {len(indexes)} of {len(parks_data)} parks need a search")
 
-            # Add Google results to the park data
-            park["google_results"] = google_results
+        # Search parks concurrently under the shared rate limit
+        started = time.perf_counter()
+        enrich_parks(parks_data, search_query, api_key, args.concurrency, args.rate, args.burst,
+                     cache=cache, indexes=indexes)
+        print(f"Enriched {len(parks_data) if indexes is None else len(indexes)} parks "
+              f"in {time.perf_counter() - started:.1f}s")
+        if cache:
+            print(f"SERP cache: {cache.hits} hits, {cache.misses} misses, {cache.prune()} expired entries pruned")
+            cache.close()
 
         # Save updated data to a new JSON file
         try:
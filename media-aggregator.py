@@ -2,14 +2,18 @@ import hvac
 import os
 import requests
 import json
+import gzip
 import shutil
 from datetime import datetime, timedelta
+import time
+import queue
+import threading
+import hashlib
+import re
+import sqlite3
 import feedparser
 import urllib.parse
-import boto3
-from botocore.exceptions import NoCredentialsError
-import pandas as pd
-from io import BytesIO
+from water_news_lake import PartitionedStreamWriter, get_filesystem
 import logging
 
 # ---------------------------
@@ -59,6 +63,7 @@ ARCHIVE_DIR = "/media/jeffbreece/Storage/data/archive/media/"
 # MinIO Configurations
 MINIO_ENDPOINT = "localhost:9000"
 S3_BUCKET = "processed"
+S3_PREFIX = "water-news-alerts/media"  # Hive-style date=YYYY-MM-DD partitions below this
 
 SEARCH_TERMS = [
     "water resources", "freshwater", "surface water", "groundwater", "water supply",
@@ -67,109 +72,360 @@ SEARCH_TERMS = [
 QUERY = " OR ".join(SEARCH_TERMS)
 LANGUAGE = "en"
 PAGE_SIZE = 20
+NEWSAPI_MAX_PAGES = 5  # NewsAPI's developer plan caps a query at 100 results
 DATE_FROM = (datetime.now() - timedelta(days=1)).strftime("%Y-%m-%d")
+SOURCE_TIMEOUT_SECONDS = 30  # Default per-source budget; one slow feed never blocks the batch
+STREAM_QUEUE_SIZE = 1000  # Articles buffered between the source threads and the writer
+
+# Cross-run deduplication index
+DEDUP_DB = "/media/jeffbreece/Storage/data/state/media_dedup.sqlite"
+DEDUP_RETENTION_DAYS = 180
+SIMHASH_MAX_DISTANCE = 10  # Titles within this many differing bits (of 64) are near-duplicates
+SIMHASH_SHINGLE = 4  # Character n-gram size; robust to single-word edits in short headlines
+TRACKING_PARAMS = {"fbclid", "gclid", "ocid", "cmpid", "ref", "smid", "mc_cid", "mc_eid"}
 
 # ---------------------------
 # MinIO Client Setup
 # ---------------------------
-s3_client = boto3.client(
-    's3',
-    endpoint_url=f'http://{MINIO_ENDPOINT}',
-    aws_access_key_id=minio_access_key,
-    aws_secret_access_key=minio_secret_key,
-    region_name='us-east-1'
+# pyarrow's S3 output streams upload in multipart chunks, so Parquet goes
+# straight to MinIO without a full in-memory or on-disk copy
+lake_filesystem, lake_root = get_filesystem(
+    f"s3://{S3_BUCKET}/{S3_PREFIX}",
+    access_key=minio_access_key,
+    secret_key=minio_secret_key,
+    endpoint=MINIO_ENDPOINT
 )
 
+# ---------------------------
+# Source Registry
+# ---------------------------
+# Each source is a generator function taking a timeout (seconds) and yielding
+# normalized article dicts with title, url, source, publishedAt and description.
+SOURCES = {}
+
+def register_source(name, timeout=SOURCE_TIMEOUT_SECONDS):
+    """Decorator that adds a fetch function to the source registry."""
+    def decorator(fetch):
+        SOURCES[name] = {"fetch": fetch, "timeout": timeout}
+        return fetch
+    return decorator
+
+def stream_all_sources(sources=None, counts=None):
+    """
+    Run every registered source concurrently and yield articles as they arrive.
+
+    Each source runs in its own thread and feeds a bounded queue, so at most
+    STREAM_QUEUE_SIZE articles are held between the sources and the writer
+    however many a backfill pulls. Each source gets its own deadline measured
+    from the start of the batch; a source that times out or raises stops
+    contributing, and whatever it delivered before that is kept.
+
+    Args:
+        sources (dict): Registry subset (defaults to every registered source).
+        counts (dict): Optional dict filled with {source name: articles yielded}.
+
+    Yields:
+        dict: Normalized articles, interleaved across sources.
+    """
+    sources = sources or SOURCES
+    counts = {} if counts is None else counts
+    articles = queue.Queue(maxsize=STREAM_QUEUE_SIZE)
+    stop = threading.Event()
+    started = time.monotonic()
+    deadlines = {name: started + spec["timeout"] for name, spec in sources.items()}
+    done = object()
+
+    def put(item):
+        # Give up once the consumer has stopped, instead of blocking forever on a full queue
+        while not stop.is_set():
+            try:
+                articles.put(item, timeout=0.5)
+                return True
+            except queue.Full:
+                continue
+        return False
+
+    def produce(name):
+        try:
+            for article in sources[name]["fetch"](sources[name]["timeout"]):
+                if time.monotonic() > deadlines[name] or not put((name, article)):
+                    break
+        except Exception as e:
+            put((name, e))
+        put((name, done))
+
+    for name in sources:
+        counts[name] = 0
+        threading.Thread(target=produce, args=(name,), name=f"source-{name}", daemon=True).start()
+
+    active = set(sources)
+    try:
+        while active:
+            remaining = max(0.0, min(deadlines[name] for name in active) - time.monotonic())
+            try:
+                name, item = articles.get(timeout=remaining)
+            except queue.Empty:
+                for name in [n for n in active if time.monotonic() >= deadlines[n]]:
+                    print(f"⚠️ Source {name} timed out after {sources[name]['timeout']}s.")
+                    active.discard(name)
+                continue
+            if name not in active:
+                continue  # Late output from a source that already timed out
+            if item is done or isinstance(item, Exception):
+                if isinstance(item, Exception):
+                    print(f"⚠️ Source {name} failed: {item}")
+                active.discard(name)
+                print(f"{name}: {counts[name]} articles in {time.monotonic() - started:.1f}s")
+                continue
+            counts[name] += 1
+            yield item
+    finally:
+        stop.set()
+
 # ---------------------------
 # Functions
 # ---------------------------
-def fetch_newsapi():
+@register_source("newsapi")
+def fetch_newsapi(timeout=SOURCE_TIMEOUT_SECONDS):
     url = "https://newsapi.org/v2/everything"
-    params = {"q": QUERY, "language": LANGUAGE, "pageSize": PAGE_SIZE, "from": DATE_FROM}
     headers = {"Authorization": f"Bearer {news_api_key}"}
-    response = requests.get(url, params=params, headers=headers)
-    if response.status_code == 200:
-        articles = response.json().get("articles", [])
-        return [{
-            "title": a.get("title"),
-            "url": a.get("url"),
-            "source": a.get("source", {}).get("name"),
-            "publishedAt": a.get("publishedAt"),
-            "description": a.get("description")
-        } for a in articles]
-    else:
-        print("NewsAPI error:", response.status_code, response.text)
-        return []
-
-def fetch_google_news():
+    for page in range(1, NEWSAPI_MAX_PAGES + 1):
+        params = {"q": QUERY, "language": LANGUAGE, "pageSize": PAGE_SIZE, "from": DATE_FROM, "page": page}
+        response = requests.get(url, params=params, headers=headers, timeout=timeout)
+        if response.status_code != 200:
+            print("NewsAPI error:", response.status_code, response.text)
+            return
+        payload = response.json()
+        articles = payload.get("articles", [])
+        for a in articles:
+            yield {
+                "title": a.get("title"),
+                "url": a.get("url"),
+                "source": a.get("source", {}).get("name"),
+                "publishedAt": a.get("publishedAt"),
+                "description": a.get("description")
+            }
+        if len(articles) < PAGE_SIZE or page * PAGE_SIZE >= payload.get("totalResults", 0):
+            return
+
+@register_source("google_news")
+def fetch_google_news(timeout=SOURCE_TIMEOUT_SECONDS):
     encoded_query = urllib.parse.quote(QUERY)
     rss_url = f"https://news.google.com/rss/search?q={encoded_query}&hl={LANGUAGE}&gl=US&ceid=US:{LANGUAGE.upper()}"
-    feed = feedparser.parse(rss_url)
-    return [{
-        "title": entry.get("title"),
-        "url": entry.get("link"),
-        "source": entry.get("source", {}).get("title", "Google News"),
-        "publishedAt": entry.get("published"),
-        "description": entry.get("summary")
-    } for entry in feed.entries]
-
-def deduplicate_articles(articles):
-    seen_urls = set()
-    return [a for a in articles if a.get("url") not in seen_urls and not seen_urls.add(a.get("url"))]
-
-def upload_to_s3(file_buffer, s3_key):
-    try:
-        s3_client.upload_fileobj(file_buffer, S3_BUCKET, s3_key)
-        print(f"File successfully uploaded to S3 as {s3_key}.")
-    except NoCredentialsError:
-        print("Credentials not available for MinIO.")
-    except Exception as e:
-        print(f"Error uploading file to S3: {e}")
+    # Fetch with requests so the timeout applies; feedparser has no timeout of its own
+    response = requests.get(rss_url, timeout=timeout)
+    response.raise_for_status()
+    feed = feedparser.parse(response.content)
+    for entry in feed.entries:
+        yield {
+            "title": entry.get("title"),
+            "url": entry.get("link"),
+            "source": entry.get("source", {}).get("title", "Google News"),
+            "publishedAt": entry.get("published"),
+            "description": entry.get("summary")
+        }
+
+# ---------------------------
+# Deduplication
+# ---------------------------
+def canonicalize_url(url):
+    """Normalize a URL so trivially different links to one article compare equal."""
+    if not url:
+        return ""
+    parts = urllib.parse.urlsplit(url.strip())
+    host = parts.netloc.lower()
+    if host.startswith("www."):
+        host = host[4:]
+    query = sorted(
+        (key, value) for key, value in urllib.parse.parse_qsl(parts.query, keep_blank_values=True)
+        if not key.lower().startswith("utm_") and key.lower() not in TRACKING_PARAMS
+    )
+    path = parts.path.rstrip("/") or "/"
+    return urllib.parse.urlunsplit(("", host, path, urllib.parse.urlencode(query), "")).lstrip("/")
+
+def normalize_title(title, source=None):
+    """Lowercase, drop punctuation and the ' - Source' suffix Google News appends."""
+    title = (title or "").strip()
+    if source and title.lower().endswith(f" - {source}".lower()):
+        title = title[:-(len(source) + 3)]
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", title.lower()).split())
+
+def simhash(text, bits=64):
+    """64-bit SimHash over character shingles of the text."""
+    shingles = [text[i:i + SIMHASH_SHINGLE] for i in range(max(1, len(text) - SIMHASH_SHINGLE + 1))]
+    weights = [0] * bits
+    for shingle in shingles:
+        value = int.from_bytes(hashlib.blake2b(shingle.encode("utf-8"), digest_size=8).digest(), "big")
+        for bit in range(bits):
+            weights[bit] += 1 if value >> bit & 1 else -1
+    return sum(1 << bit for bit in range(bits) if weights[bit] > 0)
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count("1")
+
+class DedupIndex:
+    """
+    Persistent SQLite index of articles already stored in previous runs.
+
+    Articles are matched on canonical URL, or on a SimHash of the normalized
+    title within SIMHASH_MAX_DISTANCE bits, which catches Google News redirect
+    links and lightly reworded headlines for stories we already stored. Title
+    hashes are held in memory for the run; at 8 bytes each, even a year of
+    articles is a few hundred KB.
+    """
+
+    def __init__(self, path=DEDUP_DB):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self.conn = sqlite3.connect(path)
+        self.conn.executescript(
+            "CREATE TABLE IF NOT EXISTS seen_urls (url TEXT PRIMARY KEY, first_seen TEXT);"
+            "CREATE TABLE IF NOT EXISTS seen_titles (simhash INTEGER, first_seen TEXT);"
+        )
+        self.conn.commit()
+        # SQLite integers are signed 64-bit; fold back to unsigned
+        self.title_hashes = [
+            value % (1 << 64) for (value,) in self.conn.execute("SELECT simhash FROM seen_titles")
+        ]
+        self.pending = []
+
+    def fingerprints(self, article):
+        url = canonicalize_url(article.get("url"))
+        title = normalize_title(article.get("title"), article.get("source"))
+        return url, simhash(title) if len(title.split()) >= 3 else None
+
+    def _seen_url(self, url):
+        return bool(url) and self.conn.execute("SELECT 1 FROM seen_urls WHERE url = ?", (url,)).fetchone() is not None
+
+    @staticmethod
+    def _near(value, hashes):
+        return value is not None and any(hamming_distance(value, other) <= SIMHASH_MAX_DISTANCE for other in hashes)
+
+    def iter_new(self, articles):
+        """
+        Yield articles not seen in earlier runs or earlier in this batch.
+
+        Fingerprints of yielded articles are staged in self.pending so the
+        caller can record_pending() once they are safely stored.
+        """
+        batch_urls, batch_hashes = set(), []
+        for article in articles:
+            url, title_hash = self.fingerprints(article)
+            if (url and url in batch_urls) or self._seen_url(url):
+                continue
+            if self._near(title_hash, self.title_hashes) or self._near(title_hash, batch_hashes):
+                continue
+            batch_urls.add(url)
+            if title_hash is not None:
+                batch_hashes.append(title_hash)
+            self.pending.append((url, title_hash))
+            yield article
+
+    def filter_new(self, articles):
+        """Return articles not seen in earlier runs or earlier in this batch."""
+        return list(self.iter_new(articles))
+
+    def record(self, articles):
+        """Remember stored articles so later runs skip them."""
+        self._insert(self.fingerprints(article) for article in articles)
+
+    def record_pending(self):
+        """Remember the articles staged by iter_new()."""
+        self._insert(self.pending)
+        self.pending = []
+
+    def _insert(self, fingerprints):
+        now = datetime.now().isoformat(timespec="seconds")
+        for url, title_hash in fingerprints:
+            if url:
+                self.conn.execute("INSERT OR IGNORE INTO seen_urls VALUES (?, ?)", (url, now))
+            if title_hash is not None:
+                signed = title_hash - (1 << 64) if title_hash >= 1 << 63 else title_hash
+                self.conn.execute("INSERT INTO seen_titles VALUES (?, ?)", (signed, now))
+                self.title_hashes.append(title_hash)
+        self.conn.commit()
+
+    def prune(self, retention_days=DEDUP_RETENTION_DAYS):
+        cutoff = (datetime.now() - timedelta(days=retention_days)).isoformat(timespec="seconds")
+        self.conn.execute("DELETE FROM seen_urls WHERE first_seen < ?", (cutoff,))
+        self.conn.execute("DELETE FROM seen_titles WHERE first_seen < ?", (cutoff,))
+        self.conn.commit()
+
+    def close(self):
+        self.conn.close()
+
+def deduplicate_articles(articles, dedup_index=None):
+    """Lazily drop articles repeated within this run and, given an index, across runs."""
+    if dedup_index is None:
+        seen_urls = set()
+        return (a for a in articles if a.get("url") not in seen_urls and not seen_urls.add(a.get("url")))
+    return dedup_index.iter_new(articles)
 
 def archive_raw_file(file_path):
+    """Move a finished raw file into ARCHIVE_DIR (a rename when both are on the same filesystem)."""
+    os.makedirs(ARCHIVE_DIR, exist_ok=True)
     archive_path = os.path.join(ARCHIVE_DIR, os.path.basename(file_path))
-    shutil.copy(file_path, archive_path)
+    shutil.move(file_path, archive_path)
     print(f"Raw file archived to: {archive_path}")
-    os.remove(file_path)
 
 def save_articles(articles):
+    """
+    Stream articles to MinIO and the raw archive in a single pass.
+
+    Each article is appended to a gzipped JSON Lines raw file and to the
+    partitioned Parquet writer, which uploads with multipart S3 streams, so
+    peak memory stays bounded however many articles the iterable yields.
+
+    Args:
+        articles (iterable): Normalized article dicts; consumed once.
+
+    Returns:
+        int: Number of articles stored, or None if the upload failed.
+    """
     os.makedirs(OUTPUT_DIR, exist_ok=True)
     timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
-    file_path_json = os.path.join(OUTPUT_DIR, f"news_combined_{timestamp}.json")
+    file_path_raw = os.path.join(OUTPUT_DIR, f"news_combined_{timestamp}.jsonl.gz")
+    writer = PartitionedStreamWriter(lake_filesystem, lake_root, f"water-news-alert_{timestamp}")
+    count = 0
 
-    with open(file_path_json, "w", encoding="utf-8") as f:
-        json.dump(articles, f, indent=4)
-
-    df = pd.DataFrame(articles)
-    parquet_buffer = BytesIO()
     try:
-        df.to_parquet(parquet_buffer, engine='pyarrow')
+        with gzip.open(file_path_raw, "wt", encoding="utf-8") as raw_file:
+            for article in articles:
+                raw_file.write(json.dumps(article) + "\n")
+                count += 1
+                writer.write(article)
+        for path in writer.close():
+            print(f"File successfully uploaded to S3 as {path}.")
     except Exception as e:
-        print(f"Error converting to Parquet: {e}")
-        return
-    parquet_buffer.seek(0)
-    s3_key = f"water-news-alerts/media/water-news-alert_{timestamp}.parquet"
-    upload_to_s3(parquet_buffer, s3_key)
-    archive_raw_file(file_path_json)
+        print(f"Error streaming articles to S3: {e}")
+        writer.abort()
+        return None
+    finally:
+        # Keep the raw capture even when the upload fails, as long as it has content
+        if count:
+            archive_raw_file(file_path_raw)
+        elif os.path.exists(file_path_raw):
+            os.remove(file_path_raw)
+    return count
 
 def main():
-    articles_newsapi = fetch_newsapi()
-    articles_google_news = fetch_google_news()
-    articles = articles_newsapi + articles_google_news
-
-    if not articles_newsapi:
-        print("No articles fetched from NewsAPI.")
-    if not articles_google_news:
-        print("No articles fetched from Google News.")
-
-    print(f"Fetched {len(articles)} articles before deduplication.")
-    articles = deduplicate_articles(articles)
-    print(f"{len(articles)} articles remain after deduplication.")
-
-    if articles:
-        save_articles(articles)
-    else:
-        print("No articles found.")
+    dedup_index = DedupIndex()
+    counts = {}
+    try:
+        # Articles flow from the sources through deduplication into the writers as they arrive
+        stored = save_articles(deduplicate_articles(stream_all_sources(counts=counts), dedup_index))
+        for name, fetched in counts.items():
+            if not fetched:
+                print(f"No articles fetched from {name}.")
+        print(f"Fetched {sum(counts.values())} articles before deduplication.")
+        if stored:
+            print(f"Stored {stored} new articles after deduplication against previous runs.")
+            # Only remember articles once they are safely stored
+            dedup_index.record_pending()
+        elif stored == 0:
+            print("No new articles found.")
+        dedup_index.prune()
+    finally:
+        dedup_index.close()
 
 if __name__ == "__main__":
     main()
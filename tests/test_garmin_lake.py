@@ -0,0 +1,51 @@
+import os
+import sys
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), ".."))
+
+import garmin_lake  # noqa: E402
+
+
+def test_null_day_keeps_int_column_typed(tmp_path):
+    root = str(tmp_path)
+    garmin_lake.append_summaries(root, {
+        "2025-03-01": {"restingHeartRate": 55, "totalSteps": 9000},
+        "2025-03-02": {"restingHeartRate": 57, "totalSteps": 8000},
+    })
+    # A partial summary for today: the device has not synced heart rate yet
+    garmin_lake.append_summaries(root, {"2025-03-03": {"restingHeartRate": None, "totalSteps": 120}})
+    # A new month whose only value for the column is null
+    garmin_lake.append_summaries(root, {"2025-04-01": {"restingHeartRate": None, "totalSteps": None}})
+
+    table = garmin_lake.read_biometrics(root)
+    assert table.schema.field("restingHeartRate").type == pa.int64()
+    assert table["restingHeartRate"].to_pylist() == [55, 57, None, None]
+    assert table.schema.field("totalSteps").type == pa.int64()
+
+    # Month files never store a null-only column as string
+    april = pq.read_schema(garmin_lake.month_path(root, "2025-04"))
+    assert pa.types.is_null(april.field("restingHeartRate").type)
+
+
+def test_legacy_string_null_column_is_not_widened(tmp_path):
+    root = str(tmp_path)
+    garmin_lake.append_summaries(root, {"2025-03-01": {"restingHeartRate": 55}})
+    legacy = pa.table({
+        garmin_lake.DATE_COLUMN: pa.array([garmin_lake.date(2025, 2, 1)], pa.date32()),
+        "restingHeartRate": pa.array([None], pa.string()),
+    })
+    garmin_lake.write_month(root, "2025-02", legacy)
+
+    table = garmin_lake.read_biometrics(root)
+    assert table.schema.field("restingHeartRate").type == pa.int64()
+    assert table["restingHeartRate"].to_pylist() == [None, 55]
+
+
+def test_all_null_column_reads_as_string(tmp_path):
+    root = str(tmp_path)
+    garmin_lake.append_summaries(root, {"2025-03-01": {"stressLevel": None, "totalSteps": 10}})
+    table = garmin_lake.read_biometrics(root, columns=["stressLevel"])
+    assert table.schema.field("stressLevel").type == pa.string()
@@ -0,0 +1,117 @@
+import os
+import sys
+from datetime import date
+
+import pyarrow.dataset as ds
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "automations"))
+
+import ghcn_daily  # noqa: E402
+
+
+def dly_line(station, year, month, element, values):
+    """Build one fixed-width .dly record; days not in values are missing."""
+    days = "".join(
+        f"{values.get(day, ghcn_daily.DLY_MISSING):>5}" + ("  S" if day in values else "   ")
+        for day in range(1, ghcn_daily.DLY_DAYS + 1)
+    )
+    return f"{station:<11}{year:04d}{month:02d}{element}{days}\n"
+
+
+def station_line(station, latitude, longitude, elevation, state, name):
+    return f"{station:<11} {latitude:>8.4f} {longitude:>9.4f} {elevation:>6.1f} {state:<2} {name:<30}\n"
+
+
+def test_convert_to_parquet_multiple_files(tmp_path):
+    dly_dir = tmp_path / "all"
+    dly_dir.mkdir()
+    (dly_dir / "USC00330001.dly").write_text(dly_line("USC00330001", 2021, 3, "TMAX", {1: 150, 2: -25}))
+    (dly_dir / "USC00330002.dly").write_text(dly_line("USC00330002", 1999, 12, "PRCP", {31: 0, 5: 12}))
+    stations = tmp_path / "ghcnd-stations.txt"
+    stations.write_text(
+        station_line("USC00330001", 40.0, -83.0, 250.0, "OH", "COLUMBUS")
+        + station_line("USC00330002", 41.5, -81.7, -999.9, "OH", "CLEVELAND")
+    )
+
+    output = tmp_path / "parquet"
+    # A tiny batch size forces one batch per file, exercising the byte-based batching too
+    assert ghcn_daily.convert_to_parquet(str(dly_dir), str(stations), str(output), batch_bytes=1) == 4
+
+    table = ds.dataset(str(output), format="parquet", partitioning="hive").to_table()
+    rows = sorted(zip(*(table[c].to_pylist() for c in ("station", "element", "date", "value", "decade", "elevation"))))
+    assert rows == [
+        ("USC00330001", "TMAX", date(2021, 3, 1), 150, 2020, 250.0),
+        ("USC00330001", "TMAX", date(2021, 3, 2), -25, 2020, 250.0),
+        ("USC00330002", "PRCP", date(1999, 12, 5), 12, 1990, None),
+        ("USC00330002", "PRCP", date(1999, 12, 31), 0, 1990, None),
+    ]
+    assert sorted(os.listdir(output)) == ["element=PRCP", "element=TMAX"]
+
+
+def test_parse_dly_ignores_blank_lines_between_files():
+    first = dly_line("USC00330001", 2021, 3, "TMAX", {1: 150})
+    second = dly_line("USC00330002", 2021, 3, "TMAX", {2: 160})
+    assert len(ghcn_daily.parse_dly(b"\n".join([first.encode(), second.encode()]))) == 2
+
+
+class FakeResponse:
+    def __init__(self, status_code, headers=None, body=b""):
+        self.status_code = status_code
+        self.headers = headers or {}
+        self.body = body
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status_code >= 400:
+            raise ghcn_daily.requests.HTTPError(self.status_code)
+
+    def iter_content(self, chunk_bytes):
+        yield self.body
+
+
+class FakeSession:
+    """Serves one file; Range requests at or past its end get a 416."""
+
+    def __init__(self, body, etag='"v1"'):
+        self.body = body
+        self.etag = etag
+
+    def head(self, url, timeout=None):
+        return FakeResponse(200, {"Content-Length": str(len(self.body)), "ETag": self.etag})
+
+    def get(self, url, headers=None, stream=False, timeout=None):
+        start = int(headers["Range"][len("bytes="):-1]) if headers and "Range" in headers else None
+        if start is None:
+            return FakeResponse(200, {"Content-Length": str(len(self.body)), "ETag": self.etag}, self.body)
+        if start >= len(self.body):
+            return FakeResponse(416, {"Content-Range": f"bytes */{len(self.body)}"})
+        return FakeResponse(206, {"Content-Range": f"bytes {start}-{len(self.body) - 1}/{len(self.body)}",
+                                  "ETag": self.etag}, self.body[start:])
+
+
+def test_download_file_finishes_complete_part_on_416(tmp_path):
+    manifest = ghcn_daily.DownloadManifest(str(tmp_path / "manifest.sqlite"))
+    path = str(tmp_path / "file.dly")
+    manifest.put(path, '"v1"', None)
+    (tmp_path / "file.dly.part").write_bytes(b"0123456789")
+
+    assert ghcn_daily.download_file(FakeSession(b"0123456789"), "url", path, manifest) == "resumed"
+    assert (tmp_path / "file.dly").read_bytes() == b"0123456789"
+    assert not (tmp_path / "file.dly.part").exists()
+    assert manifest.get(path) == ('"v1"', 10)
+
+
+def test_download_file_restarts_oversized_part_on_416(tmp_path):
+    manifest = ghcn_daily.DownloadManifest(str(tmp_path / "manifest.sqlite"))
+    path = str(tmp_path / "file.dly")
+    manifest.put(path, '"v1"', None)
+    (tmp_path / "file.dly.part").write_bytes(b"0123456789-garbage")
+
+    assert ghcn_daily.download_file(FakeSession(b"0123456789"), "url", path, manifest) == "downloaded"
+    assert (tmp_path / "file.dly").read_bytes() == b"0123456789"
+    assert not (tmp_path / "file.dly.part").exists()
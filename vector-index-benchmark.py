@@ -0,0 +1,139 @@
+import argparse
+import json
+import sys
+import time
+
+import numpy as np
+
+from vector_index import create_index
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+DEFAULT_VECTORS = 20000
+DEFAULT_QUERIES = 200
+DEFAULT_DIM = 384  # all-MiniLM-L6-v2 embedding size
+DEFAULT_CLUSTERS = 200
+DEFAULT_N_PROBES = [1, 2, 4, 8, 16, 32]
+CLUSTER_SPREAD = 1.4  # Noise around each cluster center (scaled by 1/sqrt(dim))
+QUERY_SPREAD = 2.0  # Noise added to stored vectors to make queries
+
+# ---------------------------
+# Benchmark Functions
+# ---------------------------
+def normalize(matrix):
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    return (matrix / np.where(norms == 0, 1, norms)).astype(np.float32)
+
+def make_dataset(num_vectors, num_queries, dim, clusters, seed):
+    """
+    Generate clustered unit vectors that look like sentence embeddings.
+
+    Real document embeddings are far from uniform (parks, trails and
+    campgrounds form topical clusters), so vectors are drawn around random
+    centers. Queries are perturbed copies of stored vectors.
+    """
+    rng = np.random.default_rng(seed)
+    centers = normalize(rng.normal(size=(clusters, dim)))
+    labels = rng.integers(clusters, size=num_vectors)
+    vectors = normalize(centers[labels] + CLUSTER_SPREAD / np.sqrt(dim) * rng.normal(size=(num_vectors, dim)))
+    picks = rng.integers(num_vectors, size=num_queries)
+    queries = normalize(vectors[picks] + QUERY_SPREAD / np.sqrt(dim) * rng.normal(size=(num_queries, dim)))
+    return vectors, queries
+
+def timed_search(index, queries, k, **options):
+    """Search one query at a time (as /ask does) and return results plus per-query seconds."""
+    results, latencies = [], []
+    for query in queries:
+        started = time.perf_counter()
+        results.extend(index.search(query[None, :], k, **options))
+        latencies.append(time.perf_counter() - started)
+    return results, latencies
+
+def recall_at_k(truth, results):
+    hits = sum(len(set(t_ids.tolist()) & set(r_ids.tolist())) for (t_ids, _), (r_ids, _) in zip(truth, results))
+    total = sum(len(t_ids) for t_ids, _ in truth)
+    return hits / total if total else 1.0
+
+def latency_summary(latencies):
+    ordered = np.sort(np.array(latencies)) * 1000
+    return {
+        "mean_ms": round(float(ordered.mean()), 4),
+        "p50_ms": round(float(np.percentile(ordered, 50)), 4),
+        "p95_ms": round(float(np.percentile(ordered, 95)), 4),
+        "p99_ms": round(float(np.percentile(ordered, 99)), 4),
+    }
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+def main():
+    parser = argparse.ArgumentParser(description="Recall vs latency of the IVF vector index against exact search.")
+    parser.add_argument("--vectors", type=int, default=DEFAULT_VECTORS, help="Number of indexed vectors.")
+    parser.add_argument("--queries", type=int, default=DEFAULT_QUERIES, help="Number of query vectors.")
+    parser.add_argument("--dim", type=int, default=DEFAULT_DIM, help="Embedding dimension.")
+    parser.add_argument("--clusters", type=int, default=DEFAULT_CLUSTERS, help="Topical clusters in the synthetic data.")
+    parser.add_argument("--k", type=int, default=20, help="Results per query (matches EMBEDDING_TOP_K).")
+    parser.add_argument("--n-lists", type=int, help="IVF lists (default: sqrt of vector count).")
+    parser.add_argument("--n-probes", type=int, nargs="+", default=DEFAULT_N_PROBES, help="n_probe values to sweep.")
+    parser.add_argument("--embeddings", help="Benchmark a saved .npy embedding matrix instead of synthetic data.")
+    parser.add_argument("--seed", type=int, default=0, help="Random seed.")
+    parser.add_argument("--output", help="Write the JSON report here instead of stdout.")
+    args = parser.parse_args()
+
+    if args.embeddings:
+        vectors = normalize(np.load(args.embeddings))
+        rng = np.random.default_rng(args.seed)
+        queries = normalize(vectors[rng.integers(len(vectors), size=args.queries)]
+                            + 0.05 * rng.normal(size=(args.queries, vectors.shape[1])))
+    else:
+        vectors, queries = make_dataset(args.vectors, args.queries, args.dim, args.clusters, args.seed)
+    ids = np.arange(len(vectors), dtype=np.int64)
+
+    exact = create_index("exact")
+    started = time.perf_counter()
+    exact.add(ids, vectors)
+    exact_build = time.perf_counter() - started
+    truth, exact_latencies = timed_search(exact, queries, args.k)
+
+    ivf = create_index("ivf", n_lists=args.n_lists, min_train_size=1, seed=args.seed)
+    started = time.perf_counter()
+    ivf.add(ids, vectors)
+    ivf_build = time.perf_counter() - started
+
+    sweeps = []
+    for n_probe in args.n_probes:
+        results, latencies = timed_search(ivf, queries, args.k, n_probe=n_probe)
+        sweeps.append({
+            "n_probe": n_probe,
+            "recall_at_k": round(recall_at_k(truth, results), 4),
+            **latency_summary(latencies),
+        })
+
+    report = {
+        "config": {
+            "vectors": len(vectors),
+            "queries": len(queries),
+            "dim": int(vectors.shape[1]),
+            "k": args.k,
+            "n_lists": len(ivf.centroids),
+            "source": args.embeddings or "synthetic",
+        },
+        "exact": {"build_seconds": round(exact_build, 4), **latency_summary(exact_latencies)},
+        "ivf": {"build_seconds": round(ivf_build, 4), "sweep": sweeps},
+    }
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as file:
+            json.dump(report, file, indent=2)
+        print(f"✅ Report saved to {args.output}")
+    else:
+        json.dump(report, sys.stdout, indent=2)
+        print()
+
+    print(f"{'n_probe':>8} {'recall@k':>9} {'p50 ms':>8} {'p95 ms':>8}   (exact p50 {report['exact']['p50_ms']} ms)", file=sys.stderr)
+    for row in sweeps:
+        print(f"{row['n_probe']:>8} {row['recall_at_k']:>9} {row['p50_ms']:>8} {row['p95_ms']:>8}", file=sys.stderr)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,194 @@
+import numpy as np
+
+# ---------------------------
+# Vector Index Backends
+# ---------------------------
+# Both backends store unit-normalized float32 vectors under integer ids and
+# score with inner product (cosine similarity). They support incremental
+# add/remove so a dataset reload only touches the rows that changed.
+
+class ExactIndex:
+    """Brute-force NumPy index: one matmul per query batch, perfect recall."""
+
+    def __init__(self):
+        self.ids = np.zeros(0, dtype=np.int64)
+        self.vectors = None
+        self._row_by_id = {}
+
+    def __len__(self):
+        return len(self.ids)
+
+    def __contains__(self, item_id):
+        return int(item_id) in self._row_by_id
+
+    def add(self, ids, vectors):
+        """Add (or replace) vectors under the given ids."""
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if len(ids) == 0:
+            return
+        existing = [i for i in ids.tolist() if i in self._row_by_id]
+        if existing:
+            self.remove(existing)
+        if self.vectors is None or len(self.ids) == 0:
+            self.vectors = vectors.copy()
+            self.ids = ids.copy()
+        else:
+            self.vectors = np.vstack([self.vectors, vectors])
+            self.ids = np.concatenate([self.ids, ids])
+        self._reindex()
+
+    def remove(self, ids):
+        """Drop the given ids; unknown ids are ignored."""
+        drop = {int(i) for i in ids}
+        if not drop or len(self.ids) == 0:
+            return
+        keep = np.array([i not in drop for i in self.ids.tolist()], dtype=bool)
+        self.ids = self.ids[keep]
+        self.vectors = self.vectors[keep]
+        self._reindex()
+
+    def rows_for(self, ids):
+        return np.array([self._row_by_id[int(i)] for i in ids if int(i) in self._row_by_id], dtype=np.int64)
+
+    def search(self, queries, k, candidate_ids=None):
+        """
+        Return the top-k (ids, scores) for each query row.
+
+        Args:
+            queries (numpy.ndarray): (num_queries, dim) unit vectors.
+            k (int): Results per query.
+            candidate_ids (iterable): Optional ids to restrict the search to.
+
+        Returns:
+            list: One (ids, scores) pair of arrays per query, best first.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        rows = np.arange(len(self.ids)) if candidate_ids is None else self.rows_for(candidate_ids)
+        return [self._top_k(rows, self.vectors[rows] @ query if len(rows) else np.zeros(0), k) for query in queries]
+
+    def _top_k(self, rows, scores, k):
+        k = min(k, len(rows))
+        if k == 0:
+            return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return self.ids[rows[top]], scores[top]
+
+    def _reindex(self):
+        self._row_by_id = {item_id: row for row, item_id in enumerate(self.ids.tolist())}
+
+class IVFIndex(ExactIndex):
+    """
+    Inverted-file ANN index: vectors are bucketed by their nearest k-means
+    centroid and a query only scans the n_probe closest buckets.
+
+    Raising n_probe trades latency for recall (n_probe == n_lists is exact).
+    Below min_train_size vectors the index stays untrained and scans
+    everything, so small datasets keep exact results.
+    """
+
+    def __init__(self, n_lists=None, n_probe=8, min_train_size=256, train_iterations=10,
+                 retrain_growth=4.0, seed=0):
+        super().__init__()
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.min_train_size = min_train_size
+        self.train_iterations = train_iterations
+        self.retrain_growth = retrain_growth
+        self.seed = seed
+        self.centroids = None
+        self.assignments = np.zeros(0, dtype=np.int64)
+        self.trained_size = 0
+        self._lists = []
+
+    def add(self, ids, vectors):
+        ids = np.asarray(ids, dtype=np.int64)
+        vectors = np.asarray(vectors, dtype=np.float32).reshape(len(ids), -1)
+        if len(ids) == 0:
+            return
+        existing = [i for i in ids.tolist() if i in self._row_by_id]
+        if existing:
+            self.remove(existing)
+        new_assignments = self._assign(vectors) if self.centroids is not None else np.zeros(len(ids), dtype=np.int64)
+        super().add(ids, vectors)
+        self.assignments = np.concatenate([self.assignments, new_assignments])
+        self._maybe_train()
+        self._rebuild_lists()
+
+    def remove(self, ids):
+        drop = {int(i) for i in ids}
+        if not drop or len(self.ids) == 0:
+            return
+        keep = np.array([i not in drop for i in self.ids.tolist()], dtype=bool)
+        self.assignments = self.assignments[keep]
+        super().remove(drop)
+        self._rebuild_lists()
+
+    def train(self):
+        """Run spherical k-means over the stored vectors and reassign every row."""
+        n_lists = self.n_lists or max(1, int(np.sqrt(len(self.ids))))
+        n_lists = min(n_lists, len(self.ids))
+        rng = np.random.default_rng(self.seed)
+        sample = self.vectors
+        if len(sample) > n_lists * 64:
+            sample = sample[rng.choice(len(sample), n_lists * 64, replace=False)]
+
+        centroids = sample[rng.choice(len(sample), n_lists, replace=False)].copy()
+        for _ in range(self.train_iterations):
+            labels = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(n_lists):
+                members = sample[labels == c]
+                centroid = members.sum(axis=0) if len(members) else sample[rng.integers(len(sample))]
+                norm = np.linalg.norm(centroid)
+                centroids[c] = centroid / norm if norm else centroid
+
+        self.centroids = centroids.astype(np.float32)
+        self.assignments = self._assign(self.vectors)
+        self.trained_size = len(self.ids)
+
+    def search(self, queries, k, candidate_ids=None, n_probe=None):
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        # Filtered searches are already small, and untrained indexes scan everything
+        if candidate_ids is not None or self.centroids is None:
+            return super().search(queries, k, candidate_ids)
+
+        n_probe = min(n_probe or self.n_probe, len(self.centroids))
+        centroid_scores = queries @ self.centroids.T
+        probes = np.argpartition(-centroid_scores, n_probe - 1, axis=1)[:, :n_probe]
+
+        results = []
+        for query, lists in zip(queries, probes):
+            rows = np.concatenate([self._lists[c] for c in lists])
+            results.append(self._top_k(rows, self.vectors[rows] @ query if len(rows) else np.zeros(0), k))
+        return results
+
+    def _assign(self, vectors):
+        return np.argmax(vectors @ self.centroids.T, axis=1).astype(np.int64)
+
+    def _maybe_train(self):
+        size = len(self.ids)
+        if size < self.min_train_size:
+            return
+        if self.centroids is None or size >= self.trained_size * self.retrain_growth:
+            self.train()
+
+    def _rebuild_lists(self):
+        if self.centroids is None:
+            self._lists = []
+            return
+        order = np.argsort(self.assignments, kind="stable")
+        bounds = np.searchsorted(self.assignments[order], np.arange(len(self.centroids) + 1))
+        self._lists = [order[bounds[c]:bounds[c + 1]] for c in range(len(self.centroids))]
+
+# ---------------------------
+# Factory
+# ---------------------------
+BACKENDS = {"exact": ExactIndex, "ivf": IVFIndex}
+
+def create_index(backend="exact", **options):
+    """Create a vector index by backend name ('exact' or 'ivf')."""
+    try:
+        return BACKENDS[backend](**options)
+    except KeyError:
+        raise ValueError(f"Unknown vector index backend '{backend}'. Choose from: {', '.join(BACKENDS)}") from None
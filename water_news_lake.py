@@ -0,0 +1,322 @@
+import argparse
+import email.utils
+import os
+import posixpath
+from datetime import datetime, timezone
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.fs as pafs
+import pyarrow.parquet as pq
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+# Layout: <root>/date=YYYY-MM-DD/<file>.parquet, partitioned on the article's
+# publish date (falling back to ingest time when a feed gives no usable date).
+DEFAULT_ROOT = "s3://processed/water-news-alerts/media"
+MINIO_ENDPOINT = os.getenv("MINIO_ENDPOINT", "localhost:9000")
+PARTITION_KEY = "date"
+
+ARTICLE_SCHEMA = pa.schema([
+    ("title", pa.string()),
+    ("url", pa.string()),
+    ("source", pa.string()),
+    ("publishedAt", pa.string()),  # Raw value from the feed, kept for existing readers
+    ("published_at", pa.timestamp("us", tz="UTC")),
+    ("description", pa.string()),
+    ("ingested_at", pa.timestamp("us", tz="UTC")),
+])
+SORT_KEYS = [("published_at", "ascending"), ("source", "ascending"), ("url", "ascending")]
+ROW_GROUP_ROWS = 64 * 1024
+STREAM_BATCH_ROWS = 4096  # Articles buffered before a record batch is flushed to the open writers
+MAX_ROWS_PER_FILE = 1024 * 1024
+COMPRESSION = "zstd"
+
+# ---------------------------
+# Schema & Conversion
+# ---------------------------
+def parse_published(value):
+    """Parse NewsAPI ISO-8601 or RSS RFC 822 dates into an aware UTC datetime."""
+    if not value:
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace("Z", "+00:00"))
+    except ValueError:
+        try:
+            parsed = email.utils.parsedate_to_datetime(value)
+        except (TypeError, ValueError):
+            return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+def article_row(article, ingested_at):
+    """Map one normalized article dict onto the ARTICLE_SCHEMA columns."""
+    return {
+        "title": article.get("title"),
+        "url": article.get("url"),
+        "source": article.get("source"),
+        "publishedAt": article.get("publishedAt"),
+        "published_at": parse_published(article.get("publishedAt")),
+        "description": article.get("description"),
+        "ingested_at": ingested_at,
+    }
+
+def articles_to_table(articles, ingested_at=None):
+    """Convert normalized article dicts into a table with ARTICLE_SCHEMA."""
+    ingested_at = ingested_at or datetime.now(timezone.utc)
+    return pa.Table.from_pylist([article_row(a, ingested_at) for a in articles], schema=ARTICLE_SCHEMA)
+
+def conform(table):
+    """Cast an older or partial table to ARTICLE_SCHEMA, adding missing columns as nulls."""
+    columns = []
+    for field in ARTICLE_SCHEMA:
+        if field.name in table.column_names:
+            columns.append(table[field.name].cast(field.type))
+        else:
+            columns.append(pa.nulls(len(table), field.type))
+    table = pa.Table.from_arrays(columns, schema=ARTICLE_SCHEMA)
+    # Legacy files only carry the raw string; derive the parsed timestamp
+    if table["published_at"].null_count == len(table) and len(table):
+        parsed = pa.array([parse_published(v) for v in table["publishedAt"].to_pylist()], ARTICLE_SCHEMA.field("published_at").type)
+        table = table.set_column(table.schema.get_field_index("published_at"), "published_at", parsed)
+    return table
+
+def partition_dates(table):
+    """Return the YYYY-MM-DD partition value for every row."""
+    timestamps = pc.coalesce(table["published_at"], table["ingested_at"])
+    return pc.fill_null(pc.strftime(timestamps, format="%Y-%m-%d"), "unknown")
+
+def split_by_partition(table):
+    """Split a table into {partition date: sorted sub-table}."""
+    dates = partition_dates(table)
+    return {
+        date: table.filter(pc.equal(dates, date)).sort_by(SORT_KEYS)
+        for date in sorted(pc.unique(dates).to_pylist())
+    }
+
+def partition_path(root, date):
+    return posixpath.join(root, f"{PARTITION_KEY}={date}")
+
+def write_parquet(table, sink):
+    """Write a sorted table with zstd compression, bounded row groups and column statistics."""
+    pq.write_table(
+        table,
+        sink,
+        compression=COMPRESSION,
+        row_group_size=ROW_GROUP_ROWS,
+        write_statistics=True,
+    )
+
+# ---------------------------
+# Filesystem Helpers
+# ---------------------------
+def get_filesystem(root, access_key=None, secret_key=None, endpoint=MINIO_ENDPOINT):
+    """
+    Resolve a root into (filesystem, path).
+
+    s3:// roots use a pyarrow S3FileSystem pointed at MinIO; anything else is
+    treated as a local directory, which is how the layout is tested.
+    """
+    if root.startswith("s3://"):
+        filesystem = pafs.S3FileSystem(
+            access_key=access_key or os.getenv("MINIO_ACCESS_KEY"),
+            secret_key=secret_key or os.getenv("MINIO_SECRET_KEY"),
+            endpoint_override=endpoint,
+            scheme="http",
+            region="us-east-1",
+        )
+        return filesystem, root[len("s3://"):].rstrip("/")
+    return pafs.LocalFileSystem(), os.path.abspath(root)
+
+def list_parquet_files(filesystem, path):
+    """List visible .parquet files directly under a path (underscore-prefixed files are in-progress)."""
+    infos = filesystem.get_file_info(pafs.FileSelector(path, allow_not_found=True))
+    return sorted(
+        info.path for info in infos
+        if info.type == pafs.FileType.File
+        and info.path.endswith(".parquet")
+        and not posixpath.basename(info.path).startswith(("_", "."))
+    )
+
+def list_partitions(filesystem, root):
+    infos = filesystem.get_file_info(pafs.FileSelector(root, allow_not_found=True))
+    return sorted(
+        info.path for info in infos
+        if info.type == pafs.FileType.Directory and posixpath.basename(info.path).startswith(f"{PARTITION_KEY}=")
+    )
+
+def write_file_atomically(filesystem, table, final_path):
+    """Write under an underscore-prefixed name (ignored by readers) and move into place."""
+    directory, name = posixpath.split(final_path)
+    temp_path = posixpath.join(directory, f"_{name}")
+    filesystem.create_dir(directory, recursive=True)
+    with filesystem.open_output_stream(temp_path) as sink:
+        write_parquet(table, sink)
+    filesystem.move(temp_path, final_path)
+
+# ---------------------------
+# Writing & Compaction
+# ---------------------------
+def write_partitioned(filesystem, root, table, file_prefix):
+    """
+    Write a table into the date-partitioned layout.
+
+    Returns:
+        list: Paths of the files written, one per partition touched.
+    """
+    written = []
+    for date, part in split_by_partition(table).items():
+        path = posixpath.join(partition_path(root, date), f"{file_prefix}.parquet")
+        write_file_atomically(filesystem, part, path)
+        written.append(path)
+    return written
+
+class PartitionedStreamWriter:
+    """
+    Stream articles into the date-partitioned layout with bounded memory.
+
+    Articles are buffered into record batches of batch_rows; each batch is
+    split by partition and appended as a row group to that partition's open
+    ParquetWriter. On S3 each output stream is a multipart upload, so memory
+    holds one batch plus at most one pending upload part per open partition,
+    however many articles pass through. Files are written under
+    underscore-prefixed names and only moved into place by close().
+    """
+
+    def __init__(self, filesystem, root, file_prefix, batch_rows=STREAM_BATCH_ROWS, ingested_at=None):
+        self.filesystem = filesystem
+        self.root = root
+        self.file_prefix = file_prefix
+        self.batch_rows = batch_rows
+        self.ingested_at = ingested_at or datetime.now(timezone.utc)
+        self.rows = 0
+        self.written = []
+        self._buffer = []
+        self._writers = {}  # date -> (temp path, final path, output stream, ParquetWriter)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+    def write(self, article):
+        self._buffer.append(article_row(article, self.ingested_at))
+        if len(self._buffer) >= self.batch_rows:
+            self.flush()
+
+    def write_all(self, articles):
+        for article in articles:
+            self.write(article)
+
+    def flush(self):
+        if not self._buffer:
+            return
+        table = pa.Table.from_pylist(self._buffer, schema=ARTICLE_SCHEMA)
+        self._buffer = []
+        for date, part in split_by_partition(table).items():
+            self._writer_for(date).write_table(part, row_group_size=ROW_GROUP_ROWS)
+        self.rows += len(table)
+
+    def close(self):
+        """
+        Flush, finish every upload and move the files into place.
+
+        Returns:
+            list: Paths of the files written, one per partition touched.
+        """
+        self.flush()
+        for temp_path, final_path, stream, writer in self._writers.values():
+            writer.close()
+            stream.close()
+            self.filesystem.move(temp_path, final_path)
+            self.written.append(final_path)
+        self._writers = {}
+        return self.written
+
+    def abort(self):
+        """Discard buffered rows and remove any partially written files."""
+        self._buffer = []
+        for temp_path, _, stream, writer in self._writers.values():
+            try:
+                writer.close()
+                stream.close()
+                self.filesystem.delete_file(temp_path)
+            except Exception as e:
+                print(f"⚠️ Could not clean up {temp_path}: {e}")
+        self._writers = {}
+
+    def _writer_for(self, date):
+        if date not in self._writers:
+            directory = partition_path(self.root, date)
+            final_path = posixpath.join(directory, f"{self.file_prefix}.parquet")
+            temp_path = posixpath.join(directory, f"_{self.file_prefix}.parquet")
+            self.filesystem.create_dir(directory, recursive=True)
+            stream = self.filesystem.open_output_stream(temp_path)
+            writer = pq.ParquetWriter(stream, ARTICLE_SCHEMA, compression=COMPRESSION, write_statistics=True)
+            self._writers[date] = (temp_path, final_path, stream, writer)
+        return self._writers[date][3]
+
+def compact_partition(filesystem, path, min_files=2, max_rows_per_file=MAX_ROWS_PER_FILE):
+    """
+    Merge the small files in one partition into sorted, row-group-sized files.
+
+    New files are written and moved into place before the originals are
+    deleted, so a crash mid-way leaves duplicates rather than lost rows.
+
+    Returns:
+        int: Number of input files merged (0 if the partition was skipped).
+    """
+    files = list_parquet_files(filesystem, path)
+    if len(files) < min_files:
+        return 0
+
+    table = pa.concat_tables([conform(pq.read_table(f, filesystem=filesystem)) for f in files])
+    table = table.sort_by(SORT_KEYS)
+    stamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
+    for number, offset in enumerate(range(0, max(len(table), 1), max_rows_per_file)):
+        chunk = table.slice(offset, max_rows_per_file)
+        write_file_atomically(filesystem, chunk, posixpath.join(path, f"compacted-{stamp}-{number:03d}.parquet"))
+
+    for f in files:
+        filesystem.delete_file(f)
+    return len(files)
+
+def repartition_loose_files(filesystem, root):
+    """Move legacy flat files at the root (one per run) into date partitions."""
+    files = list_parquet_files(filesystem, root)
+    for f in files:
+        table = conform(pq.read_table(f, filesystem=filesystem))
+        write_partitioned(filesystem, root, table, f"legacy-{posixpath.splitext(posixpath.basename(f))[0]}")
+        filesystem.delete_file(f)
+    return len(files)
+
+def compact_all(filesystem, root, min_files=2):
+    """Repartition legacy files, then compact every partition with enough small files."""
+    moved = repartition_loose_files(filesystem, root)
+    if moved:
+        print(f"Moved {moved} legacy files into date partitions")
+    for path in list_partitions(filesystem, root):
+        merged = compact_partition(filesystem, path, min_files=min_files)
+        if merged:
+            print(f"✅ Compacted {merged} files in {path}")
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Maintain the partitioned water-news-alerts Parquet lake.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    compact_parser = subparsers.add_parser("compact", help="Merge small files within each date partition.")
+    compact_parser.add_argument("--root", default=DEFAULT_ROOT, help="Dataset root (s3://bucket/prefix or a local path).")
+    compact_parser.add_argument("--min-files", type=int, default=2, help="Only compact partitions with at least this many files.")
+    args = parser.parse_args()
+
+    if args.command == "compact":
+        filesystem, root = get_filesystem(args.root)
+        compact_all(filesystem, root, min_files=args.min_files)
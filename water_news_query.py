@@ -0,0 +1,180 @@
+import argparse
+import functools
+import operator
+import posixpath
+import time
+from collections import Counter
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+
+from water_news_lake import (
+    ARTICLE_SCHEMA,
+    DEFAULT_ROOT,
+    PARTITION_KEY,
+    get_filesystem,
+    list_parquet_files,
+    list_partitions,
+)
+
+# ---------------------------
+# Configuration Parameters
+# ---------------------------
+SCAN_BATCH_ROWS = 16 * 1024
+DEFAULT_COLUMNS = ["date", "source", "title", "url"]
+TEXT_COLUMNS = ("title", "description")  # Searched by keyword filters
+
+# Article columns plus the partition value, which readers get from the path
+QUERY_SCHEMA = ARTICLE_SCHEMA.append(pa.field(PARTITION_KEY, pa.string()))
+
+# ---------------------------
+# Discovery & Pruning
+# ---------------------------
+def partition_date(path):
+    return posixpath.basename(path)[len(PARTITION_KEY) + 1:]
+
+def prune_partitions(partitions, start=None, end=None):
+    """
+    Keep the partitions whose date falls within [start, end] (YYYY-MM-DD strings).
+
+    Partition names sort as dates, so this is a string comparison on the
+    listing; files in pruned partitions are never opened. The 'unknown'
+    partition only survives when no date bound is given.
+    """
+    kept = []
+    for path in partitions:
+        date = partition_date(path)
+        if start or end:
+            if date == "unknown" or (start and date < start) or (end and date > end):
+                continue
+        kept.append(path)
+    return kept
+
+def build_filter(start=None, end=None, sources=None, keyword=None):
+    """
+    Build a dataset filter expression from the query options.
+
+    Date bounds apply to the partition value, so they hold for legacy rows
+    without a parsed published_at too. The source condition is checked
+    against each row group's min/max statistics first, so row groups that
+    cannot match are skipped without being read. The keyword filter is
+    evaluated on the decoded batches.
+    """
+    conditions = []
+    if start:
+        conditions.append(ds.field(PARTITION_KEY) >= start)
+    if end:
+        conditions.append(ds.field(PARTITION_KEY) <= end)
+    if sources:
+        conditions.append(ds.field("source").isin(list(sources)))
+    if keyword:
+        # Null titles/descriptions evaluate to null, which the filter treats as no match
+        matches = [pc.match_substring(ds.field(column), keyword, ignore_case=True) for column in TEXT_COLUMNS]
+        conditions.append(functools.reduce(operator.or_, matches))
+    return functools.reduce(operator.and_, conditions) if conditions else None
+
+def open_dataset(filesystem, root, start=None, end=None):
+    """
+    Build a dataset over the partitions that survive date pruning.
+
+    Returns:
+        pyarrow.dataset.Dataset: Rows with QUERY_SCHEMA; older files missing
+        a column read it as nulls.
+    """
+    files = []
+    for path in prune_partitions(list_partitions(filesystem, root), start, end):
+        files.extend(list_parquet_files(filesystem, path))
+    return ds.dataset(
+        files,
+        schema=QUERY_SCHEMA,
+        format="parquet",
+        filesystem=filesystem,
+        partitioning=ds.partitioning(pa.schema([(PARTITION_KEY, pa.string())]), flavor="hive"),
+        partition_base_dir=root,
+    )
+
+# ---------------------------
+# Queries
+# ---------------------------
+def scan(filesystem, root, columns=None, start=None, end=None, sources=None, keyword=None, batch_rows=SCAN_BATCH_ROWS):
+    """
+    Stream record batches of matching articles.
+
+    Args:
+        filesystem (pyarrow.fs.FileSystem): From water_news_lake.get_filesystem.
+        root (str): Dataset root on that filesystem.
+        columns (list): Columns to read; only these are fetched and decoded.
+        start (str): First partition date (YYYY-MM-DD), inclusive.
+        end (str): Last partition date (YYYY-MM-DD), inclusive.
+        sources (list): Only articles from these sources.
+        keyword (str): Case-insensitive match on title or description.
+        batch_rows (int): Maximum rows per yielded batch.
+
+    Yields:
+        pyarrow.RecordBatch: Matching rows, never the whole result at once.
+    """
+    dataset = open_dataset(filesystem, root, start, end)
+    yield from dataset.to_batches(
+        columns=columns or DEFAULT_COLUMNS,
+        filter=build_filter(start, end, sources, keyword),
+        batch_size=batch_rows,
+    )
+
+def articles_per_source_per_day(filesystem, root, start=None, end=None, sources=None, keyword=None):
+    """
+    Count articles per (date, source), reading only those two columns.
+
+    Returns:
+        list: (date, source, count) tuples sorted by date, then source.
+    """
+    counts = Counter()
+    for batch in scan(filesystem, root, [PARTITION_KEY, "source"], start, end, sources, keyword):
+        grouped = pa.Table.from_batches([batch]).group_by([PARTITION_KEY, "source"]).aggregate([([], "count_all")])
+        for date, source, count in zip(*(grouped[name].to_pylist() for name in (PARTITION_KEY, "source", "count_all"))):
+            counts[(date, source)] += count
+    return sorted(((date, source, count) for (date, source), count in counts.items()),
+                  key=lambda row: (row[0] or "", row[1] or ""))
+
+def find_articles(filesystem, root, keyword=None, columns=None, start=None, end=None, sources=None, limit=20):
+    """Return up to limit matching articles as dicts, stopping the scan once enough are found."""
+    rows = []
+    for batch in scan(filesystem, root, columns, start, end, sources, keyword):
+        rows.extend(batch.slice(0, limit - len(rows)).to_pylist())
+        if len(rows) >= limit:
+            break
+    return rows
+
+# ---------------------------
+# Main Execution
+# ---------------------------
+def print_rows(rows, columns, width=60):
+    print(" | ".join(columns))
+    for row in rows:
+        print(" | ".join(str(row.get(column, ""))[:width] for column in columns))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Query the water-news-alerts Parquet lake without Spark.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    counts_parser = subparsers.add_parser("counts", help="Articles per source per day.")
+    find_parser = subparsers.add_parser("find", help="Show matching articles.")
+    find_parser.add_argument("keyword", nargs="?", help="Case-insensitive match on title or description.")
+    find_parser.add_argument("--columns", nargs="+", default=DEFAULT_COLUMNS, help="Columns to read and show.")
+    find_parser.add_argument("--limit", type=int, default=20, help="Maximum articles to show.")
+    counts_parser.add_argument("--keyword", help="Only count articles matching this keyword.")
+    for sub in (counts_parser, find_parser):
+        sub.add_argument("--root", default=DEFAULT_ROOT, help="Dataset root (s3://bucket/prefix or a local path).")
+        sub.add_argument("--start", help="First date, YYYY-MM-DD.")
+        sub.add_argument("--end", help="Last date, YYYY-MM-DD.")
+        sub.add_argument("--source", nargs="+", dest="sources", help="Only these sources.")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    filesystem, root = get_filesystem(args.root)
+    if args.command == "counts":
+        rows = articles_per_source_per_day(filesystem, root, args.start, args.end, args.sources, args.keyword)
+        print_rows([dict(zip(("date", "source", "articles"), row)) for row in rows], ["date", "source", "articles"])
+    else:
+        rows = find_articles(filesystem, root, args.keyword, args.columns, args.start, args.end, args.sources, args.limit)
+        print_rows(rows, args.columns)
+    print(f"✅ {len(rows)} rows in {time.perf_counter() - started:.2f}s")